@@ -0,0 +1,57 @@
+"""
+Measure the connections opened and the latency of concurrent requests sent at a fixed rate over
+HTTP/1.1 and over HTTP/2.
+
+The upstream answers each request after 100 ms, hence at 100 requests per second about 10 of
+them are in flight at any time. Over HTTP/1.1 each of them needs its own connection, while over
+HTTP/2 they're multiplexed over a single one. It requires httpx and h2.
+
+Usage: PYTHONPATH=. python benchmarks/bench_http2.py [number of requests] [rate]
+
+"""
+
+import sys
+import time
+import logging
+
+import requests
+
+from requests_throttler import BaseThrottler, RequestsTransport, Urllib3Transport, \
+    HTTP2Transport
+from requests_throttler.recording import StubServer, H2StubServer, REPLAY_LATENCY_HEADER
+
+
+def bench(server, transport, n_reqs, rate):
+    request = requests.Request(method='GET', url=server.url + '/items?id=1',
+                               headers={REPLAY_LATENCY_HEADER: '0.1'})
+    throttler = BaseThrottler(transport=transport, delay=1.0 / rate, concurrency=32)
+    start = time.time()
+    with throttler:
+        throttled_requests = throttler.multi_submit([request for i in range(n_reqs)])
+    throttler.wait_end()
+    elapsed = time.time() - start
+    latencies = sorted(tr.response.elapsed.total_seconds() for tr in throttled_requests)
+    transport.close()
+    return elapsed, latencies
+
+
+def main():
+    n_reqs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    logging.disable(logging.WARNING)
+    for name, server, transport in [
+            ('HTTP/1.1 RequestsTransport', StubServer(), RequestsTransport()),
+            ('HTTP/1.1 Urllib3Transport', StubServer(), Urllib3Transport(maxsize=32)),
+            ('HTTP/2 HTTP2Transport', H2StubServer(), HTTP2Transport(http1=False))]:
+        with server:
+            elapsed, latencies = bench(server, transport, n_reqs, rate)
+            connections = server.connections
+        print("{name}: {connections} connections, {rate:.1f} req/s, latency "
+              "{median:.1f} ms median, {p99:.1f} ms p99".format(
+                  name=name, connections=connections, rate=n_reqs / elapsed,
+                  median=latencies[len(latencies) // 2] * 1e3,
+                  p99=latencies[int(len(latencies) * 0.99)] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
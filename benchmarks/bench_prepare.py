@@ -0,0 +1,49 @@
+"""
+Measure the cost per request of preparing the requests with the session and of rendering them
+from a template.
+
+Usage: PYTHONPATH=. python benchmarks/bench_prepare.py [number of requests]
+
+"""
+
+import sys
+import time
+
+import requests
+
+from requests_throttler import RequestTemplate
+
+
+def bench_session(session, n_reqs):
+    start = time.time()
+    for i in range(n_reqs):
+        session.prepare_request(requests.Request(
+            method='GET', url='http://localhost/items/{i}?page=1'.format(i=i),
+            headers={'Accept': 'application/json'}))
+    return time.time() - start
+
+
+def bench_template(session, n_reqs):
+    start = time.time()
+    template = RequestTemplate(requests.Request(method='GET', url='http://localhost/items/{id}',
+                                                params={'page': 1},
+                                                headers={'Accept': 'application/json'}),
+                               session=session)
+    for i in range(n_reqs):
+        template.render(id=i)
+    return time.time() - start
+
+
+def main():
+    n_reqs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    session = requests.Session()
+    session.cookies.set('session', 'abc')
+    for name, bench in [('session.prepare_request', bench_session),
+                        ('RequestTemplate.render', bench_template)]:
+        elapsed = min(bench(session, n_reqs) for i in range(3))
+        print("{name}: {per_request:.1f} us per request".format(
+            name=name, per_request=elapsed / n_reqs * 1e6))
+
+
+if __name__ == '__main__':
+    main()
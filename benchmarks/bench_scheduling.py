@@ -0,0 +1,54 @@
+"""
+Measure the per-request overhead of the scheduling core of the throttler.
+
+The session never touches the network and the delay is 0, hence the time spent per request is
+the one of submitting, dequeueing, pacing and finishing it.
+
+Usage: PYTHONPATH=. python benchmarks/bench_scheduling.py [number of requests]
+
+"""
+
+import sys
+import time
+import logging
+
+import requests
+
+from requests_throttler import BaseThrottler
+
+
+class NullSession(requests.Session):
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b''
+        response.request = request
+        return response
+
+
+def bench(n_reqs):
+    request = requests.Request(method='GET', url='http://localhost/')
+    throttler = BaseThrottler(session=NullSession())
+    throttler.start()
+    throttler.pause()
+    throttled_requests = throttler.multi_submit([request for i in range(n_reqs)])
+    start = time.time()
+    throttler.unpause()
+    throttler.shutdown()
+    throttler.wait_end()
+    elapsed = time.time() - start
+    assert all(throttled_request.finished for throttled_request in throttled_requests)
+    return elapsed
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    n_reqs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    elapsed = min(bench(n_reqs) for i in range(3))
+    print("{n_reqs} requests in {elapsed:.3f} s: {per_request:.1f} us per request".format(
+        n_reqs=n_reqs, elapsed=elapsed, per_request=elapsed / n_reqs * 1e6))
+
+
+if __name__ == '__main__':
+    main()
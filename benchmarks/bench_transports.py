@@ -0,0 +1,75 @@
+"""
+Measure the CPU time per request spent by the throttler sending small requests with each
+transport.
+
+The requests are sent with no delay to a stub server running in another process, hence the CPU
+time measured is the one of the client only. The stub transport never touches the network and
+gives the cost of the throttler alone.
+
+Usage: PYTHONPATH=. python benchmarks/bench_transports.py [number of requests]
+
+"""
+
+import sys
+import time
+import logging
+import threading
+import multiprocessing
+
+import requests
+
+from requests_throttler import BaseThrottler, RequestsTransport, Urllib3Transport, \
+    StubTransport
+from requests_throttler.recording import StubServer
+
+try:
+    cpu_time = time.process_time
+except AttributeError:
+    cpu_time = time.clock
+
+
+def serve(urls):
+    logging.disable(logging.WARNING)
+    server = StubServer()
+    server.start()
+    urls.put(server.url)
+    threading.Event().wait()
+
+
+def bench(transport, url, n_reqs):
+    request = requests.Request(method='GET', url=url + '/items?id=1',
+                               headers={'X-Replay-Size': '64'})
+    throttler = BaseThrottler(transport=transport)
+    throttler.start()
+    throttler.pause()
+    throttled_requests = throttler.multi_submit([request for i in range(n_reqs)])
+    start = cpu_time()
+    throttler.unpause()
+    throttler.shutdown()
+    throttler.wait_end()
+    elapsed = cpu_time() - start
+    assert all(tr.response.status_code == 200 for tr in throttled_requests)
+    return elapsed
+
+
+def main():
+    n_reqs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logging.disable(logging.WARNING)
+    urls = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(urls,))
+    server.daemon = True
+    server.start()
+    url = urls.get()
+    try:
+        for name, transport in [('RequestsTransport', RequestsTransport()),
+                                ('Urllib3Transport', Urllib3Transport()),
+                                ('StubTransport', StubTransport(content=b'x' * 64))]:
+            elapsed = min(bench(transport, url, n_reqs) for i in range(3))
+            print("{name}: {per_request:.1f} us of CPU per request".format(
+                name=name, per_request=elapsed / n_reqs * 1e6))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,5 +9,15 @@ __copyright__ = 'Copyright 2019 Lou Marvin Caraig'
 
 from . import utils
 from .throttled_request import ThrottledRequest
+from .limiter import Limiter
+from .pool import RequestsPool
+from .batching import Batcher
+from .breaker import CircuitBreaker
 from .throttler import BaseThrottler
+from .cache import ResponseCache
+from .sessions import SessionPool
+from .transports import RequestsTransport, Urllib3Transport, HTTP2Transport, StubTransport
+from .recording import Recorder, StubServer
+from .templates import RequestTemplate
+from .sinks import CallbackSink, JsonLinesSink, DirectorySink, QueueSink
 from .exceptions import *
@@ -0,0 +1,145 @@
+"""
+.. module:: batching
+   :synopsis: The module containing the aggregation of requests into batches
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the batcher that a throttler uses to pack several enqueued requests into a
+single upstream call, e.g. a JSON-RPC batch or a multi-get by ids, and to split the response
+back among them.
+
+"""
+
+try:
+    from urllib.parse import urlsplit, urlunsplit
+except ImportError:
+    from urlparse import urlsplit, urlunsplit
+
+from requests_throttler.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def default_key(request):
+    """Return the default batching key of the given prepared request
+
+    Two requests are compatible when they have the same method and the same url except for the
+    query, hence for instance ``GET /items?id=1`` and ``GET /items?id=2`` can be batched.
+
+    :param request: the prepared request
+    :type request: requests.PreparedRequest
+    :return: the key
+    :rtype: tuple
+
+    """
+    scheme, netloc, path, _, _ = urlsplit(request.url)
+    return request.method, urlunsplit((scheme, netloc, path, '', ''))
+
+
+class Batcher(object):
+    """This class provides the aggregation of compatible requests into batches
+
+    When a throttler using a batcher can send a request, it takes up to ``max_size - 1`` other
+    enqueued requests having the same key, combines all of them into a single request that is
+    sent in place of them and splits the response received among them. A batch is charged the
+    cost of its first request. The functions can be given or the corresponding methods can be
+    overridden by a subclass.
+
+    :param combine: the function returning the request to send in place of the given list of
+                    prepared requests
+    :type combine: callable
+    :param split: the function returning a list with the response, or the exception, of each
+                  of the prepared requests combined given the response received
+    :type split: callable
+    :param max_size: the maximum number of requests in a batch
+    :type max_size: int
+    :param key: the function returning the key of a prepared request, only requests with the
+                same key can be batched
+    :type key: callable
+
+    """
+
+    def __init__(self, combine=None, split=None, max_size=10, key=None):
+        """Create a batcher with the given functions and maximum size
+
+        :param combine: the function taking a list of prepared requests and returning a
+                        :class:`requests.Request` or :class:`requests.PreparedRequest` to send
+                        in their place (default: :meth:`combine` must be overridden)
+        :type combine: callable
+        :param split: the function taking the response received and the list of prepared
+                      requests combined and returning a list with a :class:`requests.Response`
+                      or an exception for each of them (default: :meth:`split` must be
+                      overridden)
+        :type split: callable
+        :param max_size: the maximum number of requests in a batch (default: :const:`10`)
+        :type max_size: int
+        :param key: the function taking a prepared request and returning its key, or
+                    :const:`None` if it cannot be batched (default:
+                    :func:`requests_throttler.batching.default_key`)
+        :type key: callable
+        :raise:
+            :ValueError: if ``max_size`` is not a positive number or if a function is not given
+                         and the corresponding method is not overridden
+
+        """
+        if max_size < 1:
+            raise ValueError("The maximum size of a batch must be positive.")
+        if combine is None and type(self).combine == Batcher.combine:
+            raise ValueError("A combine function must be given.")
+        if split is None and type(self).split == Batcher.split:
+            raise ValueError("A split function must be given.")
+        self._combine = combine
+        self._split = split
+        self._max_size = max_size
+        self._key = key or default_key
+
+    @property
+    def max_size(self):
+        """The maximum number of requests in a batch
+
+        :getter: Returns :attr:`max_size`
+        :type: int
+
+        """
+        return self._max_size
+
+    def key(self, request):
+        """Return the key of the given prepared request
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: the key or :const:`None` if the request cannot be batched
+        :rtype: hashable
+
+        """
+        return self._key(request)
+
+    def combine(self, requests):
+        """Return the request to send in place of the given ones
+
+        :param requests: the prepared requests to combine
+        :type requests: list(requests.PreparedRequest)
+        :return: the combined request
+        :rtype: requests.Request or requests.PreparedRequest
+
+        """
+        return self._combine(requests)
+
+    def split(self, response, requests):
+        """Split the response of a combined request among the requests combined
+
+        :param response: the response received for the combined request
+        :type response: requests.Response
+        :param requests: the prepared requests combined
+        :type requests: list(requests.PreparedRequest)
+        :return: the response, or the exception, of each request
+        :rtype: list
+        :raise:
+            :ValueError: if the number of results is not the number of requests
+
+        """
+        results = list(self._split(response, requests))
+        if len(results) != len(requests):
+            raise ValueError("The batch response has {n_results} results for {n_reqs} "
+                             "requests.".format(n_results=len(results), n_reqs=len(requests)))
+        return results
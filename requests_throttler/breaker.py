@@ -0,0 +1,241 @@
+"""
+.. module:: breaker
+   :synopsis: The module containing the circuit breaker of the failing upstreams
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the circuit breaker that a throttler consults before sending a request, so
+that the requests to an upstream that keeps failing fail fast instead of waiting for their turn
+and for a timeout.
+
+"""
+
+import time
+import threading
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def default_key(request):
+    """Return the default circuit key of the given prepared request, that is its host
+
+    :param request: the prepared request
+    :type request: requests.PreparedRequest
+    :return: the key
+    :rtype: string
+
+    """
+    return urlsplit(request.url).netloc
+
+
+def default_is_failure(result):
+    """Check if the given result of a request is a failure of the upstream
+
+    :param result: the response received or the exception raised
+    :type result: requests.Response or Exception
+    :return: :const:`True` if ``result`` is an exception or a response with a ``5xx`` status
+    :rtype: boolean
+
+    """
+    return isinstance(result, Exception) or result.status_code >= 500
+
+
+class CircuitOpenError(Exception):
+    """Exception associated to the requests not sent because their circuit is open
+
+    :param msg: the message
+    :type msg: string
+    :param key: the key of the circuit
+    :type key: hashable
+
+    """
+
+    def __init__(self, msg, key):
+        self.msg = msg
+        self.key = key
+
+    def __str__(self):
+        return "{message} (circuit: {key})".format(message=self.msg, key=self.key)
+
+
+class _Circuit(object):
+    """The state of the circuit of a single key"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+
+
+class CircuitBreaker(object):
+    """This class provides a circuit breaker for each host, or key, of the requests
+
+    A circuit is ``closed`` until ``failure_threshold`` consecutive requests fail, then it is
+    ``open`` and the requests fail immediately for ``recovery_timeout`` seconds. Afterwards it
+    is ``half-open``: a single trial request is allowed at a time, a success closes the circuit
+    while a failure opens it again. A trial whose result is not recorded within
+    ``recovery_timeout`` seconds is considered lost and another one is allowed.
+
+    :param failure_threshold: the number of consecutive failures opening a circuit
+    :type failure_threshold: int
+    :param recovery_timeout: the time in seconds a circuit stays open
+    :type recovery_timeout: float
+    :param key: the function returning the key of the circuit of a prepared request
+    :type key: callable
+    :param is_failure: the function telling if a response or an exception is a failure
+    :type is_failure: callable
+    :param circuits: the circuits indexed by key
+    :type circuits: dict
+    :param lock: the lock used to access the circuits
+    :type lock: threading.Lock
+
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30, key=None, is_failure=None):
+        """Create a circuit breaker with the given thresholds
+
+        :param failure_threshold: the number of consecutive failures opening a circuit
+                                  (default: :const:`5`)
+        :type failure_threshold: int
+        :param recovery_timeout: the time in seconds a circuit stays open before allowing a
+                                 trial request (default: :const:`30`)
+        :type recovery_timeout: float
+        :param key: the function taking a prepared request and returning the key of its
+                    circuit (default: :func:`requests_throttler.breaker.default_key`)
+        :type key: callable
+        :param is_failure: the function taking the response received, or the exception raised,
+                           and telling if it is a failure (default:
+                           :func:`requests_throttler.breaker.default_is_failure`)
+        :type is_failure: callable
+        :raise:
+            :ValueError: if ``failure_threshold`` is not a positive number or
+                         ``recovery_timeout`` is negative
+
+        """
+        if failure_threshold < 1:
+            raise ValueError("The failure threshold must be positive.")
+        if recovery_timeout < 0:
+            raise ValueError("The recovery timeout must be positive.")
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._key = key or default_key
+        self._is_failure = is_failure or default_is_failure
+        self._circuits = {}
+        self.lock = threading.Lock()
+
+    @property
+    def failure_threshold(self):
+        """The number of consecutive failures opening a circuit
+
+        :getter: Returns :attr:`failure_threshold`
+        :type: int
+
+        """
+        return self._failure_threshold
+
+    @property
+    def recovery_timeout(self):
+        """The time in seconds a circuit stays open
+
+        :getter: Returns :attr:`recovery_timeout`
+        :type: float
+
+        """
+        return self._recovery_timeout
+
+    def key(self, request):
+        """Return the key of the circuit of the given prepared request
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: the key
+        :rtype: hashable
+
+        """
+        return self._key(request)
+
+    @locked('lock')
+    def state(self, key):
+        """Return the state of the circuit of the given key
+
+        :param key: the key of the circuit
+        :type key: hashable
+        :return: ``closed``, ``open`` or ``half-open``
+        :rtype: string
+
+        """
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            return CLOSED
+        if circuit.state == OPEN and time.time() >= circuit.opened_at + self._recovery_timeout:
+            return HALF_OPEN
+        return circuit.state
+
+    @locked('lock')
+    def allow(self, request):
+        """Check if the given prepared request can be sent
+
+        When the request is allowed its result must be given to :meth:`record`.
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: :const:`True` if the circuit of the request is closed or the request is a
+                 trial of a half-open circuit
+        :rtype: boolean
+
+        """
+        circuit = self._circuits.get(self._key(request))
+        if circuit is None or circuit.state == CLOSED:
+            return True
+        now = time.time()
+        if circuit.state == OPEN:
+            if now < circuit.opened_at + self._recovery_timeout:
+                return False
+            circuit.state = HALF_OPEN
+            circuit.trial_at = None
+        if circuit.trial_at is not None and now < circuit.trial_at + self._recovery_timeout:
+            return False
+        circuit.trial_at = now
+        return True
+
+    @locked('lock')
+    def record(self, request, result):
+        """Record the result of the given prepared request
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :param result: the response received or the exception raised
+        :type result: requests.Response or Exception
+
+        """
+        key = self._key(request)
+        if not self._is_failure(result):
+            if key in self._circuits:
+                logger.info("Closing circuit: %s", key)
+                del self._circuits[key]
+            return
+        circuit = self._circuits.setdefault(key, _Circuit())
+        circuit.failures += 1
+        if circuit.state == HALF_OPEN or circuit.failures >= self._failure_threshold:
+            if circuit.state != OPEN:
+                logger.warning("Opening circuit after %d failures: %s", circuit.failures, key)
+            circuit.state = OPEN
+            circuit.opened_at = time.time()
+
+    @locked('lock')
+    def reset(self):
+        """Close all the circuits"""
+
+        self._circuits.clear()
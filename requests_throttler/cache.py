@@ -0,0 +1,403 @@
+"""
+.. module:: cache
+   :synopsis: The module containing the cache of the responses
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides a cache of responses that a throttler can consult before enqueueing a
+request, so that a fresh hit doesn't consume any delay.
+
+"""
+
+import os
+import copy
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
+
+CACHEABLE_METHODS = ['GET', 'HEAD']
+CACHEABLE_STATUS_CODES = [200, 203, 300, 301, 410]
+
+
+def parse_cache_control(value):
+    """Parse the value of a ``Cache-Control`` header
+
+    :param value: the value of the header
+    :type value: string
+    :return: the directives found where directives without a value are mapped to :const:`None`
+    :rtype: dict
+
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def parse_http_date(value):
+    """Parse an HTTP date returning the corresponding timestamp
+
+    :param value: the HTTP date
+    :type value: string
+    :return: the timestamp or :const:`None` if ``value`` is not a valid date
+    :rtype: float
+
+    """
+    parsed = parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    return float(mktime_tz(parsed))
+
+
+def copy_response(response, request=None):
+    """Return a shallow copy of ``response`` with its own headers
+
+    :param response: the response to copy
+    :type response: requests.Response
+    :param request: the request to associate to the copy (default: the one of ``response``)
+    :type request: requests.PreparedRequest
+    :return: the copy
+    :rtype: requests.Response
+
+    """
+    response_copy = copy.copy(response)
+    response_copy.headers = response.headers.copy()
+    if request is not None:
+        response_copy.request = request
+    return response_copy
+
+
+class CacheEntry(object):
+    """This class represents a response stored in the cache
+
+    :param response: the cached response
+    :type response: requests.Response
+    :param expires: the time after which the response is stale
+    :type expires: float
+    :param vary: the values of the request headers named by the ``Vary`` header of the
+                 response
+    :type vary: dict
+
+    """
+
+    def __init__(self, response, expires, request=None):
+        """Create a cache entry for the given response
+
+        :param response: the cached response
+        :type response: requests.Response
+        :param expires: the time after which the response is stale
+        :type expires: float
+        :param request: the request the response has been received for, used to record the
+                        values of the headers named by ``Vary`` (default: :const:`None`)
+        :type request: requests.PreparedRequest
+
+        """
+        self.response = response
+        self.expires = expires
+        self.vary = {}
+        for name in (response.headers.get('Vary') or '').split(','):
+            name = name.strip().lower()
+            if name:
+                self.vary[name] = request.headers.get(name) if request is not None else None
+
+    def matches(self, request):
+        """Check if the entry can be used for the given request according to ``Vary``
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: :const:`True` if the request headers named by ``Vary`` have the same values
+                 of the request the response has been received for
+        :rtype: boolean
+
+        """
+        for name, value in self.vary.items():
+            if request.headers.get(name) != value:
+                return False
+        return True
+
+    @property
+    def fresh(self):
+        """The flag that indicates if the entry can be used without revalidation
+
+        :getter: Returns :attr:`fresh`
+        :type: boolean
+
+        """
+        return time.time() < self.expires
+
+    @property
+    def etag(self):
+        """The ``ETag`` of the cached response
+
+        :getter: Returns :attr:`etag`
+        :type: string
+
+        """
+        return self.response.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        """The ``Last-Modified`` date of the cached response
+
+        :getter: Returns :attr:`last_modified`
+        :type: string
+
+        """
+        return self.response.headers.get('Last-Modified')
+
+    @property
+    def revalidable(self):
+        """The flag that indicates if the entry has some validators
+
+        :getter: Returns :attr:`revalidable`
+        :type: boolean
+
+        """
+        return self.etag is not None or self.last_modified is not None
+
+
+class ResponseCache(object):
+    """This class provides a two-tier cache of responses
+
+    The in-memory tier is an LRU limited to ``max_size`` entries, the on-disk tier is optional
+    and unbounded. Every entry is written to both tiers and an entry evicted from memory can
+    still be found on disk. The freshness of an entry is given by the ``Cache-Control`` and
+    ``Expires`` headers of the response or by ``ttl`` when none of them is present. Only one
+    variant per url is kept: an entry is used only if the request headers named by ``Vary``
+    match the ones of the request it has been stored for. Every response returned is a copy,
+    so that it can be used independently from the other callers.
+
+    :param max_size: the maximum number of entries kept in memory
+    :type max_size: int
+    :param directory: the directory of the on-disk tier
+    :type directory: string
+    :param ttl: the freshness lifetime of responses without explicit freshness information
+    :type ttl: float
+    :param hits: the number of fresh hits
+    :type hits: int
+    :param revalidations: the number of stale entries successfully revalidated
+    :type revalidations: int
+    :param misses: the number of misses
+    :type misses: int
+    :param lock: the lock used to make the cache thread-safe
+    :type lock: threading.Lock
+
+    """
+
+    def __init__(self, max_size=128, directory=None, ttl=0):
+        """Create a cache with the given size, directory and default lifetime
+
+        :param max_size: the maximum number of entries kept in memory (default: :const:`128`)
+        :type max_size: int
+        :param directory: the directory of the on-disk tier, no disk is used if it is
+                          :const:`None` (default: :const:`None`)
+        :type directory: string
+        :param ttl: the freshness lifetime in seconds of responses without ``Cache-Control``
+                    or ``Expires`` headers (default: :const:`0`)
+        :type ttl: float
+        :raise:
+            :ValueError: if ``max_size`` is not a positive number or ``ttl`` is negative
+
+        """
+        if max_size < 1:
+            raise ValueError("The size of the cache must be positive.")
+        if ttl < 0:
+            raise ValueError("The ttl value must be positive.")
+        self._max_size = max_size
+        self._directory = directory
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._revalidating = {}
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, request):
+        """Return the key of the given prepared request
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: the key or :const:`None` if the request is not cacheable
+        :rtype: string
+
+        """
+        if request.method not in CACHEABLE_METHODS:
+            return None
+        return "{method} {url}".format(method=request.method, url=request.url)
+
+    @locked('lock')
+    def lookup(self, request):
+        """Look up the given prepared request in the cache
+
+        If the entry found is stale but revalidable, the request is made conditional by adding
+        the ``If-None-Match`` and ``If-Modified-Since`` headers. A stale entry that cannot be
+        revalidated is discarded.
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: the cached response if the entry is fresh, :const:`None` otherwise
+        :rtype: requests.Response
+
+        """
+        key = self.key(request)
+        if key is None:
+            return None
+        entry = self._get(key)
+        if entry is None or not entry.matches(request):
+            self.misses += 1
+            return None
+        if entry.fresh:
+            self.hits += 1
+            logger.debug("Cache hit (url: %s)", request.url)
+            return copy_response(entry.response, request)
+        if not entry.revalidable:
+            self.misses += 1
+            self._discard(key)
+            return None
+        if 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+            self.misses += 1
+            return None
+        logger.debug("Revalidating stale cache entry (url: %s)", request.url)
+        if entry.etag is not None:
+            request.headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            request.headers['If-Modified-Since'] = entry.last_modified
+        self._revalidating[id(request)] = request, entry
+        return None
+
+    @locked('lock')
+    def update(self, request, response):
+        """Update the cache with the response received for the given prepared request
+
+        A ``304 Not Modified`` response to a request made conditional by :meth:`lookup`
+        refreshes the entry being revalidated, whose response is returned in place of the
+        received one. The entry is kept aside while it is revalidated, hence it is available
+        even if it has been evicted in the meantime.
+
+        :param request: the prepared request sent
+        :type request: requests.PreparedRequest
+        :param response: the response received
+        :type response: requests.Response
+        :return: the response to associate to the request
+        :rtype: requests.Response
+
+        """
+        key = self.key(request)
+        if key is None:
+            return response
+        revalidating_request, entry = self._revalidating.pop(id(request), (None, None))
+        if revalidating_request is not request:
+            entry = None
+        if response.status_code == 304 and entry is not None:
+            revalidated = copy_response(entry.response)
+            revalidated.headers.update(response.headers)
+            self.revalidations += 1
+            self._put(key, revalidated, request)
+            return copy_response(revalidated, request)
+        if response.status_code in CACHEABLE_STATUS_CODES:
+            self._put(key, response, request)
+            return copy_response(response)
+        return response
+
+    @locked('lock')
+    def abandon(self, request):
+        """Stop revalidating the entry for the given request that will never be sent
+
+        :param request: the prepared request made conditional by :meth:`lookup`
+        :type request: requests.PreparedRequest
+
+        """
+        self._revalidating.pop(id(request), None)
+
+    @locked('lock')
+    def clear(self):
+        """Remove all the entries from both the tiers"""
+
+        for key in list(self._entries):
+            self._discard(key)
+        if self._directory is not None:
+            for filename in os.listdir(self._directory):
+                if filename.endswith('.cache'):
+                    os.remove(os.path.join(self._directory, filename))
+
+    def _expires(self, response):
+        """Return the time after which the given response is stale
+
+        :param response: the response
+        :type response: requests.Response
+        :return: the expiration time or :const:`None` if the response must not be stored
+        :rtype: float
+
+        """
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in directives or response.headers.get('Vary') == '*':
+            return None
+        now = time.time()
+        if 'no-cache' in directives:
+            return now
+        if directives.get('max-age') is not None:
+            try:
+                return now + max(int(directives['max-age']), 0)
+            except ValueError:
+                return now
+        expires = parse_http_date(response.headers.get('Expires'))
+        if expires is not None:
+            date = parse_http_date(response.headers.get('Date')) or now
+            return now + max(expires - date, 0)
+        return now + self._ttl
+
+    def _put(self, key, response, request=None):
+        expires = self._expires(response)
+        if expires is None:
+            self._discard(key)
+            return
+        entry = CacheEntry(response, expires, request)
+        if not entry.fresh and not entry.revalidable:
+            self._discard(key)
+            return
+        self._remember(key, entry)
+        if self._directory is not None:
+            with open(self._path(key), 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+
+    def _get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None and self._directory is not None:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                return None
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+        if self._directory is not None and os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, digest + '.cache')
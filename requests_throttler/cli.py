@@ -0,0 +1,315 @@
+"""
+.. module:: cli
+   :synopsis: The module containing the command line tool
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the ``requests-throttler`` command, that reads the requests to send from a
+file or from the standard input, one per line, throttles them and writes a JSON line with the
+result of each of them. A line is either a url or a JSON object with the ``url`` and optionally
+the ``method``, ``headers``, ``params``, ``data``, ``json`` and ``id`` of the request. The
+requests are read as a stream: at most ``--window`` of them are waiting for their result at any
+time and the results are written in input order as soon as they are available, while the
+progress and the rate are reported on the standard error.
+
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+
+import requests
+
+from requests_throttler.throttler import BaseThrottler
+
+
+def parse_args(argv=None):
+    """Parse the command line arguments
+
+    :param argv: the arguments (default: ``sys.argv[1:]``)
+    :type argv: list(string)
+    :return: the parsed arguments
+    :rtype: argparse.Namespace
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='requests-throttler',
+        description="Send the requests read from a file, one url or JSON object per line, "
+                    "throttling them and write the results as JSON lines.")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="the file with the requests, '-' for the standard input")
+    parser.add_argument('-o', '--output', default='-',
+                        help="the file where to write the results, '-' for the standard output")
+    parser.add_argument('-X', '--method', default='GET',
+                        help="the method of the requests given as url")
+    parser.add_argument('-H', '--header', action='append', default=[], dest='headers',
+                        help="a header 'Name: value' added to every request")
+    parser.add_argument('-r', '--rate', type=float,
+                        help="the maximum average number of requests per second")
+    parser.add_argument('-b', '--burst', type=int, default=1,
+                        help="the number of requests that can be sent at once within the rate")
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help="the maximum number of requests being sent at the same time")
+    parser.add_argument('-t', '--timeout', type=float,
+                        help="the timeout in seconds of each request")
+    parser.add_argument('--rate-limit-headers', action='store_true',
+                        help="follow the quota advertised by the X-RateLimit-* headers")
+    parser.add_argument('--body-dir',
+                        help="the directory where to save the body of each response")
+    parser.add_argument('--window', type=int, default=1000,
+                        help="the maximum number of requests waiting for their result")
+    parser.add_argument('--progress-interval', type=float, default=1,
+                        help="the seconds between each progress report, 0 to disable it")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="log the activity of the throttler and the failures")
+    args = parser.parse_args(argv)
+    if args.rate is not None and args.rate <= 0:
+        parser.error("the rate must be positive")
+    if args.burst < 1 or args.window < 1:
+        parser.error("the burst and the window must be positive")
+    return args
+
+
+def get_rate_options(rate, burst=1):
+    """Return the options of the throttler enforcing the given rate and burst
+
+    A burst of :const:`1` is a delay of ``1 / rate`` seconds between each request, a larger one
+    is a limit of ``burst`` requests over any window of ``burst / rate`` seconds.
+
+    :param rate: the number of requests per second, :const:`None` means *unlimited*
+    :type rate: float
+    :param burst: the number of requests that can be sent at once (default: :const:`1`)
+    :type burst: int
+    :return: the keyword arguments of :class:`requests_throttler.throttler.BaseThrottler`
+    :rtype: dict
+
+    """
+    if rate is None:
+        return {}
+    if burst == 1:
+        return {'delay': 1.0 / rate}
+    return {'limits': [(burst, burst / rate)]}
+
+
+def parse_request(line, method='GET'):
+    """Return the request described by the given line
+
+    :param line: a url or a JSON object with the ``url`` and optionally the ``method``,
+                 ``headers``, ``params``, ``data``, ``json`` and ``id`` of the request
+    :type line: string
+    :param method: the method of a request given as url (default: ``GET``)
+    :type method: string
+    :return: a tuple of the form (`request`, `id`) or :const:`None` if the line is empty or a
+             comment
+    :rtype: (requests.Request, object)
+    :raise:
+        :ValueError: if the JSON object is invalid or has no ``url``
+
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if not line.startswith('{'):
+        return requests.Request(method=method, url=line), None
+    spec = json.loads(line)
+    if 'url' not in spec:
+        raise ValueError("The request has no url.")
+    request = requests.Request(method=spec.get('method', method), url=spec['url'],
+                               headers=spec.get('headers'), params=spec.get('params'),
+                               data=spec.get('data'), json=spec.get('json'))
+    return request, spec.get('id')
+
+
+class Progress(object):
+    """This class reports the progress and the rate of the requests on a stream
+
+    :param stream: the stream where to write the reports
+    :type stream: file
+    :param interval: the seconds between each report, :const:`0` means no report
+    :type interval: float
+    :param submitted: the number of requests submitted
+    :type submitted: int
+    :param done: the number of requests finished
+    :type done: int
+    :param failed: the number of requests finished with an exception
+    :type failed: int
+
+    """
+
+    def __init__(self, stream, interval=1):
+        """Create a progress reporting on the given stream every ``interval`` seconds
+
+        :param stream: the stream where to write the reports
+        :type stream: file
+        :param interval: the seconds between each report, :const:`0` means no report (default:
+                         :const:`1`)
+        :type interval: float
+
+        """
+        self._stream = stream
+        self.interval = interval
+        self._start = time.time()
+        self._last_report = self._start
+        self._last_done = 0
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+
+    def report(self, force=False):
+        """Write the progress if ``interval`` seconds elapsed since the last report
+
+        :param force: if :const:`True` write it anyway (default: :const:`False`)
+        :type force: boolean
+
+        """
+        now = time.time()
+        if not self.interval or not force and now - self._last_report < self.interval:
+            return
+        current_rate = (self.done - self._last_done) / max(now - self._last_report, 1e-9)
+        self._stream.write("{done}/{submitted} done, {failed} failed, {rate:.1f} req/s "
+                           "({average:.1f} req/s on average)\n".format(
+                               done=self.done, submitted=self.submitted, failed=self.failed,
+                               rate=current_rate,
+                               average=self.done / max(now - self._start, 1e-9)))
+        self._stream.flush()
+        self._last_report = now
+        self._last_done = self.done
+
+
+def get_result(index, request_id, method, url, outcome, body_dir=None):
+    """Return the result of the given finished request as a dictionary
+
+    :param index: the position of the request in the input
+    :type index: int
+    :param request_id: the id given to the request in the input
+    :type request_id: object
+    :param method: the method of the request
+    :type method: string
+    :param url: the url of the request
+    :type url: string
+    :param outcome: the finished throttled request or the exception raised reading the request
+    :type outcome: :class:`requests_throttler.throttled_request.ThrottledRequest` or Exception
+    :param body_dir: the directory where to save the body of the response (default:
+                     :const:`None`)
+    :type body_dir: string
+    :return: the ``index``, ``id``, ``method``, ``url``, ``status``, ``elapsed`` seconds,
+             ``size`` in bytes, ``body`` path and ``error`` of the request
+    :rtype: dict
+
+    """
+    result = {'index': index, 'id': request_id, 'method': method, 'url': url, 'status': None,
+              'elapsed': None, 'size': None, 'body': None, 'error': None}
+    try:
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = outcome.response
+        result['status'] = response.status_code
+        result['elapsed'] = response.elapsed.total_seconds()
+        if body_dir is None:
+            result['size'] = len(response.content)
+        else:
+            result['body'] = os.path.join(body_dir, '{index}.body'.format(index=index))
+            result['size'] = outcome.save(result['body'])
+    except Exception as e:
+        result['error'] = '{name}: {error}'.format(name=type(e).__name__, error=e)
+    return result
+
+
+def run(args, lines, output, progress, session=None):
+    """Throttle the requests read from ``lines`` and write their results to ``output``
+
+    A line that cannot be parsed is not sent and gets a result with the error.
+
+    :param args: the parsed arguments
+    :type args: argparse.Namespace
+    :param lines: the lines describing the requests
+    :type lines: iterable(string)
+    :param output: the stream where to write the results
+    :type output: file
+    :param progress: the progress to update
+    :type progress: :class:`requests_throttler.cli.Progress`
+    :param session: the session to use (default: a new :class:`requests.Session`)
+    :type session: requests.Session
+    :return: the number of failed requests
+    :rtype: int
+
+    """
+    session = session or requests.Session()
+    for header in args.headers:
+        name, _, value = header.partition(':')
+        session.headers[name.strip()] = value.strip()
+    send_options = {'stream': True} if args.body_dir is not None else None
+    throttler = BaseThrottler(name='cli', session=session, concurrency=args.concurrency,
+                              timeout=args.timeout, rate_limit_headers=args.rate_limit_headers,
+                              **get_rate_options(args.rate, args.burst))
+    waiting = deque()
+
+    def finished(outcome):
+        return isinstance(outcome, Exception) or outcome.finished
+
+    def write_next():
+        index, request_id, method, url, outcome = waiting.popleft()
+        while not finished(outcome):
+            outcome.get_exception(timeout=progress.interval or None)
+            progress.report()
+        result = get_result(index, request_id, method, url, outcome, args.body_dir)
+        output.write(json.dumps(result, sort_keys=True) + '\n')
+        output.flush()
+        progress.done += 1
+        progress.failed += result['error'] is not None
+        progress.report()
+
+    with throttler:
+        for index, line in enumerate(lines):
+            try:
+                parsed = parse_request(line, args.method)
+            except ValueError as e:
+                waiting.append((index, None, args.method, line.strip(), e))
+            else:
+                if parsed is None:
+                    continue
+                request, request_id = parsed
+                waiting.append((index, request_id, request.method, request.url,
+                                throttler.submit(request, send_options=send_options)))
+            progress.submitted += 1
+            while len(waiting) >= args.window or waiting and finished(waiting[0][4]):
+                write_next()
+    while waiting:
+        write_next()
+    throttler.wait_end()
+    progress.report(force=True)
+    return progress.failed
+
+
+def main(argv=None):
+    """The entry point of the ``requests-throttler`` command
+
+    :param argv: the arguments (default: ``sys.argv[1:]``)
+    :type argv: list(string)
+    :return: the exit status, :const:`1` if any request failed
+    :rtype: int
+
+    """
+    args = parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+    if args.body_dir is not None and not os.path.isdir(args.body_dir):
+        os.makedirs(args.body_dir)
+    lines = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        failed = run(args, lines, output, Progress(sys.stderr, args.progress_interval))
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,17 @@
 from .utils import NoCheckpointSetError
-from .throttled_request import ThrottledRequestAlreadyFinished
+from .throttled_request import \
+    ThrottledRequestAlreadyFinished, \
+    ThrottledRequestCancelled
+from .breaker import CircuitOpenError
 from .throttler import \
     ThrottlerStatusError, \
+    ThrottlerShutdownError, \
     FullRequestsPoolError
 
 __all__ = ["NoCheckpointSetError",
            "ThrottledRequestAlreadyFinished",
+           "ThrottledRequestCancelled",
+           "CircuitOpenError",
            "ThrottlerStatusError",
+           "ThrottlerShutdownError",
            "FullRequestsPoolError"]
@@ -0,0 +1,374 @@
+"""
+.. module:: limiter
+   :synopsis: The module containing the limiter of the rate of the requests
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the limiter deciding when a request can be sent. A limiter can be shared
+by several throttlers so that a single quota is enforced for all of them.
+
+"""
+
+import time
+import threading
+from collections import deque
+
+from requests_throttler.utils import SlidingWindow
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
+
+RATE_LIMIT_HEADERS = [('X-RateLimit-Remaining', 'X-RateLimit-Reset'),
+                      ('RateLimit-Remaining', 'RateLimit-Reset')]
+MAX_RESET_DELTA = 365 * 24 * 60 * 60
+# The resets advertised within this many seconds of each other belong to the same window.
+RESET_TOLERANCE = 1
+
+
+def get_delay(delay, reqs_over_time):
+    """Calculates the delay to assign
+
+    :param delay: the fixed positive amount of time that must elapsed bewteen each request
+                  in seconds
+    :type delay: float
+    :param reqs_over_time: a tuple of the form (`number of requests`, `time`) used to
+                           calculate the delay to use when it is :const:`None`. The delay
+                           will be equal to ``time``/``number of requests``.
+    :type reqs_over_time: tuple
+    :return: the value of ``delay`` to use (default :const:`0`)
+    :rtype: float
+    :raise:
+        :ValueError: if ``delay`` or the value calculated from ``reqs_over_time`` is a
+                     negative number
+
+    """
+    if delay is None:
+        if reqs_over_time is None:
+            return 0
+        n_reqs, time_for_reqs = reqs_over_time
+        if n_reqs < 0 or time_for_reqs < 0:
+            raise ValueError("The number of requests and the time value must be positive.")
+        delay = float(time_for_reqs) / n_reqs
+    if delay < 0:
+        raise ValueError("The delay value must be positive.")
+    return delay
+
+
+def parse_rate_limit_headers(headers, now=None):
+    """Return the quota advertised by the server through the given response headers
+
+    Both the ``X-RateLimit-*`` and the ``RateLimit-*`` headers are supported. The reset time
+    can be given either in seconds from now or, when larger than a year, as a Unix timestamp.
+
+    :param headers: the headers of the response
+    :type headers: dict
+    :param now: the current time (default: *now*)
+    :type now: float
+    :return: a tuple of the form (`remaining requests`, `reset time`) or :const:`None` if the
+             headers are missing or invalid
+    :rtype: (int, float)
+
+    """
+    now = now if now is not None else time.time()
+    for remaining_header, reset_header in RATE_LIMIT_HEADERS:
+        remaining = headers.get(remaining_header)
+        reset = headers.get(reset_header)
+        if remaining is None or reset is None:
+            continue
+        try:
+            remaining = max(int(remaining), 0)
+            reset = float(reset)
+        except ValueError:
+            logger.warning("Invalid rate limit headers: %s=%r, %s=%r", remaining_header,
+                           remaining, reset_header, reset)
+            return None
+        return remaining, reset if reset > MAX_RESET_DELTA else now + reset
+    return None
+
+
+class Limiter(object):
+    """This class provides the limiter of the rate of the requests
+
+    The limiter guarantees that after each request ``delay`` seconds times its cost elapse and
+    that every limit over a window of time is satisfied, each request counting as many units
+    as its cost. The clients waiting to send a request are served in order of arrival, so that
+    throttlers sharing the limiter take turns. No thread is used: each client waits on the
+    limiter's condition from its own thread.
+
+    The quota advertised by the server can be given through :meth:`sync`: until its reset
+    time the requests are sent as fast as the remaining quota allows, never slower than
+    ``delay``, and none is sent once the quota is exhausted.
+
+    :param delay: the delay in seconds between each request
+    :type delay: float
+    :param limits: the limits of requests over windows of time that must be all satisfied
+    :type limits: list(:class:`requests_throttler.utils.SlidingWindow`)
+    :param last: the time the last request has been allowed
+    :type last: float
+    :param last_cost: the cost of the last request allowed
+    :type last_cost: float
+    :param quota_remaining: the requests that can still be sent according to the server
+    :type quota_remaining: float
+    :param quota_reset: the time at which the quota of the server is reset
+    :type quota_reset: float
+    :param recorded: the total cost of the requests allowed so far
+    :type recorded: float
+    :param marks: the value of ``recorded`` right after the last request allowed to each
+                  client
+    :type marks: dict
+    :param waiting: the clients waiting to send a request in order of arrival
+    :type waiting: collections.deque
+    :param lock: the condition on which the clients wait for their turn
+    :type lock: threading.Condition
+
+    """
+
+    def __init__(self, delay=None, reqs_over_time=None, limits=None):
+        """Create a limiter with the given delay and limits
+
+        When both ``delay`` and ``reqs_over_time`` are :const:`None`, :attr:`delay` is set to
+        :const:`0`.
+
+        :param delay: the fixed positive amount of time that must elapsed bewteen each request
+                      in seconds (default: :const:`None`)
+        :type delay: float
+        :param reqs_over_time: a tuple of the form (`number of requests`, `time`) used to
+                               calculate the delay to use when it is :const:`None` (default:
+                               :const:`None`)
+        :type reqs_over_time: (float, float)
+        :param limits: a list of tuples of the form (`number of requests`, `time`) each meaning
+                       that no more than `number of requests` requests can be sent in any
+                       window of `time` seconds (default: :const:`None`)
+        :type limits: list((int, float))
+        :raise:
+            :ValueError: if ``delay`` or the value calculated from ``reqs_over_time`` is a
+                         negative number or if a limit is invalid
+
+        """
+        self._delay = get_delay(delay, reqs_over_time)
+        self._limits = [SlidingWindow(n_reqs, window) for n_reqs, window in limits or []]
+        self._last = 0
+        self._last_cost = 1
+        self._quota_remaining = None
+        self._quota_reset = None
+        self._recorded = 0
+        self._marks = {}
+        self._waiting = deque()
+        self.lock = threading.Condition(threading.Lock())
+
+    def __str__(self):
+        return "[{class_name} <{delay}, {limits}>]".format(class_name="Limiter",
+                                                           delay=repr(self._delay),
+                                                           limits=repr(self.limits))
+
+    @property
+    def delay(self):
+        """The delay value between each request
+
+        :getter: Returns :attr:`delay`
+        :type: float
+
+        """
+        return self._delay
+
+    @property
+    def limits(self):
+        """The limits of requests over windows of time
+
+        :getter: Returns :attr:`limits` as a list of tuples (`number of requests`, `time`)
+        :type: list((int, float))
+
+        """
+        return [(limit.n_reqs, limit.window) for limit in self._limits]
+
+    def set_delay(self, delay):
+        """Change the delay between each request
+
+        The new delay takes effect immediately, also for the clients already waiting.
+
+        :param delay: the fixed positive amount of time that must elapse between each request
+                      in seconds
+        :type delay: float
+        :raise:
+            :ValueError: if ``delay`` is a negative number
+
+        """
+        self._set_delay(get_delay(delay, None))
+
+    def set_rate(self, n_reqs, time_for_reqs):
+        """Change the delay between each request to ``time_for_reqs / n_reqs``
+
+        :param n_reqs: the number of requests
+        :type n_reqs: float
+        :param time_for_reqs: the time in seconds in which ``n_reqs`` requests can be sent
+        :type time_for_reqs: float
+        :raise:
+            :ValueError: if ``n_reqs`` or ``time_for_reqs`` is a negative number
+
+        """
+        self._set_delay(get_delay(None, (n_reqs, time_for_reqs)))
+
+    @locked('lock')
+    def _set_delay(self, delay):
+        """Set the delay and wake up the waiting clients"""
+
+        logger.info("Changing delay: %f ---> %f", self._delay, delay)
+        self._delay = delay
+        self.lock.notify_all()
+
+    @locked('lock')
+    def mark(self, client):
+        """Return the mark of the last request allowed to the given client
+
+        The mark given to :meth:`sync` together with the quota advertised by the response to
+        that request lets the limiter subtract the requests allowed since it was sent.
+
+        :param client: the client
+        :type client: object
+        :return: the total cost of the requests allowed up to the last one of ``client``,
+                 :const:`None` if no request has been allowed to it
+        :rtype: float
+
+        """
+        return self._marks.get(client)
+
+    @locked('lock')
+    def sync(self, remaining, reset, mark=None):
+        """Adjust the limiter to the quota advertised by the server
+
+        Until ``reset`` the delay between each request is shortened to spread the remaining
+        requests over the time left, and when no request remains the clients wait until
+        ``reset``. The requests allowed after the one whose response advertised the quota,
+        as told by its ``mark``, are subtracted from ``remaining``, as well as the ones allowed
+        afterwards until the next synchronization. Within the same quota window the remaining
+        requests never grow, so that the late responses of concurrent requests don't give back
+        the budget already spent.
+
+        :param remaining: the number of requests that can still be sent
+        :type remaining: int
+        :param reset: the time at which the quota is reset
+        :type reset: float
+        :param mark: the mark of the request whose response advertised the quota, as returned
+                     by :meth:`mark` (default: :const:`None`)
+        :type mark: float
+
+        """
+        logger.debug("Synchronizing quota: %d requests remaining until %f", remaining, reset)
+        if mark is not None:
+            remaining -= self._recorded - mark
+        if (self._quota_reset is not None and
+                abs(reset - self._quota_reset) <= RESET_TOLERANCE):
+            remaining = min(remaining, self._quota_remaining)
+        self._quota_remaining = max(remaining, 0)
+        self._quota_reset = reset
+        self.lock.notify_all()
+
+    @locked('lock')
+    def wake(self):
+        """Wake up the waiting clients so that they check again if they have to give up"""
+
+        self.lock.notify_all()
+
+    def acquire(self, client, give_up=None, deadline=None, cost=1):
+        """Wait until ``client`` can send a request and record it
+
+        While waiting, ``give_up`` is called every time the client is woken up: if it returns
+        :const:`True` the client stops waiting without sending anything. It is called holding
+        :attr:`lock`, hence it must not block.
+
+        :param client: the client that wants to send a request (e.g. the throttler)
+        :type client: object
+        :param give_up: the function telling if the client doesn't want to wait anymore
+                        (default: :const:`None`)
+        :type give_up: callable
+        :param deadline: the time after which the client stops waiting (default:
+                         :const:`None`)
+        :type deadline: float
+        :param cost: the cost of the request, the time required before the next request and
+                     the units used in the windows are proportional to it (default: :const:`1`)
+        :type cost: float
+        :return: :const:`True` if the request can be sent, :const:`False` if the client gave up
+        :rtype: boolean
+
+        """
+        with self.lock:
+            self._waiting.append(client)
+            try:
+                while True:
+                    if give_up is not None and give_up():
+                        return False
+                    now = time.time()
+                    if deadline is not None and now >= deadline:
+                        return False
+                    timeout = deadline - now if deadline is not None else None
+                    if self._waiting[0] is not client:
+                        self.lock.wait(timeout)
+                        continue
+                    remaining_time = self._remaining_time(now, cost)
+                    if remaining_time <= 0:
+                        self._record(now, cost)
+                        self._marks[client] = self._recorded
+                        return True
+                    if timeout is not None:
+                        remaining_time = min(remaining_time, timeout)
+                    logger.debug("Start sleeping for %f seconds...", remaining_time)
+                    self.lock.wait(remaining_time)
+            finally:
+                self._waiting.remove(client)
+                self.lock.notify_all()
+
+    @locked('lock')
+    def remaining_time(self, cost=1):
+        """Return the remaining time before a request of the given cost can be sent
+
+        :param cost: the cost of the request (default: :const:`1`)
+        :type cost: float
+        :return: the remaining time, not positive if a request can be sent now
+        :rtype: float
+
+        """
+        return self._remaining_time(time.time(), cost)
+
+    def _remaining_time(self, now, cost=1):
+        """Return the longest among the time required by ``delay`` and the ones required by
+        the limits, or the time left before the reset if the quota of the server is exhausted
+
+        :param now: the current time
+        :type now: float
+        :param cost: the cost of the request (default: :const:`1`)
+        :type cost: float
+        :return: the remaining time
+        :rtype: float
+
+        """
+        remaining_time = self._delay * self._last_cost - (now - self._last)
+        if self._quota_reset is not None and now < self._quota_reset:
+            if self._quota_remaining < cost:
+                remaining_time = self._quota_reset - now
+            else:
+                spacing = (self._quota_reset - self._last) / self._quota_remaining
+                remaining_time = min(remaining_time,
+                                     spacing * self._last_cost - (now - self._last))
+        for limit in self._limits:
+            remaining_time = max(remaining_time, limit.remaining(now, cost))
+        return remaining_time
+
+    def _record(self, now, cost=1):
+        """Record a request of the given cost sent at ``now``
+
+        :param now: the time the request is sent
+        :type now: float
+        :param cost: the cost of the request (default: :const:`1`)
+        :type cost: float
+
+        """
+        self._last = now
+        self._last_cost = cost
+        self._recorded += cost
+        if self._quota_reset is not None:
+            if now < self._quota_reset:
+                self._quota_remaining -= cost
+            else:
+                self._quota_remaining = self._quota_reset = None
+        for limit in self._limits:
+            limit.add(now, cost)
@@ -0,0 +1,297 @@
+"""
+.. module:: pool
+   :synopsis: The module containing the pool of the enqueued requests
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the pool in which a throttler keeps the requests waiting to be sent. The
+requests are grouped by tenant and the tenants are served by a weighted deficit round-robin, so
+that a tenant submitting many requests doesn't starve the others.
+
+"""
+
+import math
+from collections import deque
+
+from requests_throttler.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class RequestsPool(object):
+    """This class provides a pool of requests shared among tenants
+
+    Each tenant has its own FIFO queue and the tenants having some requests enqueued are
+    visited in turn. At each visit a tenant gains a credit equal to its weight and sends
+    requests as long as its credit covers their cost, hence when all the tenants are backlogged
+    the cost of the requests sent is split proportionally to the weights. A tenant that starts
+    submitting waits at most a round of the other tenants, whatever the number of requests they
+    have enqueued.
+    Enqueueing takes constant time, while dequeueing takes at most a round of the active tenants
+    whatever their weights and the costs of the requests: when no tenant can be served in a
+    round the rounds needed to serve one are credited at once.
+    An item can be discarded without being removed from its queue, that would take linear
+    time: it stops counting toward the size of the pool at once and it is skipped, without
+    consuming the credit of its tenant, once it reaches the head of the queue. Hence the items
+    must be hashable, and discarding one of several equal items skips the first of them.
+
+    :param maxlen: the maximum number of requests enqueued among all the tenants
+    :type maxlen: int
+    :param weights: the weights of the tenants, a tenant not found has weight :const:`1`
+    :type weights: dict
+    :param queues: the queues of the tenants having some requests enqueued
+    :type queues: dict
+    :param active: the tenants having some requests enqueued in order of visit
+    :type active: collections.deque
+    :param deficits: the credit left to each active tenant
+    :type deficits: dict
+    :param live: the number of copies of each enqueued item not discarded
+    :type live: dict
+    :param dead: the number of copies of each discarded item still in the queues
+    :type dead: dict
+    :param discarded: the number of discarded items still in the queues
+    :type discarded: int
+
+    """
+
+    def __init__(self, maxlen=None, weights=None):
+        """Create an empty pool with the given maximum size and weights
+
+        :param maxlen: the maximum number of requests enqueued among all the tenants,
+                       :const:`None` means *unlimited* (default: :const:`None`)
+        :type maxlen: int
+        :param weights: the weights of the tenants (default: :const:`None`)
+        :type weights: dict
+        :raise:
+            :ValueError: if a weight is not a positive number
+
+        """
+        self._maxlen = maxlen
+        self._weights = {}
+        self._queues = {}
+        self._active = deque()
+        self._deficits = {}
+        self._len = 0
+        self._live = {}
+        self._dead = {}
+        self._discarded = 0
+        for tenant, weight in (weights or {}).items():
+            self.set_weight(tenant, weight)
+
+    def __len__(self):
+        return self._len - self._discarded
+
+    @property
+    def maxlen(self):
+        """The maximum number of requests enqueued among all the tenants
+
+        :getter: Returns :attr:`maxlen`
+        :type: int
+
+        """
+        return self._maxlen
+
+    @property
+    def tenants(self):
+        """The tenants having some requests enqueued
+
+        :getter: Returns :attr:`tenants`
+        :type: list
+
+        """
+        return list(self._active)
+
+    def resize(self, maxlen):
+        """Change the maximum number of requests enqueued keeping the enqueued ones
+
+        :param maxlen: the maximum number of requests, :const:`None` means *unlimited*
+        :type maxlen: int
+        :raise:
+            :ValueError: if more than ``maxlen`` requests are enqueued
+
+        """
+        if maxlen is not None and maxlen < len(self):
+            raise ValueError("The pool cannot be smaller than the number of enqueued requests.")
+        self._maxlen = maxlen
+
+    def weight(self, tenant):
+        """Return the weight of the given tenant
+
+        :param tenant: the tenant
+        :type tenant: hashable
+        :return: the weight
+        :rtype: float
+
+        """
+        return self._weights.get(tenant, 1)
+
+    def set_weight(self, tenant, weight):
+        """Change the weight of the given tenant
+
+        :param tenant: the tenant
+        :type tenant: hashable
+        :param weight: the share of the rate of the tenant relative to the other tenants
+        :type weight: float
+        :raise:
+            :ValueError: if ``weight`` is not a positive number
+
+        """
+        if weight <= 0:
+            raise ValueError("The weight of a tenant must be positive.")
+        logger.info("Setting weight of tenant %r: %s", tenant, weight)
+        self._weights[tenant] = weight
+
+    def full(self):
+        """Check if the pool is full
+
+        :return: :const:`True` if ``maxlen`` requests not discarded are enqueued
+        :rtype: boolean
+
+        """
+        return len(self) == self._maxlen
+
+    def append(self, item, tenant=None, cost=1):
+        """Enqueue the given item for the given tenant
+
+        :param item: the item to enqueue
+        :type item: hashable
+        :param tenant: the tenant (default: :const:`None`)
+        :type tenant: hashable
+        :param cost: the credit required to dequeue the item (default: :const:`1`)
+        :type cost: float
+        :raise:
+            :IndexError: if the pool is full
+
+        """
+        if self.full():
+            raise IndexError("append to a full pool")
+        tenant_queue = self._queues.get(tenant)
+        if tenant_queue is None:
+            tenant_queue = self._queues[tenant] = deque()
+            self._active.append(tenant)
+            self._deficits[tenant] = 0
+        tenant_queue.append((item, cost))
+        self._live[item] = self._live.get(item, 0) + 1
+        self._len += 1
+
+    def discard(self, item):
+        """Discard the given item if it is enqueued, so that it is never dequeued
+
+        :param item: the item to discard
+        :type item: hashable
+        :return: :const:`True` if the item has been discarded, :const:`False` if it is not
+                 enqueued
+        :rtype: boolean
+
+        """
+        if item not in self._live:
+            return False
+        self._decrement(self._live, item)
+        self._dead[item] = self._dead.get(item, 0) + 1
+        self._discarded += 1
+        return True
+
+    def popleft(self):
+        """Dequeue the next item according to the weights of the tenants
+
+        :return: the next item
+        :rtype: object
+        :raise:
+            :IndexError: if the pool is empty
+
+        """
+        if len(self) == 0:
+            raise IndexError("pop from an empty pool")
+        visited = 0
+        while True:
+            tenant = self._active[0]
+            tenant_queue = self._queues[tenant]
+            if not self._skip_discarded(tenant_queue):
+                self._forget(tenant)
+                continue
+            cost = tenant_queue[0][1]
+            if self._deficits[tenant] >= cost:
+                break
+            if visited == len(self._active):
+                self._skip_rounds()
+                visited = 0
+            self._deficits[tenant] += self.weight(tenant)
+            if self._deficits[tenant] < cost:
+                self._active.rotate(-1)
+                visited += 1
+        item, cost = tenant_queue.popleft()
+        self._decrement(self._live, item)
+        self._len -= 1
+        self._deficits[tenant] -= cost
+        if not self._skip_discarded(tenant_queue):
+            self._forget(tenant)
+        elif self._deficits[tenant] < tenant_queue[0][1]:
+            self._active.rotate(-1)
+        return item
+
+    def _skip_discarded(self, tenant_queue):
+        """Remove the discarded items at the head of the given queue
+
+        :param tenant_queue: the queue of a tenant
+        :type tenant_queue: collections.deque
+        :return: :const:`True` if some items are left in the queue, :const:`False` otherwise
+        :rtype: boolean
+
+        """
+        while tenant_queue and tenant_queue[0][0] in self._dead:
+            item, _ = tenant_queue.popleft()
+            self._decrement(self._dead, item)
+            self._len -= 1
+            self._discarded -= 1
+        return bool(tenant_queue)
+
+    def _decrement(self, counts, item):
+        """Decrement the number of copies of the given item in the given counts
+
+        :param counts: the number of copies of each item
+        :type counts: dict
+        :param item: the item
+        :type item: hashable
+
+        """
+        if counts[item] == 1:
+            del counts[item]
+        else:
+            counts[item] -= 1
+
+    def _skip_rounds(self):
+        """Credit the active tenants with the rounds in which none of them would be served
+
+        It is called after a whole round in which no tenant could be served: each tenant needs
+        a number of rounds to cover the cost of its first item, and all the rounds before the
+        shortest of them are credited at once.
+
+        """
+        rounds = min(int(math.ceil((self._queues[tenant][0][1] - self._deficits[tenant]) /
+                                   float(self.weight(tenant))))
+                     for tenant in self._active)
+        if rounds > 1:
+            for tenant in self._active:
+                self._deficits[tenant] += (rounds - 1) * self.weight(tenant)
+
+    def clear(self):
+        """Remove all the enqueued items"""
+
+        self._queues.clear()
+        self._active.clear()
+        self._deficits.clear()
+        self._len = 0
+        self._live.clear()
+        self._dead.clear()
+        self._discarded = 0
+
+    def _forget(self, tenant):
+        """Remove the given tenant, whose queue is empty, from the active ones
+
+        :param tenant: the tenant
+        :type tenant: hashable
+
+        """
+        self._active.popleft()
+        del self._queues[tenant]
+        del self._deficits[tenant]
@@ -0,0 +1,521 @@
+"""
+.. module:: recording
+   :synopsis: The module containing the recording and the replay of the traffic
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the recorder that a throttler uses to write a trace of the requests it
+sends, and the replay of a trace through any throttler against a local stub server that answers
+each request as recorded, so that the settings of a throttler can be evaluated offline against
+real traffic. The stub server speaks HTTP/1.1, while the optional one speaking HTTP/2 requires
+the ``h2`` package.
+
+A trace is a file with a JSON object per line, one for each request sent, having the fields:
+
+- ``submitted``: the seconds from the start of the recording to the submission
+- ``sent``: the seconds from the start of the recording to the sending
+- ``latency``: the seconds spent sending the request and receiving the response
+- ``method`` and ``url``: the method and the url of the request
+- ``status``: the status code of the response or :const:`None` if an exception occurred
+- ``size``: the size in bytes of the body of the response, if known
+- ``error``: the name of the exception occurred, if any
+- ``batch``: the number of requests sent together with it
+
+"""
+
+import json
+import time
+import socket
+import threading
+from collections import namedtuple
+
+import requests
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit
+
+try:
+    import h2.config
+    import h2.events
+    import h2.exceptions
+    import h2.connection
+except ImportError:
+    h2 = None
+
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
+
+REPLAY_STATUS_HEADER = 'X-Replay-Status'
+REPLAY_LATENCY_HEADER = 'X-Replay-Latency'
+REPLAY_SIZE_HEADER = 'X-Replay-Size'
+
+
+ReplaySummary = namedtuple('ReplaySummary', ['successes', 'failures', 'elapsed'])
+
+
+def read_trace(source):
+    """Read the records of a trace
+
+    :param source: the path of the trace or a file-like object
+    :type source: string or file
+    :return: the records
+    :rtype: generator(dict)
+
+    """
+    if not hasattr(source, 'read'):
+        with open(source) as f:
+            for record in read_trace(f):
+                yield record
+        return
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Recorder(object):
+    """This class provides the recording of the requests sent by a throttler into a trace
+
+    A throttler created with a recorder records every request it sends once its response has
+    been received or an exception occurred. The recorder can be shared by several throttlers.
+
+    :param destination: the file-like object where the records are written
+    :type destination: file
+    :param start: the time the recording started
+    :type start: float
+    :param records: the number of requests recorded
+    :type records: int
+    :param lock: the lock used to write the records
+    :type lock: threading.Lock
+
+    """
+
+    def __init__(self, destination):
+        """Create a recorder writing to the given destination
+
+        :param destination: the path of the trace or a file-like object opened in text mode
+        :type destination: string or file
+
+        """
+        self._owned = not hasattr(destination, 'write')
+        self._destination = open(destination, 'w') if self._owned else destination
+        self._start = time.time()
+        self._records = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def records(self):
+        """The number of requests recorded
+
+        :getter: Returns :attr:`records`
+        :type: int
+
+        """
+        return self._records
+
+    @locked('lock')
+    def record(self, throttled_request, sent_at, finished_at, batch=1):
+        """Record the given finished throttled request
+
+        :param throttled_request: the finished throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param sent_at: the time the request has been sent
+        :type sent_at: float
+        :param finished_at: the time the response has been received or the exception occurred
+        :type finished_at: float
+        :param batch: the number of requests sent together with it (default: :const:`1`)
+        :type batch: int
+
+        """
+        request = throttled_request.request
+        record = {'submitted': round(throttled_request.submitted_at - self._start, 6),
+                  'sent': round(sent_at - self._start, 6),
+                  'latency': round(finished_at - sent_at, 6),
+                  'method': request.method, 'url': request.url, 'status': None,
+                  'size': None, 'error': None, 'batch': batch}
+        exception = throttled_request.get_exception()
+        if exception is not None:
+            record['error'] = type(exception).__name__
+        else:
+            response = throttled_request.response
+            record['status'] = response.status_code
+            record['size'] = self._size(throttled_request, response)
+        self._destination.write(json.dumps(record, sort_keys=True) + '\n')
+        self._records += 1
+
+    def _size(self, throttled_request, response):
+        """Return the size of the body of the response without consuming a streamed one
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param response: its response
+        :type response: requests.Response
+        :return: the size in bytes or :const:`None` if unknown
+        :rtype: int
+
+        """
+        if not throttled_request.send_options.get('stream'):
+            return len(response.content or b'')
+        content_length = response.headers.get('Content-Length')
+        return int(content_length) if content_length is not None else None
+
+    @locked('lock')
+    def flush(self):
+        """Flush the records written so far"""
+
+        self._destination.flush()
+
+    @locked('lock')
+    def close(self):
+        """Flush the records and close the destination if it has been opened by the recorder"""
+
+        self._destination.flush()
+        if self._owned:
+            self._destination.close()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """The handler answering each request as described by its replay headers"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(float(self.headers.get(REPLAY_LATENCY_HEADER) or 0))
+        status = int(self.headers.get(REPLAY_STATUS_HEADER) or 200)
+        if not status:
+            self.close_connection = True
+            return
+        size = int(self.headers.get(REPLAY_SIZE_HEADER) or 0)
+        if self.command == 'HEAD' or status < 200 or status in (204, 304):
+            size = 0
+        self.send_response(status)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        if size:
+            self.wfile.write(b'x' * size)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = _reply
+
+    def log_message(self, format, *args):
+        logger.debug("Stub server: " + format, *args)
+
+
+class StubServer(object):
+    """This class provides a local HTTP server answering the replayed requests
+
+    Each request is answered after the latency and with the status and the size of the body
+    given by its ``X-Replay-Latency``, ``X-Replay-Status`` and ``X-Replay-Size`` headers. A
+    status of :const:`0` closes the connection without answering, so that the client fails.
+
+    :param server: the HTTP server
+    :type server: http.server.HTTPServer
+    :param thread: the thread serving the requests
+    :type thread: threading.Thread
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        """Create a stub server listening on the given address
+
+        :param host: the host (default: ``127.0.0.1``)
+        :type host: string
+        :param port: the port, :const:`0` means any free port (default: :const:`0`)
+        :type port: int
+
+        """
+        self._server = _ThreadingHTTPServer((host, port), _StubHandler)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        """The url of the server
+
+        :getter: Returns :attr:`url`
+        :type: string
+
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    @property
+    def connections(self):
+        """The number of connections accepted
+
+        :getter: Returns :attr:`connections`
+        :type: int
+
+        """
+        return self._server.connections
+
+    def start(self):
+        """Start serving the requests from a daemon thread"""
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving the requests and close the server"""
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class _H2StubConnection(object):
+    """The HTTP/2 connection answering the streams as described by their replay headers"""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self._headers = {}
+        self.lock = threading.Lock()
+
+    @locked('lock')
+    def _flush(self):
+        data = self._conn.data_to_send()
+        if data:
+            self._sock.sendall(data)
+
+    def serve(self):
+        with self.lock:
+            self._conn.initiate_connection()
+        self._flush()
+        try:
+            while True:
+                data = self._sock.recv(65535)
+                if not data:
+                    break
+                with self.lock:
+                    events = self._conn.receive_data(data)
+                for event in events:
+                    self._handle(event)
+                self._flush()
+        except (socket.error, h2.exceptions.H2Error) as e:
+            logger.debug("Stub server: connection closed (%s)", e)
+        finally:
+            self._sock.close()
+
+    def _handle(self, event):
+        if isinstance(event, h2.events.RequestReceived):
+            self._headers[event.stream_id] = dict(event.headers)
+        elif isinstance(event, h2.events.DataReceived):
+            with self.lock:
+                self._conn.acknowledge_received_data(event.flow_controlled_length,
+                                                     event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded):
+            headers = self._headers.pop(event.stream_id, {})
+            latency = float(headers.get(REPLAY_LATENCY_HEADER.lower()) or 0)
+            timer = threading.Timer(latency, self._reply, (event.stream_id, headers))
+            timer.daemon = True
+            timer.start()
+
+    def _reply(self, stream_id, headers):
+        status = int(headers.get(REPLAY_STATUS_HEADER.lower()) or 200)
+        size = int(headers.get(REPLAY_SIZE_HEADER.lower()) or 0)
+        if headers.get(':method') == 'HEAD' or status < 200 or status in (204, 304):
+            size = 0
+        try:
+            with self.lock:
+                if not status:
+                    self._conn.reset_stream(stream_id)
+                else:
+                    self._conn.send_headers(stream_id, [(':status', str(status)),
+                                                        ('content-length', str(size))],
+                                            end_stream=not size)
+                    frame_size = self._conn.max_outbound_frame_size
+                    for offset in range(0, size, frame_size):
+                        self._conn.send_data(stream_id, b'x' * min(frame_size, size - offset),
+                                             end_stream=offset + frame_size >= size)
+            self._flush()
+        except (socket.error, h2.exceptions.H2Error) as e:
+            logger.debug("Stub server: unable to answer stream %d (%s)", stream_id, e)
+
+
+class H2StubServer(object):
+    """This class provides a local HTTP/2 server answering the replayed requests
+
+    It answers the requests as :class:`requests_throttler.recording.StubServer` does, speaking
+    HTTP/2 over plain text with prior knowledge, and multiplexes the concurrent requests of a
+    connection. A status of :const:`0` resets the stream. It requires the ``h2`` package, and
+    the bodies of the responses should fit the flow control window of :const:`65535` bytes.
+
+    :param sock: the listening socket
+    :type sock: socket.socket
+    :param thread: the thread accepting the connections
+    :type thread: threading.Thread
+    :param connections: the number of connections accepted
+    :type connections: int
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        """Create a stub server listening on the given address
+
+        :param host: the host (default: ``127.0.0.1``)
+        :type host: string
+        :param port: the port, :const:`0` means any free port (default: :const:`0`)
+        :type port: int
+        :raise:
+            :ImportError: if h2 is not installed
+
+        """
+        if h2 is None:
+            raise ImportError("The HTTP/2 stub server requires h2.")
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(128)
+        self._thread = None
+        self._connections = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        """The url of the server
+
+        :getter: Returns :attr:`url`
+        :type: string
+
+        """
+        host, port = self._sock.getsockname()[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    @property
+    def connections(self):
+        """The number of connections accepted
+
+        :getter: Returns :attr:`connections`
+        :type: int
+
+        """
+        return self._connections
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._sock.accept()
+            except socket.error:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connections += 1
+            thread = threading.Thread(target=_H2StubConnection(sock).serve,
+                                      name='h2-stub-connection')
+            thread.daemon = True
+            thread.start()
+
+    def start(self):
+        """Start accepting the connections from a daemon thread"""
+
+        self._thread = threading.Thread(target=self._accept, name='h2-stub-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop accepting the connections and close the server"""
+
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+        self._thread.join()
+
+
+def replay_request(record, url):
+    """Return the request replaying the given record against the stub server at ``url``
+
+    :param record: the record of the trace
+    :type record: dict
+    :param url: the url of the stub server
+    :type url: string
+    :return: the request having the path and the query of the recorded one
+    :rtype: requests.Request
+
+    """
+    parts = urlsplit(record['url'])
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    status = record['status'] if record['status'] is not None else 0
+    headers = {REPLAY_STATUS_HEADER: str(status),
+               REPLAY_LATENCY_HEADER: repr(record['latency']),
+               REPLAY_SIZE_HEADER: str(record['size'] or 0)}
+    return requests.Request(method=record['method'], url=url + path, headers=headers)
+
+
+def replay(trace, throttler, url, speed=1.0):
+    """Submit the requests of a trace to the given throttler at the times they were submitted
+
+    The throttler is started and shutdown by the replay, and the requests should be sent to a
+    :class:`requests_throttler.recording.StubServer` listening at ``url`` that answers them
+    with the recorded latencies. A recorder given to the throttler records the new trace, to
+    compare with the replayed one.
+
+    :param trace: the path of the trace, a file-like object or the records
+    :type trace: string or file or iterable(dict)
+    :param throttler: the throttler to evaluate, not started yet
+    :type throttler: :class:`requests_throttler.throttler.BaseThrottler`
+    :param url: the url of the stub server
+    :type url: string
+    :param speed: the factor by which the submissions are accelerated (default: :const:`1.0`)
+    :type speed: float
+    :return: the summary of the replay
+    :rtype: :class:`requests_throttler.recording.ReplaySummary`
+    :raise:
+        :ValueError: if ``speed`` is not a positive number
+
+    """
+    if speed <= 0:
+        raise ValueError("The speed must be positive.")
+    records = trace if isinstance(trace, (list, tuple)) else read_trace(trace)
+    throttled_requests = []
+    start = time.time()
+    with throttler:
+        for record in sorted(records, key=lambda record: record['submitted']):
+            wait = start + record['submitted'] / speed - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            throttled_requests.append(throttler.submit(replay_request(record, url)))
+    throttler.wait_end()
+    failures = sum(1 for throttled_request in throttled_requests
+                   if throttled_request.get_exception() is not None)
+    return ReplaySummary(len(throttled_requests) - failures, failures, time.time() - start)
@@ -0,0 +1,293 @@
+"""
+.. module:: sessions
+   :synopsis: The module containing the pool of sessions used by the throttlers
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the pool of sessions used to send the requests concurrently.
+
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE, DEFAULT_POOLBLOCK
+
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
+
+
+def pool_config(adapter):
+    """Return the configuration of the connection pools of an HTTP adapter
+
+    :param adapter: the adapter
+    :type adapter: requests.adapters.HTTPAdapter
+    :return: a tuple of the form (``connections``, ``maxsize``, ``block``) as accepted by
+             :meth:`requests.adapters.HTTPAdapter.init_poolmanager`
+    :rtype: (int, int, boolean)
+
+    """
+    return (getattr(adapter, '_pool_connections', DEFAULT_POOLSIZE),
+            getattr(adapter, '_pool_maxsize', DEFAULT_POOLSIZE),
+            getattr(adapter, '_pool_block', DEFAULT_POOLBLOCK))
+
+
+def resize_adapters(session, size):
+    """Make the connection pools of the HTTP adapters of ``session`` hold at least ``size``
+    connections
+
+    Adapters that are not :class:`requests.adapters.HTTPAdapter` are left untouched.
+
+    :param session: the session whose adapters are to be resized
+    :type session: requests.Session
+    :param size: the minimum number of connections kept alive per host
+    :type size: int
+
+    """
+    for adapter in session.adapters.values():
+        if isinstance(adapter, HTTPAdapter):
+            connections, maxsize, block = pool_config(adapter)
+            if maxsize < size:
+                adapter.init_poolmanager(connections, size, block=block)
+
+
+def shallow_copy(obj):
+    """Return a copy of ``obj`` of the same type sharing all its attributes
+
+    Unlike :func:`copy.copy` the attributes not listed in ``__attrs__`` by the objects of
+    :mod:`requests` are kept, hence subclasses keep their own state.
+
+    :param obj: the object to copy
+    :return: the copy
+
+    """
+    obj_copy = object.__new__(type(obj))
+    obj_copy.__dict__.update(obj.__dict__)
+    return obj_copy
+
+
+def clone_session(session):
+    """Return a new session of the same type and with the same configuration of ``session``
+
+    Headers, cookies, proxies and hooks are copied, hence they're not shared between the two
+    sessions afterwards. The adapters are copies too, keeping their types, and the HTTP ones
+    get their own connection pools.
+
+    :param session: the session to clone
+    :type session: requests.Session
+    :return: the new session
+    :rtype: requests.Session
+
+    """
+    clone = shallow_copy(session)
+    clone.headers = session.headers.copy()
+    clone.proxies = dict(session.proxies)
+    clone.hooks = dict((event, list(hooks)) for event, hooks in session.hooks.items())
+    clone.cookies = session.cookies.copy()
+    clone.adapters = session.adapters.__class__()
+    for prefix, adapter in session.adapters.items():
+        adapter = shallow_copy(adapter)
+        if isinstance(adapter, HTTPAdapter):
+            connections, maxsize, block = pool_config(adapter)
+            adapter.init_poolmanager(connections, maxsize, block=block)
+        clone.mount(prefix, adapter)
+    return clone
+
+
+class SessionPool(object):
+    """This class provides the sessions used by the concurrent senders of a throttler
+
+    When not sharded every sender uses the given session whose connection pools are sized to
+    the number of senders. When sharded, each sender thread is bound to its own clone of the
+    given session, so that no session is used concurrently.
+
+    :param session: the session used to configure the pool
+    :type session: requests.Session
+    :param size: the number of concurrent senders
+    :type size: int
+    :param shard: the flag that indicates if each sender has its own session
+    :type shard: boolean
+    :param sessions: the sessions of the pool
+    :type sessions: list(requests.Session)
+    :param bindings: the session bound to each sender thread
+    :type bindings: threading.local
+    :param lock: the lock used to bind the sender threads to the sessions
+    :type lock: threading.Lock
+
+    """
+
+    def __init__(self, session=None, size=1, shard=False):
+        """Create a pool of sessions for the given number of concurrent senders
+
+        :param session: the session used to configure the pool (default: a new session)
+        :type session: requests.Session
+        :param size: the number of concurrent senders (default: :const:`1`)
+        :type size: int
+        :param shard: if :const:`True` every sender thread uses its own session (default:
+                      :const:`False`)
+        :type shard: boolean
+        :raise:
+            :ValueError: if ``size`` is not a positive number
+
+        """
+        if size < 1:
+            raise ValueError("The size of the pool must be positive.")
+        self._session = session if session is not None else requests.Session()
+        self._size = size
+        self._shard = shard
+        if shard:
+            self._sessions = [clone_session(self._session) for i in range(size)]
+        else:
+            resize_adapters(self._session, size)
+            self._sessions = [self._session]
+        self._bindings = threading.local()
+        self._bound = 0
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        """The number of concurrent senders
+
+        :getter: Returns :attr:`size`
+        :type: int
+
+        """
+        return self._size
+
+    @property
+    def shard(self):
+        """The flag that indicates if each sender has its own session
+
+        :getter: Returns :attr:`shard`
+        :type: boolean
+
+        """
+        return self._shard
+
+    @locked('lock')
+    def resize(self, size):
+        """Change the number of concurrent senders
+
+        When not sharded the connection pools are grown if needed, otherwise new shards are
+        added. Shards are never removed, hence the ones in excess stay bound to their threads.
+
+        :param size: the new number of concurrent senders
+        :type size: int
+        :raise:
+            :ValueError: if ``size`` is not a positive number
+
+        """
+        if size < 1:
+            raise ValueError("The size of the pool must be positive.")
+        if self._shard:
+            while len(self._sessions) < size:
+                self._sessions.append(clone_session(self._session))
+        else:
+            resize_adapters(self._session, size)
+        self._size = size
+
+    def session(self):
+        """Return the session to use from the current thread
+
+        :return: the session bound to the current thread
+        :rtype: requests.Session
+
+        """
+        if not self._shard:
+            return self._session
+        session = getattr(self._bindings, 'session', None)
+        if session is None:
+            session = self._bind()
+        return session
+
+    @locked('lock')
+    def _bind(self):
+        """Bind the current thread to the next session in a round robin fashion
+
+        :return: the session bound
+        :rtype: requests.Session
+
+        """
+        session = self._sessions[self._bound % len(self._sessions)]
+        self._bound += 1
+        self._bindings.session = session
+        return session
+
+    def warm(self, url, connections=None):
+        """Open keep-alive connections towards the host of ``url`` before sending anything
+
+        The connections are shared among the shards when the pool is sharded. Nothing is
+        opened if the adapter doesn't expose the connection pools of :mod:`urllib3`.
+
+        :param url: the url of the host to connect to
+        :type url: string
+        :param connections: the number of connections to open (default: :attr:`size`)
+        :type connections: int
+        :return: the number of connections opened
+        :rtype: int
+
+        """
+        connections = connections if connections is not None else self._size
+        opened = 0
+        for i, session in enumerate(self._sessions):
+            to_open = connections // len(self._sessions)
+            if i < connections % len(self._sessions):
+                to_open += 1
+            opened += self._warm(session, url, to_open)
+        logger.info("Opened %d connections (url: %s)", opened, url)
+        return opened
+
+    def _warm(self, session, url, connections):
+        adapter = session.get_adapter(url)
+        if not isinstance(adapter, HTTPAdapter) or connections <= 0:
+            return 0
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            request = requests.Request(method='GET', url=url).prepare()
+            settings = session.merge_environment_settings(url, {}, None, session.verify,
+                                                          session.cert)
+            pool = adapter.get_connection_with_tls_context(request, settings['verify'],
+                                                           proxies=settings['proxies'],
+                                                           cert=settings['cert'])
+        elif hasattr(adapter, 'get_connection'):
+            pool = adapter.get_connection(url)
+        else:
+            pool = None
+        get_conn = getattr(pool, '_get_conn', None)
+        put_conn = getattr(pool, '_put_conn', None)
+        if get_conn is None or put_conn is None:
+            logger.warning("Unable to open connections in advance (url: %s).", url)
+            return 0
+        conns = [get_conn() for i in range(connections)]
+        try:
+            for conn in conns:
+                conn.connect()
+        finally:
+            for conn in conns:
+                put_conn(conn)
+        return len(conns)
+
+    def stats(self):
+        """Return the statistics about the connections reuse
+
+        The statistics are of the form ``{'requests': ..., 'connections': ..., 'reused': ...}``
+        where ``requests`` is the number of requests performed, ``connections`` the number of
+        connections opened and ``reused`` the number of requests that reused a connection.
+
+        :return: the statistics
+        :rtype: dict
+
+        """
+        n_requests, n_connections = 0, 0
+        for session in self._sessions:
+            for adapter in session.adapters.values():
+                if not isinstance(adapter, HTTPAdapter):
+                    continue
+                pools = getattr(adapter.poolmanager, 'pools', {})
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    n_requests += getattr(pool, 'num_requests', 0)
+                    n_connections += getattr(pool, 'num_connections', 0)
+        return {'requests': n_requests,
+                'connections': n_connections,
+                'reused': max(n_requests - n_connections, 0)}
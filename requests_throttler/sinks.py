@@ -0,0 +1,328 @@
+"""
+.. module:: sinks
+   :synopsis: The module containing the sinks of the finished requests
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the sinks that a throttler gives each request to as soon as it is finished,
+so that long-running jobs don't need to keep the throttled requests, and their responses, to
+collect the results. The sinks converting the requests into records keep only the records, and
+write them in batches so that a syscall is made every ``batch_size`` results.
+
+"""
+
+import os
+import json
+import threading
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
+
+
+def result_record(throttled_request):
+    """Return the metadata of the result of the given finished throttled request
+
+    :param throttled_request: the finished throttled request
+    :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+    :return: the ``method``, ``url``, ``status``, ``elapsed`` seconds, ``size`` in bytes and
+             ``error`` of the request, :const:`None` when not available
+    :rtype: dict
+
+    """
+    request = throttled_request.request
+    record = {'method': getattr(request, 'method', None), 'url': getattr(request, 'url', None),
+              'status': None, 'elapsed': None, 'size': None, 'error': None}
+    exception = throttled_request.get_exception()
+    if exception is not None:
+        record['error'] = '{name}: {error}'.format(name=type(exception).__name__,
+                                                  error=exception)
+        return record
+    response = throttled_request.response
+    record['status'] = response.status_code
+    if response.elapsed is not None:
+        record['elapsed'] = response.elapsed.total_seconds()
+    if throttled_request.send_options.get('stream'):
+        content_length = response.headers.get('Content-Length')
+        record['size'] = int(content_length) if content_length is not None else None
+    else:
+        record['size'] = len(response.content or b'')
+    return record
+
+
+class Sink(object):
+    """This class is the base of the sinks of the finished requests
+
+    Each finished request given to :meth:`put` is converted to an item by :meth:`convert`, and
+    the items are written by :meth:`write` every ``batch_size`` of them and when the sink is
+    flushed or closed. A subclass overrides :meth:`write` and optionally :meth:`convert`.
+
+    :param batch_size: the number of items written at once
+    :type batch_size: int
+    :param items: the items not written yet
+    :type items: list
+    :param lock: the lock used to access the items
+    :type lock: threading.Lock
+
+    """
+
+    def __init__(self, batch_size=1):
+        """Create a sink writing ``batch_size`` items at once
+
+        :param batch_size: the number of items written at once (default: :const:`1`)
+        :type batch_size: int
+        :raise:
+            :ValueError: if ``batch_size`` is not a positive number
+
+        """
+        if batch_size < 1:
+            raise ValueError("The batch size must be positive.")
+        self._batch_size = batch_size
+        self._items = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def batch_size(self):
+        """The number of items written at once
+
+        :getter: Returns :attr:`batch_size`
+        :type: int
+
+        """
+        return self._batch_size
+
+    def put(self, throttled_request):
+        """Give the given finished throttled request to the sink
+
+        :param throttled_request: the finished throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        item = self.convert(throttled_request)
+        with self.lock:
+            self._items.append(item)
+            if len(self._items) < self._batch_size:
+                return
+            items, self._items = self._items, []
+            self.write(items)
+
+    @locked('lock')
+    def flush(self):
+        """Write the items not written yet"""
+
+        items, self._items = self._items, []
+        if items:
+            self.write(items)
+
+    def close(self):
+        """Flush the sink and release its resources"""
+
+        self.flush()
+
+    def convert(self, throttled_request):
+        """Return the item to write for the given finished throttled request
+
+        :param throttled_request: the finished throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: the item, by default the throttled request itself
+        :rtype: object
+
+        """
+        return throttled_request
+
+    def write(self, items):
+        """Write the given items
+
+        It is called holding :attr:`lock`, hence the items are written in the order they have
+        been converted.
+
+        :param items: the items
+        :type items: list
+
+        """
+        raise NotImplementedError("The write method must be overridden.")
+
+
+class CallbackSink(Sink):
+    """This class provides a sink calling a function with each finished request"""
+
+    def __init__(self, callback, batch_size=1):
+        """Create a sink calling ``callback`` with each finished throttled request
+
+        :param callback: the function taking a finished throttled request
+        :type callback: callable
+        :param batch_size: the number of requests given to ``callback`` at once, one by one
+                           (default: :const:`1`)
+        :type batch_size: int
+
+        """
+        super(CallbackSink, self).__init__(batch_size=batch_size)
+        self._callback = callback
+
+    def write(self, items):
+        for throttled_request in items:
+            self._callback(throttled_request)
+
+
+class JsonLinesSink(Sink):
+    """This class provides a sink writing the metadata of each result as a JSON line
+
+    The records are the ones of :func:`requests_throttler.sinks.result_record`, the bodies
+    aren't kept.
+
+    """
+
+    def __init__(self, destination, batch_size=100):
+        """Create a sink writing to the given destination
+
+        :param destination: the path of the file or a file-like object opened in text mode
+        :type destination: string or file
+        :param batch_size: the number of lines written at once (default: :const:`100`)
+        :type batch_size: int
+
+        """
+        super(JsonLinesSink, self).__init__(batch_size=batch_size)
+        self._owned = not hasattr(destination, 'write')
+        self._destination = open(destination, 'w') if self._owned else destination
+
+    def convert(self, throttled_request):
+        return result_record(throttled_request)
+
+    def write(self, items):
+        self._destination.write(''.join(json.dumps(record, sort_keys=True) + '\n'
+                                        for record in items))
+
+    def close(self):
+        super(JsonLinesSink, self).close()
+        self._destination.flush()
+        if self._owned:
+            self._destination.close()
+
+
+class DirectorySink(Sink):
+    """This class provides a sink saving the body of each response to a directory
+
+    The bodies are saved in the order the requests finish as ``<n>.body``, ``n`` starting from
+    :const:`0`, and the record of each result, with the path of its body in ``body``, is
+    appended to the ``index.jsonl`` file of the directory.
+
+    """
+
+    INDEX = 'index.jsonl'
+
+    def __init__(self, directory, batch_size=100):
+        """Create a sink saving the bodies to the given directory, created if missing
+
+        :param directory: the path of the directory
+        :type directory: string
+        :param batch_size: the number of results written at once (default: :const:`100`)
+        :type batch_size: int
+
+        """
+        super(DirectorySink, self).__init__(batch_size=batch_size)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._count = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def directory(self):
+        """The path of the directory
+
+        :getter: Returns :attr:`directory`
+        :type: string
+
+        """
+        return self._directory
+
+    def convert(self, throttled_request):
+        record = result_record(throttled_request)
+        body = None
+        if record['error'] is None:
+            body = throttled_request.response.content or b''
+            record['size'] = len(body)
+            with self._count_lock:
+                record['body'] = os.path.join(self._directory,
+                                              '{n}.body'.format(n=self._count))
+                self._count += 1
+        return record, body
+
+    def write(self, items):
+        for record, body in items:
+            if body is not None:
+                with open(record['body'], 'wb') as f:
+                    f.write(body)
+        with open(os.path.join(self._directory, self.INDEX), 'a') as index:
+            index.write(''.join(json.dumps(record, sort_keys=True) + '\n'
+                                for record, _ in items))
+
+
+class QueueSink(Sink):
+    """This class provides a sink putting each finished request into a bounded queue
+
+    When the queue is full the thread finishing a request waits for the consumer, hence the
+    throttler doesn't go further than ``maxsize`` results ahead of it. Iterating over the sink
+    yields the finished requests until it is closed.
+
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, maxsize=1000):
+        """Create a sink with a queue of the given size
+
+        :param maxsize: the maximum number of requests in the queue (default: :const:`1000`)
+        :type maxsize: int
+        :raise:
+            :ValueError: if ``maxsize`` is not a positive number
+
+        """
+        if maxsize < 1:
+            raise ValueError("The size of the queue must be positive.")
+        super(QueueSink, self).__init__()
+        self._queue = Queue(maxsize=maxsize)
+
+    def __iter__(self):
+        while True:
+            throttled_request = self._queue.get()
+            if throttled_request is self._CLOSED:
+                self._queue.put(self._CLOSED)
+                return
+            yield throttled_request
+
+    def get(self, timeout=None):
+        """Return the next finished request, waiting for it
+
+        :param timeout: the maximum time in seconds to wait (default: :const:`None`)
+        :type timeout: float
+        :return: the finished throttled request or :const:`None` if the sink has been closed
+        :rtype: :class:`requests_throttler.throttled_request.ThrottledRequest`
+        :raise:
+            :queue.Empty: if no request has finished within ``timeout``
+
+        """
+        throttled_request = self._queue.get(timeout=timeout)
+        if throttled_request is self._CLOSED:
+            self._queue.put(self._CLOSED)
+            return None
+        return throttled_request
+
+    def write(self, items):
+        for throttled_request in items:
+            self._queue.put(throttled_request)
+
+    def close(self):
+        super(QueueSink, self).close()
+        self._queue.put(self._CLOSED)
@@ -0,0 +1,115 @@
+"""
+.. module:: templates
+   :synopsis: The module containing the templates of prepared requests
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the template that prepares once the parts shared by many requests, i.e.
+the method, the headers, the cookies, the authentication and the body, and stamps out prepared
+requests differing only in some parts of the url without preparing them again.
+
+"""
+
+import copy
+import re
+from string import Formatter
+
+try:
+    from urllib.parse import quote, urlsplit
+except ImportError:
+    from urllib import quote
+    from urlparse import urlsplit
+
+import requests
+
+MARKER = '__rt{index}__'
+MARKER_REGEX = re.compile(r'__rt(\d+)__')
+
+
+class RequestTemplate(object):
+    """This class provides a template of prepared requests with placeholders in the url
+
+    The url of the request can contain placeholders in the ``{name}`` format in its path and
+    query, e.g. ``http://example.com/items/{id}?page={page}``. The request is prepared once
+    with markers in place of the placeholders and :meth:`render` only copies it and substitutes
+    the url-encoded values, that costs a fraction of a preparation. The variants share the body
+    and the cookie jar of the template.
+
+    :param names: the names of the placeholders in order of appearance
+    :type names: list(string)
+    :param literals: the parts of the prepared url around the placeholders
+    :type literals: list(string)
+    :param prepared: the prepared request with the markers in the url
+    :type prepared: requests.PreparedRequest
+
+    """
+
+    def __init__(self, request, session=None):
+        """Prepare the given request with placeholders in its url
+
+        :param request: the request to use as template
+        :type request: requests.Request
+        :param session: the session used to prepare the request (default: a new
+                        :class:`requests.Session`)
+        :type session: requests.Session
+        :raise:
+            :ValueError: if a placeholder has no name or is not in the path or in the query
+
+        """
+        names = []
+        marked_url = []
+        for literal, name, _, _ in Formatter().parse(request.url):
+            marked_url.append(literal)
+            if name is None:
+                continue
+            if not name:
+                raise ValueError("The placeholders of a template must have a name.")
+            marked_url.append(MARKER.format(index=len(names)))
+            names.append(name)
+        marked = copy.copy(request)
+        marked.url = ''.join(marked_url)
+        self._prepared = (session or requests.Session()).prepare_request(marked)
+        parts = MARKER_REGEX.split(self._prepared.url)
+        indexes = [int(index) for index in parts[1::2]]
+        if (indexes != list(range(len(names))) or
+                MARKER_REGEX.search(urlsplit(self._prepared.url).netloc)):
+            raise ValueError("The placeholders must be in the path or in the query of the url.")
+        self._names = names
+        self._literals = parts[0::2]
+
+    @property
+    def names(self):
+        """The names of the placeholders in order of appearance
+
+        :getter: Returns :attr:`names`
+        :type: list(string)
+
+        """
+        return list(self._names)
+
+    def render(self, **params):
+        """Return the prepared request with the given values in place of the placeholders
+
+        :param params: the value of each placeholder, url-encoded once converted to string
+        :return: the prepared request
+        :rtype: requests.PreparedRequest
+        :raise:
+            :ValueError: if the value of a placeholder is missing
+
+        """
+        url = [self._literals[0]]
+        try:
+            for name, literal in zip(self._names, self._literals[1:]):
+                url.append(quote(str(params[name]), safe=''))
+                url.append(literal)
+        except KeyError as e:
+            raise ValueError("Missing value of placeholder {name}.".format(name=e.args[0]))
+        prepared = requests.PreparedRequest()
+        prepared.method = self._prepared.method
+        prepared.url = ''.join(url)
+        prepared.headers = self._prepared.headers.copy()
+        prepared._cookies = self._prepared._cookies
+        prepared.body = self._prepared.body
+        prepared.hooks = self._prepared.hooks
+        prepared._body_position = self._prepared._body_position
+        return prepared
@@ -1,16 +1,94 @@
+import time
 import unittest
+import threading
 
 import requests
 
-from requests_throttler.throttled_request import ThrottledRequest
+from requests_throttler.batching import Batcher
+from requests_throttler.breaker import CircuitBreaker, CircuitOpenError
+from requests_throttler.cache import ResponseCache
+from requests_throttler.limiter import Limiter
+from requests_throttler.throttled_request import ThrottledRequest, ThrottledRequestCancelled
 from requests_throttler.throttler import \
     BaseThrottler, \
     THROTTLER_STATUS, \
     THROTTLER_STATUS_DEPENDENCIES, \
+    RUNNING, \
+    WAITING, \
+    PAUSED, \
+    STOPPED, \
+    ENDING, \
     ThrottlerStatusError, \
+    ThrottlerShutdownError, \
     FullRequestsPoolError
 
 
+class FakeSession(requests.Session):
+
+    def __init__(self, latency=0, response_headers=None):
+        super(FakeSession, self).__init__()
+        self.latency = latency
+        self.response_headers = response_headers or {}
+        self.sent = []
+        self.send_kwargs = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        self.send_kwargs.append(kwargs)
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b''
+        response.headers.update(self.response_headers)
+        response.request = request
+        return response
+
+
+class FailingSession(FakeSession):
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        raise requests.ConnectionError("Connection refused")
+
+
+class QuotaSession(FakeSession):
+
+    def __init__(self, quota, reset, latency=0):
+        super(QuotaSession, self).__init__(latency=latency)
+        self.quota = quota
+        self.reset = reset
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.sent.append(time.time())
+            remaining = max(self.quota - len(self.sent), 0)
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200 if remaining or time.time() >= self.reset else 429
+        response._content = b''
+        response.headers['X-RateLimit-Remaining'] = str(remaining)
+        response.headers['X-RateLimit-Reset'] = str(self.reset)
+        response.request = request
+        return response
+
+
+def combine_ids(reqs):
+    ids = ','.join(request.url.rsplit('=', 1)[1] for request in reqs)
+    return requests.Request(method='GET', url='http://example.com/items?ids=' + ids)
+
+
+def split_ids(response, reqs):
+    results = []
+    for request in reqs:
+        result = requests.Response()
+        result.status_code = response.status_code
+        result._content = request.url.rsplit('=', 1)[1].encode('utf-8')
+        result.request = request
+        results.append(result)
+    return results
+
+
 class TestBaseThrottler(unittest.TestCase):
 
     def setUp(self):
@@ -22,7 +100,7 @@ class TestBaseThrottler(unittest.TestCase):
         self.assertEqual('bt', bt.name)
         self.assertIsNone(bt._requests_pool.maxlen)
         self.assertEqual(0, bt.delay)
-        self.assertEqual('initialized', bt._status)
+        self.assertEqual('initialized', bt.status)
         self.assertEqual(0, bt.successes)
         self.assertEqual(0, bt.failures)
         bt._inc_successes()
@@ -46,21 +124,21 @@ class TestBaseThrottler(unittest.TestCase):
             BaseThrottler(name='bt', reqs_over_time=(-1, -1))
 
         for status in THROTTLER_STATUS:
-            bt._status = status
-            self.assertEqual(status, bt._status)
+            bt._status = THROTTLER_STATUS.index(status)
+            self.assertEqual(status, bt.status)
 
     def test_set_status(self):
         bt = BaseThrottler()
         for k, v1 in THROTTLER_STATUS_DEPENDENCIES.iteritems():
-            bt._status = k
+            bt._status = THROTTLER_STATUS.index(k)
             for v2 in THROTTLER_STATUS:
                 if v2 in v1:
                     bt.status = v2
-                    self.assertEqual(v2, bt._status)
+                    self.assertEqual(v2, bt.status)
                 else:
                     with self.assertRaises(ThrottlerStatusError):
                         bt.status = v2
-                bt._status = k
+                bt._status = THROTTLER_STATUS.index(k)
 
         with self.assertRaises(ThrottlerStatusError):
             bt.status = 'invalid-status'
@@ -68,53 +146,59 @@ class TestBaseThrottler(unittest.TestCase):
     def test_start(self):
         bt = BaseThrottler()
         for status in set(THROTTLER_STATUS).difference(set(['initialized'])):
-            bt._status = status
+            bt._status = THROTTLER_STATUS.index(status)
             self.assertRaises(ThrottlerStatusError, bt.start)
 
     def test_shutdown(self):
         bt = BaseThrottler()
         for status in THROTTLER_STATUS:
-            bt._status = status
+            bt._status = THROTTLER_STATUS.index(status)
             if status in ['stopped', 'ending', 'ended']:
                 self.assertRaises(ThrottlerStatusError, bt.shutdown)
+            elif status == 'initialized':
+                bt.shutdown()
+                self.assertEqual('ended', bt.status)
             else:
                 bt.shutdown()
                 self.assertTrue(bt._wait_enqueued)
-                self.assertEqual('stopped', bt._status)
+                self.assertEqual('stopped', bt.status)
 
         for status in THROTTLER_STATUS:
-            bt._status = status
+            bt._status = THROTTLER_STATUS.index(status)
             if status in ['stopped', 'ending', 'ended']:
                 self.assertRaises(ThrottlerStatusError, bt.shutdown)
+            elif status == 'initialized':
+                bt.shutdown(wait_enqueued=False)
+                self.assertEqual('ended', bt.status)
             else:
                 bt.shutdown(wait_enqueued=False)
                 self.assertFalse(bt._wait_enqueued)
-                self.assertEqual('stopped', bt._status)
+                self.assertEqual('stopped', bt.status)
 
     def test_context(self):
         with BaseThrottler() as bt:
-            self.assertIn(bt._status, ['runnning', 'waiting'])
-        self.assertIn(bt._status, ['stopped', 'ending'])
+            self.assertIn(bt.status, ['runnning', 'waiting'])
+        self.assertIn(bt.status, ['stopped', 'ending'])
 
     def test_pause(self):
         bt = BaseThrottler()
         for status in THROTTLER_STATUS:
-            bt._status = status
+            bt._status = THROTTLER_STATUS.index(status)
             if status not in ['running', 'waiting']:
                 self.assertRaises(ThrottlerStatusError, bt.pause)
             else:
                 bt.pause()
-                self.assertEqual('paused', bt._status)
+                self.assertEqual('paused', bt.status)
 
     def test_unpause(self):
         bt = BaseThrottler()
         for status in THROTTLER_STATUS:
-            bt._status = status
+            bt._status = THROTTLER_STATUS.index(status)
             if status != 'paused':
                 self.assertRaises(ThrottlerStatusError, bt.unpause)
             else:
                 bt.unpause()
-                self.assertEqual('running', bt._status)
+                self.assertEqual('running', bt.status)
 
     def test_submit(self):
         bt = BaseThrottler(delay=self.default_delay)
@@ -229,11 +313,11 @@ class TestBaseThrottler(unittest.TestCase):
     def test_dequeue_request(self):
         bt = BaseThrottler()
         for wait_enqueued in [True, False]:
-            bt._status = 'stopped'
+            bt._status = STOPPED
             request = bt._dequeue_request()
             self.assertIsNone(request)
 
-        bt._status = 'running'
+        bt._status = RUNNING
         throttled_request, _ = bt._prepare_request(self.default_request)
         bt._enqueue_request(throttled_request)
         request = bt._dequeue_request()
@@ -242,36 +326,572 @@ class TestBaseThrottler(unittest.TestCase):
     def test_dequeue_condition(self):
         bt = BaseThrottler()
 
-        bt._status = 'running'
+        bt._status = RUNNING
         self.assertEqual((True, False), bt._dequeue_condition())
-        self.assertEqual('waiting', bt._status)
+        self.assertEqual('waiting', bt.status)
 
-        bt._status = 'paused'
+        bt._status = PAUSED
         self.assertEqual((True, False), bt._dequeue_condition())
-        self.assertEqual('paused', bt._status)
+        self.assertEqual('paused', bt.status)
 
         for wait_enqueued in [True, False]:
-            bt._status = 'stopped'
+            bt._status = STOPPED
             bt._wait_enqueued = wait_enqueued
             self.assertEqual((False, False), bt._dequeue_condition())
-        self.assertEqual('ending', bt._status)
+        self.assertEqual('ending', bt.status)
 
         throttled_request, _ = bt._prepare_request(self.default_request)
         bt._enqueue_request(throttled_request)
 
-        bt._status = 'running'
+        bt._status = RUNNING
         self.assertEqual((False, True), bt._dequeue_condition())
-        self.assertEqual('running', bt._status)
+        self.assertEqual('running', bt.status)
 
-        bt._status = 'paused'
+        bt._status = PAUSED
         self.assertEqual((True, False), bt._dequeue_condition())
-        self.assertEqual('paused', bt._status)
+        self.assertEqual('paused', bt.status)
 
         for wait_enqueued in [True, False]:
-            bt._status = 'stopped'
+            bt._status = STOPPED
             bt._wait_enqueued = wait_enqueued
             if wait_enqueued:
                 self.assertEqual((False, True), bt._dequeue_condition())
             else:
                 self.assertEqual((False, False), bt._dequeue_condition())
-        self.assertEqual('ending', bt._status)
+        self.assertEqual('ending', bt.status)
+
+    def test_cache(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, cache=ResponseCache(ttl=60))
+        bt._status = RUNNING
+
+        throttled_request, _ = bt._prepare_request(self.default_request)
+        bt._send_request(throttled_request)
+        self.assertEqual(1, len(session.sent))
+
+        throttled_request = bt._submit(self.default_request)
+        self.assertTrue(throttled_request.finished)
+        self.assertEqual(0, len(bt._requests_pool))
+        self.assertEqual(1, len(session.sent))
+        self.assertEqual(2, bt.successes)
+
+    def test_coalesce(self):
+        bt = BaseThrottler(session=FakeSession(), coalesce=True)
+        bt._status = RUNNING
+
+        tr_1 = bt._submit(self.default_request)
+        tr_2 = bt._submit(self.default_request)
+        self.assertIs(tr_1, tr_2)
+        self.assertEqual(1, len(bt._requests_pool))
+
+        other_request = requests.Request(method='POST', url=self.default_request.url, data='a')
+        tr_3 = bt._submit(other_request)
+        self.assertIsNot(tr_1, tr_3)
+        self.assertEqual(2, len(bt._requests_pool))
+
+        bt._send_request(bt._requests_pool.popleft())
+        tr_4 = bt._submit(self.default_request)
+        self.assertIsNot(tr_1, tr_4)
+        self.assertEqual(2, len(bt._requests_pool))
+
+    def test_coalesce_waiters(self):
+        bt = BaseThrottler(session=FakeSession(latency=0.1), coalesce=True)
+        responses = []
+
+        def submit_and_wait():
+            responses.append(bt.submit(self.default_request).get_response(timeout=None))
+
+        with bt:
+            bt.pause()
+            threads = [threading.Thread(target=submit_and_wait) for i in range(5)]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            time.sleep(0.1)
+            bt.unpause()
+            [thread.join(2) for thread in threads]
+        bt.wait_end()
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(5, len(responses))
+        self.assertEqual(1, len(set(id(response) for response in responses)))
+        self.assertEqual(1, bt.successes)
+
+    def test_coalesce_key(self):
+        bt = BaseThrottler(session=FakeSession())
+        bt._status = RUNNING
+
+        self.assertIsNot(bt._submit(self.default_request), bt._submit(self.default_request))
+
+        other_request = requests.Request(method='GET', url='http://www.example.com')
+        tr_1 = bt._submit(self.default_request, coalesce_key='key')
+        tr_2 = bt._submit(other_request, coalesce_key='key')
+        self.assertIs(tr_1, tr_2)
+        self.assertEqual(3, len(bt._requests_pool))
+
+    def test_submit_full_pool(self):
+        bt = BaseThrottler(max_pool_size=1)
+        bt._status = RUNNING
+        bt._submit(self.default_request)
+        throttled_request = bt._submit(self.default_request)
+        self.assertTrue(throttled_request.finished)
+        self.assertIsInstance(throttled_request.exception, FullRequestsPoolError)
+        self.assertEqual(1, bt.failures)
+
+    def test_submit_full_pool_cancelled(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, max_pool_size=2)
+        bt._status = RUNNING
+        throttled_requests = [bt._submit(self.default_request) for i in range(2)]
+        bt.cancel(throttled_requests[0])
+        throttled_requests[1].cancel()
+        self.assertEqual(0, len(bt._requests_pool))
+        throttled_requests = [bt._submit(self.default_request) for i in range(2)]
+        self.assertFalse(any(tr.finished for tr in throttled_requests))
+        self.assertEqual(0, bt.failures)
+        self.assertIs(throttled_requests[0], bt._dequeue_request())
+        self.assertEqual(1, len(bt._requests_pool))
+
+    def test_coalesce_multi_submit(self):
+        bt = BaseThrottler(session=FakeSession())
+        bt._status = RUNNING
+        with self.assertRaises(ValueError):
+            bt.multi_submit([self.default_request] * 2, coalesce_key='key')
+
+    def test_coalesce_shutdown(self):
+        bt = BaseThrottler(session=FakeSession(), coalesce=True)
+        bt._status = RUNNING
+        bt._submit(self.default_request)
+        self.assertEqual(1, len(bt._pending))
+
+        bt._status = STOPPED
+        bt._wait_enqueued = False
+        self.assertIsNone(bt._dequeue_request())
+        self.assertEqual(0, len(bt._pending))
+        self.assertEqual(0, len(bt._pending_keys))
+
+    def test_concurrency(self):
+        with self.assertRaises(ValueError):
+            BaseThrottler(concurrency=0)
+
+        bt = BaseThrottler(session=FakeSession(latency=0.2), concurrency=3)
+        self.assertEqual(3, bt.concurrency)
+        start = time.time()
+        with bt:
+            throttled_requests = bt.multi_submit([self.default_request for i in range(6)])
+        bt.wait_end()
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(6, bt.successes)
+        [self.assertEqual(200, tr.response.status_code) for tr in throttled_requests]
+
+    def test_shard_sessions(self):
+        bt = BaseThrottler(session=FakeSession(), concurrency=2, shard_sessions=True)
+        with bt:
+            throttled_requests = bt.multi_submit([self.default_request for i in range(4)])
+        bt.wait_end()
+        self.assertEqual(4, bt.successes)
+        [self.assertEqual(200, tr.response.status_code) for tr in throttled_requests]
+
+    def test_send_options(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, coalesce=True, cache=ResponseCache(ttl=60))
+        bt._status = RUNNING
+
+        tr_1 = bt._submit(self.default_request, send_options={'stream': True})
+        tr_2 = bt._submit(self.default_request, send_options={'stream': True})
+        self.assertIsNot(tr_1, tr_2)
+        self.assertEqual({'stream': True}, tr_1.send_options)
+
+        bt._send_request(bt._requests_pool.popleft())
+        self.assertEqual({'stream': True}, session.send_kwargs[0])
+        self.assertEqual(0, len(bt._cache))
+
+    def test_limits(self):
+        with self.assertRaises(ValueError):
+            BaseThrottler(limits=[(0, 1)])
+
+        bt = BaseThrottler(session=FakeSession(), limits=[(3, 0.5), (100, 3600)])
+        self.assertEqual([(3, 0.5), (100, 3600.0)], bt.limits)
+        start = time.time()
+        with bt:
+            throttled_requests = bt.multi_submit([self.default_request for i in range(6)])
+            throttled_requests[2].response
+            self.assertLess(time.time() - start, 0.4)
+        bt.wait_end()
+        self.assertGreaterEqual(time.time() - start, 0.5)
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(6, bt.successes)
+
+    def test_set_delay(self):
+        bt = BaseThrottler(session=FakeSession(), delay=5)
+        with self.assertRaises(ValueError):
+            bt.set_delay(-1)
+        with self.assertRaises(ValueError):
+            bt.set_rate(-1, 1)
+
+        start = time.time()
+        with bt:
+            throttled_requests = bt.multi_submit([self.default_request for i in range(3)])
+            time.sleep(0.1)
+            bt.set_rate(10, 1)
+            self.assertEqual(0.1, bt.delay)
+        bt.wait_end()
+        self.assertLess(time.time() - start, 1)
+        [self.assertTrue(tr.finished) for tr in throttled_requests]
+
+        bt = BaseThrottler(delay=1)
+        bt.set_delay(2)
+        self.assertEqual(2, bt.delay)
+
+    def test_resize_pool(self):
+        bt = BaseThrottler(max_pool_size=1)
+        bt._status = RUNNING
+        first_request = bt._submit(self.default_request)
+        bt.resize_pool(2)
+        self.assertEqual(2, bt._requests_pool.maxlen)
+        bt._submit(self.default_request)
+        self.assertEqual(2, len(bt._requests_pool))
+
+        with self.assertRaises(ValueError):
+            bt.resize_pool(1)
+        bt.resize_pool(None)
+        self.assertIsNone(bt._requests_pool.maxlen)
+        self.assertIs(first_request, bt._requests_pool.popleft())
+
+    def test_set_concurrency(self):
+        bt = BaseThrottler(session=FakeSession(latency=0.2))
+        with self.assertRaises(ValueError):
+            bt.set_concurrency(0)
+
+        start = time.time()
+        with bt:
+            bt.set_concurrency(4)
+            self.assertEqual(4, bt.concurrency)
+            bt.multi_submit([self.default_request for i in range(4)])
+        bt.wait_end()
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(4, bt.successes)
+
+    def test_shared_limiter(self):
+        limiter = Limiter(delay=0.1)
+        with self.assertRaises(ValueError):
+            BaseThrottler(limiter=limiter, delay=1)
+
+        session = FakeSession()
+        throttlers = [BaseThrottler(session=session, limiter=limiter) for i in range(2)]
+        self.assertIs(limiter, throttlers[0].limiter)
+        start = time.time()
+        for bt in throttlers:
+            bt.start()
+            bt.multi_submit([self.default_request for i in range(3)])
+        for bt in throttlers:
+            bt.shutdown()
+            bt.wait_end()
+        self.assertGreaterEqual(time.time() - start, 0.5)
+        self.assertEqual(6, len(session.sent))
+
+        throttlers[0].set_delay(0.2)
+        self.assertEqual(0.2, throttlers[1].delay)
+
+    def test_tenants(self):
+        with self.assertRaises(ValueError):
+            BaseThrottler(tenants={'a': 0})
+
+        session = FakeSession()
+        bt = BaseThrottler(session=session, delay=0.01, tenants={'big': 2})
+        bt.start()
+        bt.pause()
+        big = bt.multi_submit([requests.Request(method='GET', url='http://big.com/')
+                               for i in range(100)], tenant='big')
+        small = bt.multi_submit([requests.Request(method='GET', url='http://small.com/')
+                                 for i in range(2)], tenant='small')
+        bt.set_tenant_weight('small', 1)
+        bt.unpause()
+        bt.shutdown()
+        bt.wait_end()
+        self.assertEqual(102, bt.successes)
+        self.assertTrue(all(tr.finished for tr in big + small))
+        urls = [request.url for request in session.sent]
+        self.assertEqual(['http://big.com/', 'http://big.com/', 'http://small.com/'] * 2,
+                         urls[:6])
+
+    def test_cost(self):
+        bt = BaseThrottler(session=FakeSession(), delay=0.1)
+        bt.start()
+        with self.assertRaises(ValueError):
+            bt.submit(self.default_request, cost=0)
+        bt.shutdown()
+        bt.wait_end()
+
+        bt = BaseThrottler(session=FakeSession(), delay=0.1)
+        start = time.time()
+        with bt:
+            expensive = bt.submit(self.default_request, cost=3)
+            cheap = bt.submit(self.default_request)
+            self.assertEqual(3, expensive.cost)
+            self.assertEqual(1, cheap.cost)
+        bt.wait_end()
+        self.assertEqual(2, bt.successes)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def test_rate_limit_headers(self):
+        session = FakeSession(response_headers={'X-RateLimit-Remaining': '100',
+                                                'X-RateLimit-Reset': '10'})
+        bt = BaseThrottler(session=session, delay=1, rate_limit_headers=True)
+        start = time.time()
+        with bt:
+            bt.multi_submit([self.default_request for i in range(5)])
+        bt.wait_end()
+        self.assertEqual(5, bt.successes)
+        self.assertLess(time.time() - start, 1)
+
+        session = FakeSession(response_headers={'RateLimit-Remaining': '0',
+                                                'RateLimit-Reset': '0.3'})
+        bt = BaseThrottler(session=session, rate_limit_headers=True)
+        start = time.time()
+        with bt:
+            bt.multi_submit([self.default_request for i in range(2)])
+        bt.wait_end()
+        self.assertEqual(2, bt.successes)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def test_rate_limit_headers_concurrency(self):
+        start = time.time()
+        session = QuotaSession(10, start + 0.6, latency=0.05)
+        bt = BaseThrottler(session=session, concurrency=8, rate_limit_headers=True)
+        with bt:
+            bt.multi_submit([self.default_request for i in range(20)])
+            time.sleep(0.4)
+            self.assertLessEqual(len(session.sent), 10)
+        bt.wait_end()
+        self.assertLessEqual(len([sent for sent in session.sent if sent < session.reset]), 10)
+        self.assertEqual(20, len(session.sent))
+
+    def test_breaker(self):
+        session = FailingSession()
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+        bt = BaseThrottler(session=session, delay=0.2, breaker=breaker)
+        start = time.time()
+        with bt:
+            throttled_requests = bt.multi_submit([self.default_request for i in range(10)])
+        bt.wait_end()
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(2, len(session.sent))
+        self.assertEqual(10, bt.failures)
+        self.assertIsInstance(throttled_requests[0].exception, requests.ConnectionError)
+        self.assertIsInstance(throttled_requests[-1].exception, CircuitOpenError)
+
+    def test_timeout(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, timeout=(3.05, 27))
+        self.assertEqual((3.05, 27), bt.timeout)
+        with bt:
+            bt.submit(self.default_request)
+            bt.submit(self.default_request, timeout=1)
+            bt.submit(self.default_request, send_options={'timeout': 2, 'stream': True})
+        bt.wait_end()
+        self.assertEqual([(3.05, 27), 1, 2], [kwargs['timeout']
+                                              for kwargs in session.send_kwargs])
+
+    def test_stuck_requests(self):
+        with self.assertRaises(ValueError):
+            BaseThrottler(stuck_threshold=0)
+
+        bt = BaseThrottler(session=FakeSession(latency=0.4), concurrency=2,
+                           stuck_threshold=0.1)
+        with bt:
+            throttled_requests = bt.multi_submit([self.default_request for i in range(2)])
+            time.sleep(0.2)
+            stuck = bt.stuck_requests()
+            self.assertEqual(set(throttled_requests), set(tr for tr, _ in stuck))
+            self.assertTrue(all(elapsed > 0.1 for _, elapsed in stuck))
+            self.assertEqual([], bt.stuck_requests(threshold=1))
+        bt.wait_end()
+        self.assertEqual([], bt.stuck_requests())
+        bt._watchdog.join(1)
+        self.assertFalse(bt._watchdog.is_alive())
+
+    def test_lazy_prepare(self):
+        with self.assertRaises(ValueError):
+            BaseThrottler(lazy_prepare=True, coalesce=True)
+
+        session = FakeSession()
+        bt = BaseThrottler(session=session, lazy_prepare=True)
+        bt.start()
+        bt.pause()
+        throttled_requests = bt.multi_submit([
+            requests.Request(method='GET', url='http://example.com/', params={'id': 1}),
+            requests.Request(method='GET', url='example.com/1'),
+            requests.Request(method='GET', url='http://example.com/2')])
+        throttled_requests[2].cancel()
+        self.assertFalse(any(tr.prepared for tr in throttled_requests))
+        self.assertIsInstance(throttled_requests[0].request, requests.Request)
+        bt.unpause()
+        bt.shutdown()
+        bt.wait_end()
+        self.assertTrue(throttled_requests[0].prepared)
+        self.assertEqual('http://example.com/?id=1', throttled_requests[0].request.url)
+        self.assertIsInstance(throttled_requests[1].exception, requests.exceptions.MissingSchema)
+        self.assertTrue(throttled_requests[2].cancelled)
+        self.assertEqual(['http://example.com/?id=1'], [request.url for request in session.sent])
+        self.assertEqual((1, 1), (bt.successes, bt.failures))
+
+    def test_scheduled_submission(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, delay=0.1)
+        with self.assertRaises(ValueError):
+            bt.submit_after(self.default_request, -1)
+        start = time.time()
+        with bt:
+            later = bt.submit_after(
+                requests.Request(method='GET', url='http://example.com/later'), 0.3)
+            sooner = bt.submit_at(
+                requests.Request(method='GET', url='http://example.com/sooner'), start + 0.15)
+            cancelled = bt.submit_after(self.default_request, 0.2)
+            now = bt.submit(requests.Request(method='GET', url='http://example.com/now'))
+            self.assertEqual(3, bt.scheduled)
+            self.assertTrue(cancelled.cancel())
+            sooner.response
+            self.assertGreaterEqual(time.time() - start, 0.15)
+        bt.wait_end()
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(['http://example.com/now', 'http://example.com/sooner',
+                          'http://example.com/later'],
+                         [request.url for request in session.sent])
+        self.assertEqual(200, later.response.status_code)
+        self.assertEqual((3, 0), (bt.successes, bt.scheduled))
+
+        bt = BaseThrottler(session=FakeSession(), delay=0.1)
+        bt.start()
+        throttled_requests = [bt.submit(self.default_request),
+                              bt.submit_after(self.default_request, 0.1),
+                              bt.submit_after(self.default_request, 0.5)]
+        start = time.time()
+        self.assertEqual((2, 0, 1), bt.drain(timeout=0.2))
+        self.assertLess(time.time() - start, 0.3)
+        self.assertIsInstance(throttled_requests[2].exception, ThrottlerShutdownError)
+
+    def test_cancel(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, delay=0.2, coalesce=True)
+        start = time.time()
+        with bt:
+            throttled_requests = bt.multi_submit([
+                requests.Request(method='GET', url='http://example.com/{i}'.format(i=i))
+                for i in range(6)])
+            throttled_requests[0].response
+            self.assertFalse(bt.cancel(throttled_requests[0]))
+            [self.assertTrue(bt.cancel(tr)) for tr in throttled_requests[1:4]]
+            self.assertTrue(throttled_requests[4].cancel())
+            with self.assertRaises(ThrottledRequestCancelled):
+                throttled_requests[1].response
+            resubmitted = bt.submit(requests.Request(method='GET', url='http://example.com/4'))
+            self.assertIsNot(throttled_requests[4], resubmitted)
+        bt.wait_end()
+        self.assertLess(time.time() - start, 0.55)
+        self.assertEqual(['http://example.com/0', 'http://example.com/5',
+                          'http://example.com/4'], [request.url for request in session.sent])
+        self.assertEqual(3, bt.successes)
+
+    def test_drain_not_started(self):
+        bt = BaseThrottler(session=FakeSession())
+        waiter = threading.Thread(target=bt.drain, kwargs={'timeout': 1})
+        waiter.daemon = True
+        waiter.start()
+        waiter.join(1)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual('ended', bt.status)
+        with self.assertRaises(ThrottlerStatusError):
+            bt.start()
+
+    def test_drain(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, delay=0.2)
+        bt.start()
+        throttled_requests = bt.multi_submit([self.default_request for i in range(10)])
+        throttled_requests[9].cancel()
+        start = time.time()
+        summary = bt.drain(timeout=0.3)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual((2, 0, 7), summary)
+        self.assertEqual(2, len(session.sent))
+        self.assertTrue(all(tr.finished for tr in throttled_requests))
+        self.assertIsInstance(throttled_requests[2].exception, ThrottlerShutdownError)
+        self.assertEqual(7, bt.dropped)
+
+    def test_shutdown_not_waiting_enqueued(self):
+        bt = BaseThrottler(session=FakeSession(), delay=0.2)
+        bt.start()
+        throttled_requests = bt.multi_submit([self.default_request for i in range(3)])
+        throttled_requests[0].response
+        bt.shutdown(wait_enqueued=False)
+        bt.wait_end()
+        for tr in throttled_requests[1:]:
+            with self.assertRaises(ThrottlerShutdownError):
+                tr.response
+        self.assertEqual(2, bt.dropped)
+
+    def test_interruptible_pacing(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, delay=60)
+        bt.start()
+        throttled_requests = bt.multi_submit([self.default_request for i in range(3)])
+        throttled_requests[0].response
+        time.sleep(0.05)
+
+        start = time.time()
+        self.assertEqual(1, bt.successes)
+        self.assertEqual('running', bt.status)
+        bt.pause()
+        self.assertEqual('paused', bt.status)
+        bt.set_delay(0)
+        throttled_requests[1].get_response(timeout=0.1)
+        self.assertEqual(1, len(session.sent))
+        bt.unpause()
+        throttled_requests[2].response
+        self.assertEqual(3, len(session.sent))
+
+        time.sleep(0.05)
+        bt.pause()
+        throttled_request = bt.submit(self.default_request)
+        time.sleep(0.05)
+        bt.unpause()
+        self.assertIsNotNone(throttled_request.get_response(timeout=0.5))
+
+        bt.set_delay(60)
+        bt.submit(self.default_request)
+        bt.shutdown(wait_enqueued=False)
+        bt.wait_end()
+        self.assertLess(time.time() - start, 1)
+
+    def test_batcher(self):
+        session = FakeSession()
+        bt = BaseThrottler(session=session, delay=0.2,
+                           batcher=Batcher(combine_ids, split_ids, max_size=3))
+        start = time.time()
+        bt.start()
+        bt.pause()
+        throttled_requests = bt.multi_submit([
+            requests.Request(method='GET', url='http://example.com/items?id={i}'.format(i=i))
+            for i in range(7)])
+        throttled_requests[5].cancel()
+        other = bt.submit(requests.Request(method='GET', url='http://example.com/other'))
+        bt.unpause()
+        bt.shutdown()
+        bt.wait_end()
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(['http://example.com/items?ids=0,1,2',
+                          'http://example.com/items?ids=3,4,6', 'http://example.com/other'],
+                         [request.url for request in session.sent])
+        self.assertEqual([b'0', b'1', b'2', b'3', b'4', b'6'],
+                         [tr.response.content for tr in throttled_requests if not tr.cancelled])
+        self.assertEqual(200, other.response.status_code)
+        self.assertEqual(7, bt.successes)
+
+        bt = BaseThrottler(session=session, batcher=Batcher(combine_ids, lambda r, reqs: []))
+        bt._status = RUNNING
+        throttled_requests = bt.multi_submit([
+            requests.Request(method='GET', url='http://example.com/items?id={i}'.format(i=i))
+            for i in range(2)])
+        bt._send_and_release(bt._take_batch(bt._dequeue_request()))
+        [self.assertIsInstance(tr.exception, ValueError) for tr in throttled_requests]
+        self.assertEqual(2, bt.failures)
@@ -0,0 +1,49 @@
+import unittest
+
+import requests
+
+from requests_throttler.batching import Batcher, default_key
+
+
+class TestBatcher(unittest.TestCase):
+
+    def prepare(self, url, method='GET'):
+        return requests.Request(method=method, url=url).prepare()
+
+    def test_default_key(self):
+        self.assertEqual(default_key(self.prepare('http://example.com/items?id=1')),
+                         default_key(self.prepare('http://example.com/items?id=2')))
+        self.assertNotEqual(default_key(self.prepare('http://example.com/items')),
+                            default_key(self.prepare('http://example.com/items', 'POST')))
+        self.assertNotEqual(default_key(self.prepare('http://example.com/items')),
+                            default_key(self.prepare('http://example.com/other')))
+
+    def test_batcher(self):
+        with self.assertRaises(ValueError):
+            Batcher(combine=list, split=list, max_size=0)
+        with self.assertRaises(ValueError):
+            Batcher()
+        with self.assertRaises(ValueError):
+            Batcher(combine=list)
+        with self.assertRaises(ValueError):
+            Batcher(split=list)
+        self.assertEqual(10, Batcher(combine=list, split=list).max_size)
+
+        class FirstBatcher(Batcher):
+
+            def combine(self, requests):
+                return requests[0]
+
+        with self.assertRaises(ValueError):
+            FirstBatcher()
+        batcher = FirstBatcher(split=lambda response, reqs: [response])
+        self.assertEqual('request', batcher.combine(['request']))
+
+        batcher = Batcher(combine=lambda reqs: reqs[0], split=lambda response, reqs: [response],
+                          key=lambda request: None)
+        request = self.prepare('http://example.com/')
+        self.assertIsNone(batcher.key(request))
+        self.assertIs(request, batcher.combine([request]))
+        self.assertEqual(['response'], batcher.split('response', [request]))
+        with self.assertRaises(ValueError):
+            batcher.split('response', [request, request])
@@ -0,0 +1,68 @@
+import time
+import unittest
+
+import requests
+
+from requests_throttler.breaker import \
+    CircuitBreaker, \
+    CircuitOpenError, \
+    default_key, \
+    CLOSED, \
+    OPEN, \
+    HALF_OPEN
+
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.request = requests.Request(method='GET', url='http://example.com/a?b=1').prepare()
+        self.other_request = requests.Request(method='GET', url='http://other.com/').prepare()
+
+    def test_invalid_breaker(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(failure_threshold=0)
+        with self.assertRaises(ValueError):
+            CircuitBreaker(recovery_timeout=-1)
+
+    def test_default_key(self):
+        self.assertEqual('example.com', default_key(self.request))
+        self.assertEqual("The circuit is open. (circuit: example.com)",
+                         str(CircuitOpenError("The circuit is open.", 'example.com')))
+
+    def test_open(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+        breaker.record(self.request, make_response(500))
+        breaker.record(self.request, make_response(200))
+        breaker.record(self.request, IOError())
+        self.assertEqual(CLOSED, breaker.state('example.com'))
+        self.assertTrue(breaker.allow(self.request))
+        breaker.record(self.request, make_response(503))
+        self.assertEqual(OPEN, breaker.state('example.com'))
+        self.assertFalse(breaker.allow(self.request))
+        self.assertTrue(breaker.allow(self.other_request))
+
+        breaker.reset()
+        self.assertEqual(CLOSED, breaker.state('example.com'))
+
+    def test_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.1)
+        breaker.record(self.request, IOError())
+        self.assertFalse(breaker.allow(self.request))
+        time.sleep(0.15)
+        self.assertEqual(HALF_OPEN, breaker.state('example.com'))
+        self.assertTrue(breaker.allow(self.request))
+        self.assertFalse(breaker.allow(self.request))
+        breaker.record(self.request, IOError())
+        self.assertEqual(OPEN, breaker.state('example.com'))
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow(self.request))
+        breaker.record(self.request, make_response(200))
+        self.assertEqual(CLOSED, breaker.state('example.com'))
+        self.assertTrue(breaker.allow(self.request))
@@ -0,0 +1,165 @@
+import time
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from requests_throttler.cache import \
+    ResponseCache, \
+    parse_cache_control
+
+
+def make_response(status_code=200, content=b'', headers=None, request=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    response.request = request
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.url = 'http://example.com/resource'
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def prepare(self, method='GET', url=None):
+        return requests.Request(method=method, url=url or self.url).prepare()
+
+    def test_parse_cache_control(self):
+        self.assertEqual({'max-age': '60', 'no-cache': None, 'private': None},
+                         parse_cache_control('max-age=60, no-cache, Private'))
+        self.assertEqual({}, parse_cache_control(None))
+
+    def test_invalid_cache(self):
+        with self.assertRaises(ValueError):
+            ResponseCache(max_size=0)
+        with self.assertRaises(ValueError):
+            ResponseCache(ttl=-1)
+
+    def test_fresh_hit(self):
+        cache = ResponseCache()
+        request = self.prepare()
+        self.assertIsNone(cache.lookup(request))
+        response = make_response(headers={'Cache-Control': 'max-age=60'}, request=request)
+        self.assertEqual(b'', cache.update(request, response).content)
+
+        other_request = self.prepare()
+        cached_response = cache.lookup(other_request)
+        self.assertIsNot(response, cached_response)
+        self.assertIs(other_request, cached_response.request)
+        cached_response.headers['X-Changed'] = 'yes'
+        self.assertNotIn('X-Changed', cache.lookup(self.prepare()).headers)
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_not_cacheable(self):
+        cache = ResponseCache(ttl=60)
+        request = self.prepare(method='POST')
+        cache.update(request, make_response(request=request))
+        self.assertEqual(0, len(cache))
+
+        request = self.prepare()
+        cache.update(request, make_response(status_code=500, request=request))
+        cache.update(request, make_response(headers={'Cache-Control': 'no-store'},
+                                            request=request))
+        self.assertEqual(0, len(cache))
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.1)
+        request = self.prepare()
+        cache.update(request, make_response(request=request))
+        self.assertIsNotNone(cache.lookup(self.prepare()))
+        time.sleep(0.15)
+        self.assertIsNone(cache.lookup(self.prepare()))
+        self.assertEqual(0, len(cache))
+
+    def test_lru(self):
+        cache = ResponseCache(max_size=2, ttl=60)
+        for i in range(3):
+            request = self.prepare(url='{url}/{i}'.format(url=self.url, i=i))
+            cache.update(request, make_response(request=request))
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.lookup(self.prepare(url=self.url + '/0')))
+        self.assertIsNotNone(cache.lookup(self.prepare(url=self.url + '/2')))
+
+    def test_disk_tier(self):
+        cache = ResponseCache(max_size=1, directory=self.directory, ttl=60)
+        for i in range(2):
+            request = self.prepare(url='{url}/{i}'.format(url=self.url, i=i))
+            cache.update(request, make_response(content=b'body', request=request))
+        self.assertEqual(1, len(cache))
+
+        response = cache.lookup(self.prepare(url=self.url + '/0'))
+        self.assertEqual(b'body', response.content)
+
+        cache = ResponseCache(directory=self.directory)
+        self.assertIsNotNone(cache.lookup(self.prepare(url=self.url + '/1')))
+
+        cache.clear()
+        self.assertIsNone(cache.lookup(self.prepare(url=self.url + '/1')))
+
+    def test_revalidation(self):
+        cache = ResponseCache()
+        request = self.prepare()
+        headers = {'Cache-Control': 'no-cache', 'ETag': '"v1"',
+                   'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        response = make_response(content=b'body', headers=headers, request=request)
+        cache.update(request, response)
+
+        request = self.prepare()
+        self.assertIsNone(cache.lookup(request))
+        self.assertEqual('"v1"', request.headers['If-None-Match'])
+        self.assertEqual('Wed, 21 Oct 2015 07:28:00 GMT', request.headers['If-Modified-Since'])
+
+        not_modified = make_response(status_code=304, headers={'Cache-Control': 'max-age=60'},
+                                     request=request)
+        revalidated = cache.update(request, not_modified)
+        self.assertEqual(200, revalidated.status_code)
+        self.assertEqual(b'body', revalidated.content)
+        self.assertEqual('max-age=60', revalidated.headers['Cache-Control'])
+        self.assertEqual('no-cache', response.headers['Cache-Control'])
+        self.assertEqual(1, cache.revalidations)
+        self.assertEqual(b'body', cache.lookup(self.prepare()).content)
+
+    def test_revalidation_after_eviction(self):
+        cache = ResponseCache(max_size=1)
+        request = self.prepare()
+        headers = {'Cache-Control': 'no-cache', 'ETag': '"v1"'}
+        cache.update(request, make_response(content=b'body', headers=headers, request=request))
+
+        request = self.prepare()
+        self.assertIsNone(cache.lookup(request))
+        other_request = self.prepare(url=self.url + '/other')
+        cache.update(other_request, make_response(headers={'Cache-Control': 'max-age=60'},
+                                                  request=other_request))
+        self.assertEqual(1, len(cache))
+
+        revalidated = cache.update(request, make_response(status_code=304, request=request))
+        self.assertEqual(200, revalidated.status_code)
+        self.assertEqual(b'body', revalidated.content)
+
+    def test_not_modified_not_revalidating(self):
+        cache = ResponseCache(ttl=60)
+        request = self.prepare()
+        request.headers['If-None-Match'] = '"v1"'
+        not_modified = make_response(status_code=304, request=request)
+        self.assertIs(not_modified, cache.update(request, not_modified))
+
+    def test_vary(self):
+        cache = ResponseCache()
+        request = self.prepare()
+        request.headers['Authorization'] = 'token-a'
+        headers = {'Cache-Control': 'max-age=60', 'Vary': 'Authorization'}
+        cache.update(request, make_response(content=b'a', headers=headers, request=request))
+
+        request = self.prepare()
+        request.headers['Authorization'] = 'token-b'
+        self.assertIsNone(cache.lookup(request))
+        request.headers['Authorization'] = 'token-a'
+        self.assertEqual(b'a', cache.lookup(request).content)
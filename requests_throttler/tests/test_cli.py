@@ -0,0 +1,74 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from requests_throttler.cli import \
+    Progress, \
+    get_rate_options, \
+    parse_args, \
+    parse_request, \
+    run
+from requests_throttler.tests.test_base_throttler import FakeSession
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_request(self):
+        self.assertIsNone(parse_request('  \n'))
+        self.assertIsNone(parse_request('# comment'))
+        request, request_id = parse_request('http://example.com/\n', method='HEAD')
+        self.assertEqual(('HEAD', 'http://example.com/', None),
+                         (request.method, request.url, request_id))
+        request, request_id = parse_request(
+            '{"url": "http://example.com/", "method": "POST", "json": {"a": 1}, "id": 7}')
+        self.assertEqual(('POST', {'a': 1}, 7), (request.method, request.json, request_id))
+        for line in ['{"method": "GET"}', '{not json']:
+            with self.assertRaises(ValueError):
+                parse_request(line)
+
+    def test_rate_options(self):
+        self.assertEqual({}, get_rate_options(None))
+        self.assertEqual({'delay': 0.5}, get_rate_options(2))
+        self.assertEqual({'limits': [(10, 5.0)]}, get_rate_options(2, burst=10))
+
+    def test_run(self):
+        args = parse_args(['--rate', '100', '--window', '2', '-H', 'X-Token: abc',
+                           '--progress-interval', '0.01'])
+        lines = ['http://example.com/{i}\n'.format(i=i) for i in range(5)]
+        lines.insert(2, '{"id": "bad"}\n')
+        session = FakeSession()
+        output = io.StringIO()
+        progress_stream = io.StringIO()
+        failed = run(args, lines, output, Progress(progress_stream, args.progress_interval),
+                     session=session)
+
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(1, failed)
+        self.assertEqual(list(range(6)), [result['index'] for result in results])
+        self.assertEqual([200, 200, None, 200, 200, 200],
+                         [result['status'] for result in results])
+        self.assertIn('ValueError', results[2]['error'])
+        self.assertEqual('http://example.com/4', results[-1]['url'])
+        self.assertEqual(0, results[0]['size'])
+        self.assertEqual('abc', session.sent[0].headers['X-Token'])
+        self.assertIn('6/6 done, 1 failed', progress_stream.getvalue().splitlines()[-1])
+
+    def test_body_dir(self):
+        args = parse_args(['--body-dir', self.directory, '--progress-interval', '0'])
+        output = io.StringIO()
+        progress_stream = io.StringIO()
+        run(args, ['http://example.com/'], output, Progress(progress_stream, 0),
+            session=FakeSession())
+        result = json.loads(output.getvalue())
+        self.assertEqual(os.path.join(self.directory, '0.body'), result['body'])
+        self.assertTrue(os.path.exists(result['body']))
+        self.assertEqual('', progress_stream.getvalue())
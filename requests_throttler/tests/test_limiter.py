@@ -0,0 +1,135 @@
+import time
+import threading
+import unittest
+
+from requests_throttler.limiter import Limiter, get_delay, parse_rate_limit_headers
+
+
+class TestLimiter(unittest.TestCase):
+
+    def test_get_delay(self):
+        self.assertEqual(0, get_delay(None, None))
+        self.assertEqual(3, get_delay(None, (5, 15)))
+        self.assertEqual(1, get_delay(1, (5, 15)))
+        with self.assertRaises(ValueError):
+            get_delay(-1, None)
+        with self.assertRaises(ValueError):
+            get_delay(None, (-5, 15))
+
+    def test_delay(self):
+        limiter = Limiter(delay=0.1)
+        start = time.time()
+        for i in range(3):
+            self.assertTrue(limiter.acquire(self))
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertGreater(limiter.remaining_time(), 0)
+
+    def test_cost(self):
+        limiter = Limiter(delay=0.1)
+        start = time.time()
+        self.assertTrue(limiter.acquire(self, cost=3))
+        self.assertTrue(limiter.acquire(self))
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertLessEqual(limiter.remaining_time(cost=5), 0.1)
+
+        limiter = Limiter(limits=[(4, 0.3)])
+        start = time.time()
+        limiter.acquire(self, cost=3)
+        limiter.acquire(self)
+        limiter.acquire(self, cost=2)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def test_parse_rate_limit_headers(self):
+        self.assertEqual((10, 130.0), parse_rate_limit_headers(
+            {'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': '30'}, now=100.0))
+        self.assertEqual((0, 1700000000.0), parse_rate_limit_headers(
+            {'RateLimit-Remaining': '-1', 'RateLimit-Reset': '1700000000'}, now=100.0))
+        self.assertIsNone(parse_rate_limit_headers({'X-RateLimit-Remaining': '10'}))
+        self.assertIsNone(parse_rate_limit_headers(
+            {'X-RateLimit-Remaining': 'many', 'X-RateLimit-Reset': '30'}))
+
+    def test_sync(self):
+        limiter = Limiter(delay=1)
+        limiter.acquire(self)
+        limiter.sync(100, time.time() + 10)
+        start = time.time()
+        for i in range(5):
+            limiter.acquire(self)
+        self.assertLess(time.time() - start, 1)
+
+        limiter.sync(1, time.time() + 0.3)
+        start = time.time()
+        limiter.acquire(self)
+        limiter.acquire(self)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertGreater(limiter.remaining_time(), 0.5)
+
+    def test_sync_mark(self):
+        limiter = Limiter()
+        self.assertIsNone(limiter.mark(self))
+        limiter.acquire(self)
+        mark = limiter.mark(self)
+        self.assertEqual(1, mark)
+        for i in range(3):
+            limiter.acquire(self)
+        reset = time.time() + 10
+        limiter.sync(5, reset, mark)
+        self.assertEqual(2, limiter._quota_remaining)
+        limiter.sync(8, reset + 0.5)
+        self.assertEqual(2, limiter._quota_remaining)
+        limiter.sync(8, reset + 5)
+        self.assertEqual(8, limiter._quota_remaining)
+
+    def test_limits(self):
+        limiter = Limiter(limits=[(2, 0.3)])
+        self.assertEqual([(2, 0.3)], limiter.limits)
+        start = time.time()
+        for i in range(3):
+            limiter.acquire(self)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def test_fifo(self):
+        limiter = Limiter(delay=0.05)
+        order = []
+
+        def client(name):
+            for i in range(3):
+                limiter.acquire(name)
+                order.append(name)
+
+        threads = [threading.Thread(target=client, args=(name,)) for name in 'ab']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(6, len(order))
+        self.assertNotIn('aaa', ''.join(order))
+        self.assertNotIn('bbb', ''.join(order))
+
+    def test_give_up(self):
+        limiter = Limiter(delay=5)
+        limiter.acquire(self)
+        stop = []
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            limiter.acquire(self, give_up=lambda: bool(stop))))
+        thread.start()
+        time.sleep(0.1)
+        stop.append(True)
+        limiter.wake()
+        thread.join(1)
+        self.assertEqual([False], results)
+
+    def test_set_delay(self):
+        limiter = Limiter(delay=5)
+        limiter.acquire(self)
+        start = time.time()
+        thread = threading.Thread(target=limiter.acquire, args=(self,))
+        thread.start()
+        time.sleep(0.1)
+        limiter.set_rate(10, 1)
+        self.assertEqual(0.1, limiter.delay)
+        thread.join(1)
+        self.assertLess(time.time() - start, 1)
+        with self.assertRaises(ValueError):
+            limiter.set_delay(-1)
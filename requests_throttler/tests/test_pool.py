@@ -0,0 +1,89 @@
+import time
+import unittest
+
+from requests_throttler.pool import RequestsPool
+
+
+class TestRequestsPool(unittest.TestCase):
+
+    def test_requests_pool(self):
+        pool = RequestsPool(maxlen=2)
+        self.assertEqual(2, pool.maxlen)
+        pool.append(1)
+        pool.append(2)
+        self.assertTrue(pool.full())
+        with self.assertRaises(IndexError):
+            pool.append(3)
+        with self.assertRaises(ValueError):
+            pool.resize(1)
+        pool.resize(None)
+        pool.append(3)
+        self.assertEqual([1, 2, 3], [pool.popleft() for i in range(3)])
+        with self.assertRaises(IndexError):
+            pool.popleft()
+        with self.assertRaises(ValueError):
+            RequestsPool(weights={'a': -1})
+
+    def test_weights(self):
+        pool = RequestsPool(weights={'a': 3, 'c': 0.5})
+        for i in range(12):
+            pool.append('a', tenant='a')
+            pool.append('b', tenant='b')
+            pool.append('c', tenant='c')
+        self.assertEqual(['a', 'b', 'c'], pool.tenants)
+        order = ''.join(pool.popleft() for i in range(18))
+        self.assertEqual(12, order.count('a'))
+        self.assertEqual(4, order.count('b'))
+        self.assertEqual(2, order.count('c'))
+
+    def test_cost(self):
+        pool = RequestsPool()
+        for i in range(4):
+            pool.append('a', tenant='a', cost=3)
+            pool.append('b', tenant='b')
+        self.assertEqual('bbabbaaa', ''.join(pool.popleft() for i in range(8)))
+
+    def test_discard(self):
+        pool = RequestsPool(maxlen=4)
+        for item in 'abcd':
+            pool.append(item, tenant='a' if item < 'c' else 'b')
+        self.assertTrue(pool.full())
+        self.assertTrue(pool.discard('a'))
+        self.assertFalse(pool.discard('a'))
+        self.assertFalse(pool.discard('e'))
+        self.assertEqual(3, len(pool))
+        pool.append('e', tenant='a')
+        self.assertEqual('bced', ''.join(pool.popleft() for i in range(4)))
+        self.assertEqual(0, len(pool))
+
+        pool = RequestsPool()
+        for i in range(4):
+            pool.append('a{i}'.format(i=i), tenant='a', cost=2)
+            pool.append('b{i}'.format(i=i), tenant='b', cost=2)
+        pool.discard('a0')
+        pool.discard('a1')
+        self.assertEqual(['a2', 'b0', 'a3', 'b1'], [pool.popleft() for i in range(4)])
+
+    def test_large_cost_small_weight(self):
+        pool = RequestsPool(weights={'a': 0.001, 'b': 0.002})
+        for i in range(1000):
+            pool.append('a', tenant='a', cost=1e5)
+            pool.append('b', tenant='b', cost=1e5)
+        start = time.time()
+        items = ''.join(pool.popleft() for i in range(2000))
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual('babbabbab', items[:9])
+
+    def test_new_tenant(self):
+        pool = RequestsPool()
+        for i in range(1000):
+            pool.append('big', tenant='big')
+        pool.popleft()
+        pool.append('small', tenant='small')
+        self.assertEqual(['big', 'small'], [pool.popleft() for i in range(2)])
+        self.assertEqual(['big'], pool.tenants)
+
+        pool.set_weight('big', 2)
+        self.assertEqual(2, pool.weight('big'))
+        pool.clear()
+        self.assertEqual(0, len(pool))
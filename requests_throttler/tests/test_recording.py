@@ -0,0 +1,72 @@
+import io
+import time
+import unittest
+
+import requests
+
+from requests_throttler.recording import \
+    Recorder, \
+    StubServer, \
+    read_trace, \
+    replay, \
+    replay_request
+from requests_throttler.throttler import BaseThrottler
+from requests_throttler.tests.test_base_throttler import FakeSession, FailingSession
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.request = requests.Request(method='GET', url='http://example.com/items?id=1')
+
+    def test_recorder(self):
+        trace = io.StringIO()
+        recorder = Recorder(trace)
+        with BaseThrottler(session=FakeSession(latency=0.05), delay=0.1,
+                           recorder=recorder) as bt:
+            bt.multi_submit([self.request for i in range(2)])
+        bt.wait_end()
+        with BaseThrottler(session=FailingSession(), recorder=recorder) as bt:
+            bt.submit(self.request)
+        bt.wait_end()
+        self.assertEqual(3, recorder.records)
+
+        records = list(read_trace(io.StringIO(trace.getvalue())))
+        self.assertEqual([200, 200, None], [record['status'] for record in records])
+        self.assertEqual('ConnectionError', records[2]['error'])
+        self.assertEqual('http://example.com/items?id=1', records[0]['url'])
+        self.assertEqual(0, records[0]['size'])
+        self.assertGreaterEqual(records[0]['latency'], 0.05)
+        self.assertGreaterEqual(records[1]['sent'] - records[1]['submitted'], 0.09)
+
+    def test_stub_server(self):
+        record = {'method': 'POST', 'url': 'http://example.com/items?id=1', 'status': 201,
+                  'size': 5, 'latency': 0.1}
+        with StubServer() as server:
+            request = replay_request(record, server.url)
+            self.assertEqual(server.url + '/items?id=1', request.url)
+            start = time.time()
+            response = requests.Session().send(request.prepare())
+            self.assertGreaterEqual(time.time() - start, 0.1)
+            self.assertEqual(201, response.status_code)
+            self.assertEqual(b'xxxxx', response.content)
+
+            record.update(status=None, size=None, latency=0)
+            with self.assertRaises(requests.ConnectionError):
+                requests.Session().send(replay_request(record, server.url).prepare())
+
+    def test_replay(self):
+        records = [{'submitted': i * 0.01, 'method': 'GET', 'url': 'http://example.com/',
+                    'status': 200, 'size': 1, 'latency': 0.05} for i in range(4)]
+        records[-1].update(status=None)
+        with self.assertRaises(ValueError):
+            replay(records, BaseThrottler(), 'http://localhost', speed=0)
+
+        trace = io.StringIO()
+        with StubServer() as server, Recorder(trace) as recorder:
+            summary = replay(records, BaseThrottler(delay=0.1, recorder=recorder), server.url)
+        self.assertEqual((3, 1), summary[:2])
+        self.assertGreaterEqual(summary.elapsed, 0.3)
+        replayed = list(read_trace(io.StringIO(trace.getvalue())))
+        self.assertEqual(4, len(replayed))
+        self.assertTrue(all(record['latency'] >= 0.05 for record in replayed))
@@ -0,0 +1,111 @@
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from requests_throttler.sessions import \
+    SessionPool, \
+    clone_session, \
+    resize_adapters
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingSession(requests.Session):
+
+    def __init__(self):
+        super(CountingSession, self).__init__()
+        self.sent = []
+
+
+class CountingAdapter(HTTPAdapter):
+    pass
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{port}/'.format(port=self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resize_adapters(self):
+        session = requests.Session()
+        resize_adapters(session, 32)
+        self.assertEqual(32, session.get_adapter('http://').poolmanager.connection_pool_kw['maxsize'])
+        resize_adapters(session, 4)
+        self.assertEqual(32, session.get_adapter('http://')._pool_maxsize)
+
+    def test_clone_session(self):
+        session = requests.Session()
+        session.headers['User-Agent'] = 'test-user-agent'
+        session.cookies.set('name', 'value')
+        clone = clone_session(session)
+        self.assertEqual('test-user-agent', clone.headers['User-Agent'])
+        self.assertEqual('value', clone.cookies.get('name'))
+        self.assertIsInstance(clone.get_adapter('https://'), HTTPAdapter)
+        self.assertIsNot(session.get_adapter('https://'), clone.get_adapter('https://'))
+
+        clone.headers['User-Agent'] = 'other-user-agent'
+        self.assertEqual('test-user-agent', session.headers['User-Agent'])
+
+    def test_clone_session_subclass(self):
+        session = CountingSession()
+        session.mount('http://', CountingAdapter())
+        clone = clone_session(session)
+        self.assertIsInstance(clone, CountingSession)
+        self.assertIsInstance(clone.get_adapter('http://'), CountingAdapter)
+        self.assertIsNot(session.get_adapter('http://').poolmanager,
+                         clone.get_adapter('http://').poolmanager)
+        self.assertIs(session.sent, clone.sent)
+
+    def test_session_pool(self):
+        session = requests.Session()
+        pool = SessionPool(session, size=16)
+        self.assertIs(session, pool.session())
+        self.assertEqual(16, session.get_adapter('http://')._pool_maxsize)
+
+        with self.assertRaises(ValueError):
+            SessionPool(session, size=0)
+
+    def test_sharded_session_pool(self):
+        pool = SessionPool(requests.Session(), size=2, shard=True)
+        sessions = []
+
+        def bind():
+            sessions.append(pool.session())
+            self.assertIs(sessions[-1], pool.session())
+
+        for i in range(2):
+            thread = threading.Thread(target=bind)
+            thread.start()
+            thread.join()
+        self.assertIsNot(sessions[0], sessions[1])
+
+    def test_warm_and_stats(self):
+        pool = SessionPool(requests.Session(), size=2)
+        self.assertEqual({'requests': 0, 'connections': 0, 'reused': 0}, pool.stats())
+
+        self.assertEqual(2, pool.warm(self.url))
+        for i in range(4):
+            self.assertEqual(b'ok', pool.session().get(self.url).content)
+        self.assertEqual({'requests': 4, 'connections': 2, 'reused': 2}, pool.stats())
@@ -0,0 +1,102 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from requests_throttler.sinks import \
+    CallbackSink, \
+    DirectorySink, \
+    JsonLinesSink, \
+    QueueSink, \
+    Sink, \
+    result_record
+from requests_throttler.throttled_request import ThrottledRequest
+from requests_throttler.throttler import BaseThrottler
+from requests_throttler.tests.test_base_throttler import FakeSession
+
+
+class CountingStream(io.StringIO):
+
+    def __init__(self):
+        super(CountingStream, self).__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super(CountingStream, self).write(s)
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.requests = [requests.Request(method='GET', url='http://example.com/{i}'.format(i=i))
+                         for i in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_result_record(self):
+        throttled_request = ThrottledRequest(self.requests[0].prepare())
+        throttled_request.exception = ValueError("boom")
+        self.assertEqual({'method': 'GET', 'url': 'http://example.com/0', 'status': None,
+                          'elapsed': None, 'size': None, 'error': 'ValueError: boom'},
+                         result_record(throttled_request))
+        with self.assertRaises(ValueError):
+            Sink(batch_size=0)
+        with self.assertRaises(NotImplementedError):
+            Sink().put(throttled_request)
+
+    def test_callback_sink(self):
+        finished = []
+        with BaseThrottler(session=FakeSession(), sink=CallbackSink(finished.append)) as bt:
+            self.assertEqual(5, bt.feed(iter(self.requests)))
+        bt.wait_end()
+        self.assertEqual(5, len(finished))
+        self.assertTrue(all(tr.finished for tr in finished))
+
+    def test_json_lines_sink(self):
+        stream = CountingStream()
+        sink = JsonLinesSink(stream, batch_size=2)
+        with BaseThrottler(session=FakeSession(), sink=sink) as bt:
+            bt.feed(self.requests)
+        bt.wait_end()
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(['http://example.com/{i}'.format(i=i) for i in range(5)],
+                         [record['url'] for record in records])
+        self.assertEqual(3, stream.writes)
+
+    def test_directory_sink(self):
+        with DirectorySink(os.path.join(self.directory, 'bodies'), batch_size=10) as sink:
+            with BaseThrottler(session=FakeSession(), sink=sink) as bt:
+                bt.feed(self.requests)
+            bt.wait_end()
+        with open(os.path.join(sink.directory, DirectorySink.INDEX)) as index:
+            records = [json.loads(line) for line in index]
+        self.assertEqual(5, len(records))
+        self.assertTrue(all(os.path.exists(record['body']) for record in records))
+
+    def test_queue_sink(self):
+        with self.assertRaises(ValueError):
+            QueueSink(maxsize=0)
+        sink = QueueSink(maxsize=2)
+        consumed = []
+
+        def consume():
+            for throttled_request in sink:
+                consumed.append(throttled_request.response.request.url)
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        with BaseThrottler(session=FakeSession(), sink=sink) as bt:
+            bt.feed(self.requests)
+        bt.wait_end()
+        sink.close()
+        consumer.join(1)
+        self.assertEqual(5, len(consumed))
+        self.assertIsNone(sink.get())
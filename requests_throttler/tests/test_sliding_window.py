@@ -0,0 +1,36 @@
+import unittest
+
+from requests_throttler.utils import SlidingWindow
+
+
+class TestSlidingWindowTestCase(unittest.TestCase):
+
+    def test_sliding_window(self):
+        window = SlidingWindow(2, 10)
+        self.assertEqual(2, window.n_reqs)
+        self.assertEqual(10.0, window.window)
+
+        for n_reqs, length in [(0, 1), (1.5, 1), (1, -1)]:
+            with self.assertRaises(ValueError):
+                SlidingWindow(n_reqs, length)
+
+    def test_remaining(self):
+        window = SlidingWindow(2, 10)
+        self.assertEqual(0, window.remaining(now=100.0))
+        window.add(100.0)
+        self.assertEqual(0, window.remaining(now=101.0))
+        window.add(101.0)
+        self.assertEqual(9.0, window.remaining(now=101.0))
+        self.assertEqual(0.0, window.remaining(now=110.0))
+        window.add(110.0)
+        self.assertEqual(1.0, window.remaining(now=110.0))
+
+    def test_cost(self):
+        window = SlidingWindow(5, 10)
+        window.add(100.0, cost=2)
+        window.add(102.0, cost=2)
+        self.assertEqual(0, window.remaining(now=103.0))
+        self.assertEqual(7.0, window.remaining(now=103.0, cost=3))
+        self.assertEqual(9.0, window.remaining(now=103.0, cost=4))
+        self.assertEqual(9.0, window.remaining(now=103.0, cost=20))
+        self.assertEqual(0, window.remaining(now=112.0, cost=20))
@@ -0,0 +1,52 @@
+import unittest
+
+import requests
+
+from requests_throttler.templates import RequestTemplate
+from requests_throttler.throttler import BaseThrottler
+from requests_throttler.tests.test_base_throttler import FakeSession
+
+
+class TestRequestTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.session = requests.Session()
+        self.session.headers['X-Token'] = 'abc'
+        self.session.cookies.set('session', 'xyz')
+
+    def test_render(self):
+        request = requests.Request(method='POST', url='http://example.com/items/{id}?q={q}',
+                                   params={'page': 2}, json={'a': 1})
+        template = RequestTemplate(request, session=self.session)
+        self.assertEqual(['id', 'q'], template.names)
+
+        prepared = template.render(id='a/b', q='x y')
+        expected = self.session.prepare_request(requests.Request(
+            method='POST', url='http://example.com/items/a%2Fb?q=x%20y', params={'page': 2},
+            json={'a': 1}))
+        self.assertEqual(expected.url, prepared.url)
+        self.assertEqual(expected.method, prepared.method)
+        self.assertEqual(expected.body, prepared.body)
+        self.assertEqual(dict(expected.headers), dict(prepared.headers))
+
+        other = template.render(id=1, q=2)
+        other.headers['X-Other'] = 'yes'
+        self.assertNotIn('X-Other', prepared.headers)
+        self.assertEqual('http://example.com/items/1?q=2&page=2', other.url)
+        with self.assertRaises(ValueError):
+            template.render(id=1)
+
+    def test_invalid_template(self):
+        for url in ['http://example.com/{}', 'http://{host}/']:
+            with self.assertRaises(ValueError):
+                RequestTemplate(requests.Request(method='GET', url=url))
+
+    def test_submit(self):
+        session = FakeSession()
+        with BaseThrottler(session=session) as bt:
+            template = bt.template(requests.Request(method='GET',
+                                                    url='http://example.com/items/{id}'))
+            throttled_requests = [bt.submit(template.render(id=i)) for i in range(3)]
+        bt.wait_end()
+        self.assertEqual(['http://example.com/items/{i}'.format(i=i) for i in range(3)],
+                         [tr.response.request.url for tr in throttled_requests])
@@ -1,11 +1,23 @@
+import io
+import os
 import time
+import shutil
+import tempfile
 import unittest
 
 import requests
 
 from requests_throttler.throttled_request import \
     ThrottledRequest, \
-    ThrottledRequestAlreadyFinished
+    ThrottledRequestAlreadyFinished, \
+    ThrottledRequestCancelled
+
+
+class RawBody(io.BytesIO):
+    released = False
+
+    def release_conn(self):
+        self.released = True
 
 
 class TestThrottledRequestCase(unittest.TestCase):
@@ -119,3 +131,54 @@ class TestThrottledRequestCase(unittest.TestCase):
         throttled_request.response = res
         with throttled_request.not_done:
             self.assertEqual(True, throttled_request._wait_finished(timeout=self.default_to))
+
+    def streamed_response(self, content):
+        res = requests.Response()
+        res.status_code = 200
+        res.raw = RawBody(content)
+        return res
+
+    def test_cancel(self):
+        req = requests.Request(method='GET', url=self.req_url)
+        throttled_request = ThrottledRequest(req)
+        self.assertTrue(throttled_request.cancel())
+        self.assertTrue(throttled_request.cancelled)
+        self.assertTrue(throttled_request.finished)
+        self.assertFalse(throttled_request.cancel())
+        self.assertFalse(throttled_request.set_running())
+        self.assertIsInstance(throttled_request.exception, ThrottledRequestCancelled)
+        with self.assertRaises(ThrottledRequestCancelled):
+            throttled_request.response
+
+        throttled_request = ThrottledRequest(req)
+        self.assertTrue(throttled_request.set_running())
+        self.assertFalse(throttled_request.cancel())
+        self.assertFalse(throttled_request.cancelled)
+
+    def test_iter_content(self):
+        req = requests.Request(method='GET', url=self.req_url)
+        throttled_request = ThrottledRequest(req, send_options={'stream': True})
+        self.assertEqual({'stream': True}, throttled_request.send_options)
+        res = self.streamed_response(b'abcde')
+        throttled_request.response = res
+
+        self.assertEqual([b'ab', b'cd', b'e'], list(throttled_request.iter_content(2)))
+        self.assertTrue(res.raw.released)
+
+    def test_save(self):
+        req = requests.Request(method='GET', url=self.req_url)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'body')
+            throttled_request = ThrottledRequest(req)
+            throttled_request.response = self.streamed_response(b'abcde')
+            self.assertEqual(5, throttled_request.save(path, chunk_size=2))
+            with open(path, 'rb') as f:
+                self.assertEqual(b'abcde', f.read())
+        finally:
+            shutil.rmtree(directory)
+
+        throttled_request = ThrottledRequest(req)
+        throttled_request.exception = ValueError()
+        with self.assertRaises(ValueError):
+            throttled_request.save(io.BytesIO())
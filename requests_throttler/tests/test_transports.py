@@ -0,0 +1,146 @@
+import unittest
+
+import requests
+
+from requests_throttler.recording import StubServer, H2StubServer, replay_request
+from requests_throttler.throttler import BaseThrottler
+from requests_throttler.transports import \
+    RequestsTransport, \
+    Urllib3Transport, \
+    HTTP2Transport, \
+    StubTransport, \
+    build_response
+
+try:
+    import h2
+    import httpx
+except ImportError:
+    h2 = httpx = None
+
+
+def record(status=200, latency=0, size=0):
+    return {'method': 'GET', 'url': 'http://example.com/items?id=1', 'status': status,
+            'latency': latency, 'size': size}
+
+
+class TestTransports(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        self.server.start()
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def prepare(self, **kwargs):
+        return self.session.prepare_request(replay_request(record(**kwargs), self.server.url))
+
+    def test_default_transport(self):
+        bt = BaseThrottler(session=self.session)
+        self.assertIsInstance(bt.transport, RequestsTransport)
+        response = bt.transport.send(self.session, self.prepare(size=3))
+        self.assertEqual((200, b'xxx'), (response.status_code, response.content))
+
+    def test_connections(self):
+        with BaseThrottler(session=self.session, concurrency=2) as bt:
+            bt.multi_submit([replay_request(record(latency=0.1), self.server.url)
+                             for i in range(4)])
+        bt.wait_end()
+        self.assertEqual(2, self.server.connections)
+
+    def test_urllib3_transport(self):
+        transport = Urllib3Transport()
+        request = self.prepare(status=404, size=5)
+        response = transport.send(self.session, request)
+        self.assertEqual((404, b'xxxxx'), (response.status_code, response.content))
+        self.assertEqual('5', response.headers['content-length'])
+        self.assertEqual(request.url, response.url)
+        self.assertIs(request, response.request)
+
+        response = transport.send(self.session, self.prepare(size=4), stream=True)
+        self.assertEqual([b'xx', b'xx'], list(response.iter_content(2)))
+
+        with self.assertRaises(requests.ReadTimeout):
+            transport.send(self.session, self.prepare(latency=0.5), timeout=(1, 0.1))
+        with self.assertRaises(requests.ConnectionError):
+            transport.send(self.session, self.prepare(status=0))
+        transport.close()
+
+    def test_throttler_with_urllib3_transport(self):
+        with BaseThrottler(session=self.session, transport=Urllib3Transport(),
+                           concurrency=2) as bt:
+            throttled_requests = bt.multi_submit([
+                replay_request(record(size=i), self.server.url) for i in range(4)])
+        bt.wait_end()
+        self.assertEqual([b'', b'x', b'xx', b'xxx'],
+                         [tr.response.content for tr in throttled_requests])
+        self.assertEqual(4, bt.successes)
+
+    def test_stub_transport(self):
+        transport = StubTransport(status=201, headers={'X-Id': '1'}, content=b'ok')
+        with BaseThrottler(transport=transport) as bt:
+            throttled_requests = bt.multi_submit([replay_request(record(), self.server.url)
+                                                  for i in range(3)])
+        bt.wait_end()
+        self.assertEqual(3, transport.sent)
+        response = throttled_requests[0].response
+        self.assertEqual((201, b'ok', '1'),
+                         (response.status_code, response.content, response.headers['x-id']))
+
+        def responder(request):
+            if request.url.endswith('fail'):
+                raise requests.ConnectionError("Connection refused")
+            return build_response(request, 204)
+
+        with BaseThrottler(transport=StubTransport(responder=responder)) as bt:
+            succeeded = bt.submit(requests.Request(method='GET', url='http://example.com/'))
+            failed = bt.submit(requests.Request(method='GET', url='http://example.com/fail'))
+        bt.wait_end()
+        self.assertEqual(204, succeeded.response.status_code)
+        self.assertIsInstance(failed.exception, requests.ConnectionError)
+
+
+@unittest.skipUnless(httpx is not None and h2 is not None, "httpx and h2 are not installed")
+class TestHTTP2Transport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = H2StubServer()
+        self.server.start()
+        self.session = requests.Session()
+        self.transport = HTTP2Transport(http1=False)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+
+    def prepare(self, **kwargs):
+        return self.session.prepare_request(replay_request(record(**kwargs), self.server.url))
+
+    def test_send(self):
+        response = self.transport.send(self.session, self.prepare(status=404, size=5))
+        self.assertEqual((404, b'xxxxx'), (response.status_code, response.content))
+        self.assertEqual('5', response.headers['content-length'])
+
+        response = self.transport.send(self.session, self.prepare(size=4), stream=True)
+        self.assertEqual(b'xxxx', b''.join(response.iter_content(2)))
+
+        with self.assertRaises(requests.ReadTimeout):
+            self.transport.send(self.session, self.prepare(latency=0.5), timeout=(1, 0.1))
+        with self.assertRaises(requests.ConnectionError):
+            self.transport.send(self.session, self.prepare(status=0))
+
+    def test_multiplexing(self):
+        with BaseThrottler(session=self.session, transport=self.transport,
+                           concurrency=8) as bt:
+            throttled_requests = bt.multi_submit([
+                replay_request(record(latency=0.2, size=i), self.server.url)
+                for i in range(16)])
+        bt.wait_end()
+        self.assertEqual([b'x' * i for i in range(16)],
+                         [tr.response.content for tr in throttled_requests])
+        self.assertEqual(1, self.server.connections)
+
+
+if __name__ == '__main__':
+    unittest.main()
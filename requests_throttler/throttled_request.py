@@ -8,9 +8,12 @@ This module provides the class representing the requests to throttle.
 
 """
 
+import time
 import threading
 
-from requests_throttler.utils import locked
+from requests_throttler.utils import locked, get_logger
+
+logger = get_logger(__name__)
 
 
 class ThrottledRequestAlreadyFinished(Exception):
@@ -29,11 +32,29 @@ class ThrottledRequestAlreadyFinished(Exception):
         return self.msg
 
 
+class ThrottledRequestCancelled(Exception):
+    """Exception associated to a throttled request that has been cancelled before being sent
+
+    :param msg: the message
+    :type msg: string
+
+    """
+
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
 class ThrottledRequest(object):
     """This class represents a throttled request
 
-    :param request: the prepared request to throttle
-    :type request: requests.PreparedRequest
+    :param request: the prepared request to throttle, or the request to prepare when not
+                    prepared yet
+    :type request: requests.PreparedRequest or requests.Request
+    :param prepared: the flag that indicates if the request has been prepared
+    :type prepared: boolean
     :param finished: the flag that indicates if the request has been sent and a response has
                      been received or an exception occured
     :type finished: boolean
@@ -42,23 +63,58 @@ class ThrottledRequest(object):
     :param exception: the exception occured during the request (:const:`None` if no exceptions
                       occured)
     :type exception: Exception
+    :param send_options: the keyword arguments used to send the request
+    :type send_options: dict
+    :param cost: the units of the rate budget charged when sending the request
+    :type cost: float
+    :param submitted_at: the time the throttled request has been created
+    :type submitted_at: float
+    :param on_finish: the function called with the throttled request once it is finished
+    :type on_finish: callable
+    :param running: the flag that indicates if the request is being sent, hence it cannot be
+                    cancelled anymore
+    :type running: boolean
+    :param cancelled: the flag that indicates if the request has been cancelled
+    :type cancelled: boolean
     :param not_done: the condition on which to wait to have the response an to make the
                      object thread-safe
     :type not_done: threading.Condition
 
     """
 
-    def __init__(self, request):
+    def __init__(self, request, send_options=None, cost=1, on_finish=None, prepared=True):
         """Create a throttled request with the given prepared request
 
-        :param request: the prepared request to throttle
-        :type request: requests.PreparedRequest
+        :param request: the prepared request to throttle, or the request to prepare if
+                        ``prepared`` is :const:`False`
+        :type request: requests.PreparedRequest or requests.Request
+        :param send_options: the keyword arguments used to send the request (e.g. ``stream``)
+                             (default: :const:`None`)
+        :type send_options: dict
+        :param cost: the units of the rate budget charged when sending the request (default:
+                     :const:`1`)
+        :type cost: float
+        :param on_finish: the function called with the throttled request once it is finished,
+                          from the thread finishing it and without holding any lock, e.g. the
+                          ``put`` method of a :class:`requests_throttler.sinks.Sink` (default:
+                          :const:`None`)
+        :type on_finish: callable
+        :param prepared: :const:`False` if ``request`` still has to be prepared by the
+                         throttler right before sending it (default: :const:`True`)
+        :type prepared: boolean
 
         """
         self._request = request
+        self._prepared = prepared
+        self._send_options = dict(send_options or {})
+        self._cost = cost
+        self._submitted_at = time.time()
+        self._on_finish = on_finish
         self._finished = False
         self._response = None
         self._exception = None
+        self._running = False
+        self._cancelled = False
         self.not_done = threading.Condition(threading.Lock())
 
     def __str__(self):
@@ -80,6 +136,58 @@ class ThrottledRequest(object):
         """
         return self._request
 
+    @property
+    @locked('not_done')
+    def prepared(self):
+        """The flag that indicates if :attr:`request` has been prepared
+
+        :getter: Returns :attr:`prepared`
+        :type: boolean
+
+        """
+        return self._prepared
+
+    @locked('not_done')
+    def set_prepared(self, request):
+        """Replace the request to prepare with the given prepared one
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+
+        """
+        self._request = request
+        self._prepared = True
+
+    @property
+    def send_options(self):
+        """The keyword arguments used to send the request
+
+        :getter: Returns :attr:`send_options`
+        :type: dict
+
+        """
+        return self._send_options
+
+    @property
+    def cost(self):
+        """The units of the rate budget charged when sending the request
+
+        :getter: Returns :attr:`cost`
+        :type: float
+
+        """
+        return self._cost
+
+    @property
+    def submitted_at(self):
+        """The time the throttled request has been created
+
+        :getter: Returns :attr:`submitted_at`
+        :type: float
+
+        """
+        return self._submitted_at
+
     @property
     @locked('not_done')
     def finished(self):
@@ -91,6 +199,70 @@ class ThrottledRequest(object):
         """
         return self._finished
 
+    @property
+    @locked('not_done')
+    def running(self):
+        """The flag that indicates if the request is being sent or has been sent
+
+        :getter: Returns :attr:`running`
+        :type: boolean
+
+        """
+        return self._running
+
+    @property
+    @locked('not_done')
+    def cancelled(self):
+        """The flag that indicates if the request has been cancelled
+
+        :getter: Returns :attr:`cancelled`
+        :type: boolean
+
+        """
+        return self._cancelled
+
+    def cancel(self):
+        """Cancel the request if it is not being sent nor finished
+
+        A cancelled request is finished with a
+        :class:`requests_throttler.throttled_request.ThrottledRequestCancelled` exception, hence
+        all the threads waiting for it are woken up. The throttler skips it when dequeued
+        without consuming any delay.
+
+        :return: :const:`True` if the request has been cancelled, :const:`False` otherwise
+        :rtype: boolean
+
+        """
+        if not self._cancel():
+            return False
+        self._notify_finished()
+        return True
+
+    @locked('not_done')
+    def _cancel(self):
+        """Finish the request as cancelled if it is not being sent nor finished"""
+
+        if self._finished or self._running:
+            return False
+        self._exception = ThrottledRequestCancelled("ThrottledRequest cancelled.")
+        self._cancelled = True
+        self._finished = True
+        self.not_done.notify_all()
+        return True
+
+    @locked('not_done')
+    def set_running(self):
+        """Mark the request as being sent so that it cannot be cancelled anymore
+
+        :return: :const:`False` if the request has been cancelled, :const:`True` otherwise
+        :rtype: boolean
+
+        """
+        if self._cancelled:
+            return False
+        self._running = True
+        return True
+
     @property
     def response(self):
         """The response obtained by processing the request
@@ -105,7 +277,6 @@ class ThrottledRequest(object):
         return self.get_response(timeout=None)
 
     @response.setter
-    @locked('not_done')
     def response(self, response):
         """Set the response that has been received during the processing of the request
 
@@ -115,11 +286,18 @@ class ThrottledRequest(object):
             :ThrottledRequestAlreadyFinshed: if the throttled request has already finished
 
         """
+        self._set_response(response)
+        self._notify_finished()
+
+    @locked('not_done')
+    def _set_response(self, response):
+        """Set the response and wake up the threads waiting for it"""
+
         if self._finished is True:
             raise ThrottledRequestAlreadyFinished("ThrottledRequest already finished")
         self._response = response
         self._finished = True
-        self.not_done.notify()
+        self.not_done.notify_all()
 
     @property
     def exception(self):
@@ -136,7 +314,6 @@ class ThrottledRequest(object):
         return self.get_exception(timeout=None)
 
     @exception.setter
-    @locked('not_done')
     def exception(self, exception):
         """Set the exception that has been raised during the processing of the request
 
@@ -146,12 +323,29 @@ class ThrottledRequest(object):
             :ThrottledRequestAlreadyFinshed: if the throttled request has already finished
 
         """
+        self._set_exception(exception)
+        self._notify_finished()
+
+    @locked('not_done')
+    def _set_exception(self, exception):
+        """Set the exception and wake up the threads waiting for it"""
+
         if self._finished is True:
             raise ThrottledRequestAlreadyFinished("ThrottledRequest already finished.")
 
         self._exception = exception
         self._finished = True
-        self.not_done.notify()
+        self.not_done.notify_all()
+
+    def _notify_finished(self):
+        """Call ``on_finish``, if any, logging the exceptions it raises"""
+
+        if self._on_finish is None:
+            return
+        try:
+            self._on_finish(self)
+        except Exception:
+            logger.exception("Unable to handle the finished request.")
 
     @locked('not_done')
     def get_response(self, timeout=0):
@@ -196,6 +390,48 @@ class ThrottledRequest(object):
             return self._exception
         return None
 
+    def iter_content(self, chunk_size=8192):
+        """Iterate over the body of the response by chunks waiting for the response
+
+        The response is closed once the body has been drained, so that its connection is
+        released. It's meant to be used with requests sent with ``stream=True`` whose body
+        is not buffered.
+
+        :param chunk_size: the size in bytes of each chunk (default: :const:`8192`)
+        :type chunk_size: int
+        :return: the chunks of the body
+        :rtype: generator
+        :raise: the exception occured while processing the request if any
+
+        """
+        response = self.response
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                yield chunk
+        finally:
+            response.close()
+
+    def save(self, destination, chunk_size=8192):
+        """Write the body of the response to ``destination`` by chunks waiting for the response
+
+        :param destination: the path of the file or a file-like object opened in binary mode
+        :type destination: string or file
+        :param chunk_size: the size in bytes of each chunk (default: :const:`8192`)
+        :type chunk_size: int
+        :return: the number of bytes written
+        :rtype: int
+        :raise: the exception occured while processing the request if any
+
+        """
+        if not hasattr(destination, 'write'):
+            with open(destination, 'wb') as f:
+                return self.save(f, chunk_size=chunk_size)
+        written = 0
+        for chunk in self.iter_content(chunk_size=chunk_size):
+            destination.write(chunk)
+            written += len(chunk)
+        return written
+
     def _wait_finished(self, timeout=None):
         """Wait for the request for being finished with an optional ``timeout``
 
@@ -9,14 +9,22 @@ This module contains the throttlers.
 """
 
 import time
+import heapq
+import hashlib
+import itertools
 import threading
-from collections import deque as queue
+from collections import deque, namedtuple
 from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
-from requests_throttler.utils import Timer
+from requests_throttler.pool import RequestsPool
+from requests_throttler.breaker import CircuitOpenError
+from requests_throttler.limiter import Limiter, parse_rate_limit_headers
 from requests_throttler.utils import locked, get_logger
+from requests_throttler.sessions import SessionPool
+from requests_throttler.transports import RequestsTransport
+from requests_throttler.templates import RequestTemplate
 from requests_throttler.throttled_request import ThrottledRequest
 
 logger = get_logger(__name__)
@@ -29,6 +37,15 @@ THROTTLER_STATUS_DEPENDENCIES = {'initialized': ['initialized', 'running', 'stop
                                  'stopped': ['stopped', 'ending'],
                                  'ending': ['ending', 'ended']}
 
+# The statuses are kept as integers indexing THROTTLER_STATUS, whose order is meaningful:
+# from RUNNING to PAUSED the throttler accepts requests, from STOPPED on it's shutdown.
+INITIALIZED, RUNNING, WAITING, PAUSED, STOPPED, ENDING, ENDED = range(len(THROTTLER_STATUS))
+STATUS_TRANSITIONS = [frozenset(THROTTLER_STATUS.index(next_status)
+                                for next_status in THROTTLER_STATUS_DEPENDENCIES.get(status, []))
+                      for status in THROTTLER_STATUS]
+
+ShutdownSummary = namedtuple('ShutdownSummary', ['sent', 'failed', 'dropped'])
+
 
 class ThrottlerStatusError(Exception):
     """Exception that occurs when something goes wrong while changing status
@@ -56,13 +73,28 @@ class ThrottlerStatusError(Exception):
                                                                 prev_status=self.previous_status)
 
 
+class ThrottlerShutdownError(Exception):
+    """Exception associated to the requests still enqueued when the throttler is shutdown
+
+    :param msg: the message
+    :type msg: string
+
+    """
+
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
 class FullRequestsPoolError(Exception):
     """Exception that occurs when an enqueue is tried in a full pool
 
     :param msg: the message
     :type msg: string
     :param pool: the pool
-    :type pool: collections.deque
+    :type pool: :class:`requests_throttler.pool.RequestsPool`
 
     """
 
@@ -84,18 +116,35 @@ class BaseThrottler(object):
 
     :param name: the name of the throttler
     :type name: string
-    :param requests_pool: the pool containing the requests (FIFO)
-    :type requests_pool: collections.dequeue
-    :param delay: the delay in seconds between each request
-    :type delay: float
-    :param status: the current status of the thottler
-    :type status: string
-    :param session: the session to use to perform the requests
+    :param requests_pool: the pool containing the requests, FIFO for each tenant
+    :type requests_pool: :class:`requests_throttler.pool.RequestsPool`
+    :param scheduled: the heap of the requests scheduled for later, as tuples of the form
+                      (``when``, ``sequence number``, ``throttled request``, ``tenant``)
+    :type scheduled: list
+    :param limiter: the limiter deciding when each request can be sent
+    :type limiter: :class:`requests_throttler.limiter.Limiter`
+    :param status: the current status of the thottler as an index of
+                   :const:`THROTTLER_STATUS`
+    :type status: int
+    :param session: the session to use to prepare the requests
     :type session: requests.Session
+    :param sessions: the pool of sessions to use to send the requests
+    :type sessions: :class:`requests_throttler.sessions.SessionPool`
+    :param concurrency: the maximum number of requests being sent at the same time
+    :type concurrency: int
+    :param in_flight: the number of requests being sent
+    :type in_flight: int
+    :param cache: the cache of responses consulted before enqueueing a request
+    :type cache: :class:`requests_throttler.cache.ResponseCache`
+    :param coalesce: a flag that indicates if identical requests are coalesced
+    :type coalesce: boolean
+    :param pending: the throttled requests that can be coalesced indexed by their key
+    :type pending: dict
     :param executor: the executor responsable to start the throttler
     :type executor: threading.ThreadPoolExecutor
-    :param timer: the timer responsable to measure the time between each request
-    :type timer: utils.Timer
+    :param senders: the executor responsable to send the requests when ``concurrency`` is
+                    greater than :const:`1`
+    :type senders: threading.ThreadPoolExecutor
     :param successes: the number of request that succeded
     :type successes: int
     :param failures: the number of request that failed
@@ -103,10 +152,49 @@ class BaseThrottler(object):
     :param wait_enqueued: a flag that indicates if after the shutdown the requests enqueued
                           have to be finished or aborted
     :type wait_enqueued: boolean
+    :param dropped: the number of requests never sent because of the shutdown
+    :type dropped: int
+    :param deadline: the time after which the requests still enqueued are dropped
+    :type deadline: float
     :param status_lock: the condition on which to wait on a specific status change
     :type status_lock: threading.Condition
     :param not_empty: the condition on which to wait when the pool of requests is empty
     :type not_empty: threading.Condition
+    :param batcher: the batcher packing compatible requests into a single one
+    :type batcher: :class:`requests_throttler.batching.Batcher`
+    :param batches: the enqueued requests that can be batched grouped by key
+    :type batches: dict
+    :param rate_limit_headers: a flag that indicates if the limiter is synchronized with the
+                               quota advertised by the responses
+    :type rate_limit_headers: boolean
+    :param quota_marks: the marks given by the limiter to the throttled requests being sent,
+                        used to synchronize it with the quota advertised by their responses
+    :type quota_marks: dict
+    :param breaker: the circuit breaker failing fast the requests to failing upstreams
+    :type breaker: :class:`requests_throttler.breaker.CircuitBreaker`
+    :param timeout: the default timeout of the requests
+    :type timeout: float or (float, float)
+    :param stuck_threshold: the time in seconds after which a request being sent is reported
+                            as stuck
+    :type stuck_threshold: float
+    :param sending: the throttled requests being sent with the time they started
+    :type sending: dict
+    :param recorder: the recorder writing the trace of the requests sent
+    :type recorder: :class:`requests_throttler.recording.Recorder`
+    :param sink: the sink receiving each request once finished
+    :type sink: :class:`requests_throttler.sinks.Sink`
+    :param lazy_prepare: a flag that indicates if the requests are prepared when dequeued
+                         instead of when submitted
+    :type lazy_prepare: boolean
+    :param transport: the transport sending the prepared requests
+    :type transport: :class:`requests_throttler.transports.Transport`
+    :param watchdog: the thread reporting the stuck requests
+    :type watchdog: threading.Thread
+    :param pending_lock: the lock used to access the throttled requests that can be coalesced
+    :type pending_lock: threading.Lock
+    :param not_full: the condition on which to wait when ``concurrency`` requests are being
+                     sent
+    :type not_full: threading.Condition
 
     """
 
@@ -128,59 +216,177 @@ class BaseThrottler(object):
                                will be equal to ``time / number of requests`` (default:
                                :const:`None`)
         :type reqs_over_time: (float, float)
+        :param limits: a list of tuples of the form (`number of requests`, `time`) each meaning
+                       that no more than `number of requests` requests can be sent in any
+                       window of `time` seconds. Each request is sent as soon as all of them
+                       and ``delay`` are satisfied, hence the short windows can be used in
+                       bursts while the long ones cap the total (default: :const:`None`)
+        :type limits: list((int, float))
+        :param limiter: the limiter to use in place of the one built from ``delay``,
+                        ``reqs_over_time`` and ``limits``. A limiter shared by several
+                        throttlers enforces a single quota for all of them, each throttler
+                        waiting for its turn (default: :const:`None`)
+        :type limiter: :class:`requests_throttler.limiter.Limiter`
         :param max_pool_size: the maximum number of enqueueable requests (default: *unlimited*)
         :type max_pool_size: int
+        :param tenants: the weights of the tenants submitting requests. The tenants are served
+                        in turn by a weighted deficit round-robin, hence when they are all
+                        backlogged the rate is split proportionally to the weights, and a
+                        tenant not found has weight :const:`1` (default: :const:`None`)
+        :type tenants: dict
+        :param cache: the cache of responses to consult before enqueueing a request, a fresh hit
+                      is finished immediately without consuming any delay (default:
+                      :const:`None`)
+        :type cache: :class:`requests_throttler.cache.ResponseCache`
+        :param concurrency: the maximum number of requests being sent at the same time, the
+                            delay is still respected between the start of each request
+                            (default: :const:`1`)
+        :type concurrency: int
+        :param shard_sessions: if :const:`True` each sender uses its own copy of ``session``
+                               instead of sharing it (default: :const:`False`)
+        :type shard_sessions: boolean
+        :param coalesce: if :const:`True` a request identical to one still enqueued or being
+                         sent is not enqueued again but gets the same throttled request. Two
+                         requests are identical when they have the same method, url and body
+                         (default: :const:`False`)
+        :type coalesce: boolean
+        :param batcher: the batcher used to send up to ``max_size`` compatible enqueued
+                        requests as a single request, hence in a single delay. Streamed requests
+                        are never batched (default: :const:`None`)
+        :type batcher: :class:`requests_throttler.batching.Batcher`
+        :param rate_limit_headers: if :const:`True` the quota advertised by the
+                                   ``X-RateLimit-Remaining``/``X-RateLimit-Reset`` or
+                                   ``RateLimit-Remaining``/``RateLimit-Reset`` headers of each
+                                   response is given to the limiter, so that the requests are
+                                   sent faster than ``delay`` while the quota allows it and
+                                   none is sent until the reset once it is exhausted, also when
+                                   other clients consume it (default: :const:`False`)
+        :type rate_limit_headers: boolean
+        :param breaker: the circuit breaker consulted when a request is dequeued, a request
+                        whose circuit is open is finished immediately with a
+                        :class:`requests_throttler.breaker.CircuitOpenError` without waiting
+                        for its turn nor using any delay (default: :const:`None`)
+        :type breaker: :class:`requests_throttler.breaker.CircuitBreaker`
+        :param timeout: the timeout used to send the requests not having their own, either a
+                        number of seconds or a tuple (`connect timeout`, `read timeout`), so
+                        that an upstream that never responds fails the request instead of
+                        holding a sender forever (default: :const:`None`)
+        :type timeout: float or (float, float)
+        :param stuck_threshold: if given a watchdog thread reports with a warning the requests
+                                being sent for more than ``stuck_threshold`` seconds and the
+                                time they spent once finished (default: :const:`None`)
+        :type stuck_threshold: float
+        :param recorder: the recorder writing the timings and the response metadata of every
+                         request sent, that can be replayed with
+                         :func:`requests_throttler.recording.replay` (default: :const:`None`)
+        :type recorder: :class:`requests_throttler.recording.Recorder`
+        :param sink: the sink receiving each request as soon as it is finished, whatever the
+                     outcome, so that the results can be collected without keeping the
+                     throttled requests. It is flushed when the throttler ends (default:
+                     :const:`None`)
+        :type sink: :class:`requests_throttler.sinks.Sink`
+        :param lazy_prepare: if :const:`True` the requests are enqueued as they are submitted
+                             and prepared only when dequeued, so that a deep backlog doesn't
+                             hold the merged headers, the encoded bodies and the cookies of
+                             each request. A preparation error is associated to the throttled
+                             request as usual. It cannot be used together with ``cache``,
+                             ``coalesce`` and ``batcher``, that need the prepared requests when
+                             submitted (default: :const:`False`)
+        :type lazy_prepare: boolean
+        :param transport: the transport sending the prepared requests with the session of the
+                          sender, e.g. a :class:`requests_throttler.transports.Urllib3Transport`
+                          to skip the per-request overhead of the session (default: a
+                          :class:`requests_throttler.transports.RequestsTransport`)
+        :type transport: :class:`requests_throttler.transports.Transport`
         :raise:
             :ValueError: if ``delay`` or the value calculated from ``reqs_over_time`` is a
-                         negative number
+                         negative number, if ``concurrency`` is not a positive number, if
+                         a limit is invalid or if they're given together with ``limiter``,
+                         if a weight is not a positive number, if ``stuck_threshold`` is
+                         not a positive number or if ``lazy_prepare`` is given together with
+                         ``cache``, ``coalesce`` or ``batcher``
 
         """
         self._name = kwargs.get('name')
-        self._requests_pool = queue(maxlen=kwargs.get('max_pool_size'))
-        self._delay = self._get_delay(kwargs.get('delay'), kwargs.get('reqs_over_time'))
-        self._status = 'initialized'
+        self._requests_pool = RequestsPool(maxlen=kwargs.get('max_pool_size'),
+                                           weights=kwargs.get('tenants'))
+        self._limiter = self._get_limiter(kwargs.get('limiter'), kwargs.get('delay'),
+                                          kwargs.get('reqs_over_time'), kwargs.get('limits'))
+        self._status = INITIALIZED
         self._session = kwargs.get('session', requests.Session())
+        self._cache = kwargs.get('cache')
+        self._coalesce = kwargs.get('coalesce', False)
+        self._pending = {}
+        self._pending_keys = {}
+        self._batcher = kwargs.get('batcher')
+        self._batches = {}
+        self._scheduled = []
+        self._schedule_counter = itertools.count()
+        self._rate_limit_headers = kwargs.get('rate_limit_headers', False)
+        self._quota_marks = {}
+        self._breaker = kwargs.get('breaker')
+        self._timeout = kwargs.get('timeout')
+        self._stuck_threshold = kwargs.get('stuck_threshold')
+        if self._stuck_threshold is not None and self._stuck_threshold <= 0:
+            raise ValueError("The stuck threshold must be positive.")
+        self._sending = {}
+        self._recorder = kwargs.get('recorder')
+        self._sink = kwargs.get('sink')
+        self._lazy_prepare = kwargs.get('lazy_prepare', False)
+        if self._lazy_prepare and (self._cache is not None or self._coalesce or
+                                   self._batcher is not None):
+            raise ValueError("Lazy preparation cannot be used with cache, coalesce or batcher.")
+        self._transport = kwargs.get('transport') or RequestsTransport()
+        self._watchdog = None
+        self._concurrency = kwargs.get('concurrency', 1)
+        if self._concurrency < 1:
+            raise ValueError("The concurrency value must be positive.")
+        self._sessions = SessionPool(self._session, size=self._concurrency,
+                                     shard=kwargs.get('shard_sessions', False))
+        self._in_flight = 0
         self._executor = ThreadPoolExecutor(max_workers=1)
-        self._timer = Timer(checkpoint=0)
+        self._senders = (ThreadPoolExecutor(max_workers=self._concurrency)
+                         if self._concurrency > 1 else None)
         self._successes = 0
         self._failures = 0
+        self._dropped = 0
         self._wait_enqueued = None
+        self._deadline = None
         self.status_lock = threading.Condition(threading.Lock())
         self.not_empty = threading.Condition(threading.Lock())
+        self.pending_lock = threading.Lock()
+        self.not_full = threading.Condition(threading.Lock())
 
-    def _get_delay(self, delay, reqs_over_time):
-        """Calculates the delay to assign
+    def _get_limiter(self, limiter, delay, reqs_over_time, limits):
+        """Return the limiter to use
 
-        :param delay: the fixed positive amount of time that must elapsed bewteen each request
-                      in seconds (default: :const:`None`)
+        :param limiter: the limiter given (default: :const:`None`)
+        :type limiter: :class:`requests_throttler.limiter.Limiter`
+        :param delay: the delay to use to build the limiter
         :type delay: float
-        :param reqs_over_time: a tuple of the form (`number of requests`, `time`) used to
-                               calculate the delay to use when it is :const:`None`. The delay
-                               will be equal to ``time``/``number of requests``.
-        :type reqs_over_time: tuple
-        :return: the value of ``delay`` to use (default :const:`0`)
-        :rtype: float
+        :param reqs_over_time: the tuple used to calculate the delay when it is :const:`None`
+        :type reqs_over_time: (float, float)
+        :param limits: the limits of requests over windows of time
+        :type limits: list((int, float))
+        :return: the limiter
+        :rtype: :class:`requests_throttler.limiter.Limiter`
         :raise:
-            :ValueError: if ``delay`` or the value calculated from ``reqs_over_time`` is a
-                         negative number
+            :ValueError: if both ``limiter`` and any other argument are given or if the
+                         limiter cannot be built
 
         """
-        if delay is None:
-            if reqs_over_time is None:
-                return 0
-            n_reqs, time_for_reqs = reqs_over_time
-            if n_reqs < 0 or time_for_reqs < 0:
-                raise ValueError("The number of requests and the time value must be positive.")
-            delay = float(time_for_reqs) / n_reqs
-        if delay < 0:
-            raise ValueError("The delay value must be positive.")
-        return delay
+        if limiter is None:
+            return Limiter(delay=delay, reqs_over_time=reqs_over_time, limits=limits)
+        if delay is not None or reqs_over_time is not None or limits is not None:
+            raise ValueError("Cannot use a limiter together with delay, reqs_over_time or "
+                             "limits.")
+        return limiter
 
     def __str__(self):
         return "[{class_name} <{name}, {delay}, {status}>]".format(class_name="BaseThrottler",
                                                                    name=repr(self._name),
-                                                                   delay=repr(self._delay),
-                                                                   status=repr(self._status))
+                                                                   delay=repr(self.delay),
+                                                                   status=repr(self.status))
 
     def __enter__(self):
         """Start the throttler by entering in a context"""
@@ -212,10 +418,142 @@ class BaseThrottler(object):
         :type: float
 
         """
-        return self._delay
+        return self._limiter.delay
+
+    @property
+    def limiter(self):
+        """The limiter deciding when each request can be sent
+
+        :getter: Returns :attr:`limiter`
+        :type: :class:`requests_throttler.limiter.Limiter`
+
+        """
+        return self._limiter
+
+    def set_delay(self, delay):
+        """Change the delay between each request
+
+        The new delay takes effect immediately, also for a request that is already waiting,
+        and for all the throttlers sharing the limiter.
+
+        :param delay: the fixed positive amount of time that must elapse between each request
+                      in seconds
+        :type delay: float
+        :raise:
+            :ValueError: if ``delay`` is a negative number
+
+        """
+        self._limiter.set_delay(delay)
+
+    def set_rate(self, n_reqs, time_for_reqs):
+        """Change the delay between each request to ``time_for_reqs / n_reqs``
+
+        The new delay takes effect immediately, also for a request that is already waiting,
+        and for all the throttlers sharing the limiter.
+
+        :param n_reqs: the number of requests
+        :type n_reqs: float
+        :param time_for_reqs: the time in seconds in which ``n_reqs`` requests can be sent
+        :type time_for_reqs: float
+        :raise:
+            :ValueError: if ``n_reqs`` or ``time_for_reqs`` is a negative number
+
+        """
+        self._limiter.set_rate(n_reqs, time_for_reqs)
+
+    @locked('not_empty')
+    def resize_pool(self, max_pool_size):
+        """Change the maximum number of enqueueable requests keeping the enqueued ones
+
+        :param max_pool_size: the maximum number of enqueueable requests, :const:`None` means
+                              *unlimited*
+        :type max_pool_size: int
+        :raise:
+            :ValueError: if more than ``max_pool_size`` requests are enqueued
+
+        """
+        logger.info("Resizing pool: %s ---> %s", self._requests_pool.maxlen, max_pool_size)
+        self._requests_pool.resize(max_pool_size)
+
+    @locked('not_empty')
+    def set_tenant_weight(self, tenant, weight):
+        """Change the weight of a tenant, also for its requests already enqueued
+
+        :param tenant: the tenant
+        :type tenant: hashable
+        :param weight: the share of the rate of the tenant relative to the other tenants
+        :type weight: float
+        :raise:
+            :ValueError: if ``weight`` is not a positive number
+
+        """
+        self._requests_pool.set_weight(tenant, weight)
+
+    @locked('not_full')
+    def set_concurrency(self, concurrency):
+        """Change the maximum number of requests being sent at the same time
+
+        The requests already being sent are not interrupted, hence the new value is fully
+        respected once the ones in excess have been sent.
+
+        :param concurrency: the maximum number of requests being sent at the same time
+        :type concurrency: int
+        :raise:
+            :ValueError: if ``concurrency`` is not a positive number
+
+        """
+        if concurrency < 1:
+            raise ValueError("The concurrency value must be positive.")
+        logger.info("Changing concurrency: %d ---> %d", self._concurrency, concurrency)
+        self._sessions.resize(concurrency)
+        if self._senders is not None:
+            self._senders.shutdown(wait=False)
+        self._senders = (ThreadPoolExecutor(max_workers=concurrency)
+                         if concurrency > 1 else None)
+        self._concurrency = concurrency
+        self.not_full.notify_all()
+
+    @property
+    def limits(self):
+        """The limits of requests over windows of time
+
+        :getter: Returns :attr:`limits` as a list of tuples (`number of requests`, `time`)
+        :type: list((int, float))
+
+        """
+        return self._limiter.limits
+
+    @property
+    def concurrency(self):
+        """The maximum number of requests being sent at the same time
+
+        :getter: Returns :attr:`concurrency`
+        :type: int
+
+        """
+        return self._concurrency
+
+    @property
+    def timeout(self):
+        """The default timeout of the requests
+
+        :getter: Returns :attr:`timeout`
+        :type: float or (float, float)
+
+        """
+        return self._timeout
+
+    @property
+    def transport(self):
+        """The transport sending the prepared requests
+
+        :getter: Returns :attr:`transport`
+        :type: :class:`requests_throttler.transports.Transport`
+
+        """
+        return self._transport
 
     @property
-    @locked('status_lock')
     def status(self):
         """The status of the throttler
 
@@ -226,7 +564,7 @@ class BaseThrottler(object):
         :type: string
 
         """
-        return self._status
+        return THROTTLER_STATUS[self._status]
 
     @status.setter
     @locked('status_lock')
@@ -240,11 +578,12 @@ class BaseThrottler(object):
         """
         if status not in THROTTLER_STATUS:
             raise ThrottlerStatusError("Invalid status.", status)
-        if status not in THROTTLER_STATUS_DEPENDENCIES[self._status]:
+        new_status = THROTTLER_STATUS.index(status)
+        if new_status not in STATUS_TRANSITIONS[self._status]:
             raise ThrottlerStatusError("Invalid status stransition.", status,
-                                       previous_status=self._status)
-        logger.debug("Status changing: %s ---> %s", self._status, status)
-        self._status = status
+                                       previous_status=THROTTLER_STATUS[self._status])
+        logger.debug("Status changing: %s ---> %s", THROTTLER_STATUS[self._status], status)
+        self._status = new_status
 
     @property
     @locked('status_lock')
@@ -268,6 +607,17 @@ class BaseThrottler(object):
         """
         return self._failures
 
+    @property
+    @locked('status_lock')
+    def dropped(self):
+        """The number of requests never sent because of the shutdown
+
+        :getter: Returns :attr:`dropped`
+        :type: int
+
+        """
+        return self._dropped
+
     def start(self):
         """Start the throttler by starting the main loop
 
@@ -276,37 +626,101 @@ class BaseThrottler(object):
 
         """
         logger.info("Starting base throttler '%s'...", self._name)
-        if self.status in ['running', 'waiting', 'paused']:
+        if RUNNING <= self._status <= PAUSED:
             raise ThrottlerStatusError("Cannot start an already started throttler.",
-                                       self._status)
-        if self.status in ['stopped', 'ending', 'ended']:
+                                       self.status)
+        if self._status >= STOPPED:
             raise ThrottlerStatusError("Cannot start an already shutdown throttler.",
-                                       self._status)
+                                       self.status)
 
         self.status = 'running'
         self._executor.submit(self._main_loop)
+        if self._stuck_threshold is not None:
+            self._watchdog = threading.Thread(target=self._watch_stuck_requests,
+                                              name="{name}-watchdog".format(name=self._name))
+            self._watchdog.daemon = True
+            self._watchdog.start()
 
     @locked('not_empty')
-    def shutdown(self, wait_enqueued=True):
+    def shutdown(self, wait_enqueued=True, timeout=None):
         """Shutdown the throttler by shutdowning the executor
 
         If ``wait_enqueued`` is :const:`True` then before stopping the throttlers consumes all
-        the requests enqueued. Otherwise the throttler is forced to be shutdowned.
+        the requests enqueued, or the ones it can send in ``timeout`` seconds. Otherwise the
+        throttler is forced to be shutdowned. The requests that are not sent are finished with
+        a :class:`requests_throttler.throttler.ThrottlerShutdownError` exception, while the ones
+        being sent are waited for. A throttler never started is ``ended`` immediately.
 
         :param wait_enqueued: the flag that indicates if the already enqueued requests are to be
                               processed or aborted
+        :param timeout: the time in seconds after which the requests still enqueued are
+                        aborted, :const:`None` means *unlimited* (default: :const:`None`)
+        :type timeout: float
         :raise:
             :ThrottlerStatusError: if the throttler has been already shutdowned
 
         """
-        if self.status in ['stopped', 'ending', 'ended']:
+        if self._status >= STOPPED:
             raise ThrottlerStatusError("Cannot shutdown an already shutdown throttler.",
-                                       self._status)
+                                       self.status)
+        if self._status == INITIALIZED:
+            logger.info("Shutting down a throttler never started...")
+            self._executor.shutdown(wait=False)
+            self._end()
+            return
         self.status = 'stopped'
         self._wait_enqueued = wait_enqueued
+        if not wait_enqueued:
+            self._deadline = time.time()
+        elif timeout is not None:
+            self._deadline = time.time() + timeout
         self.not_empty.notify()
+        with self.status_lock:
+            self.status_lock.notify_all()
+        self._limiter.wake()
         self._executor.shutdown(wait=False)
 
+    def drain(self, timeout=None):
+        """Shutdown the throttler sending the enqueued requests for at most ``timeout`` seconds
+        and wait until it is ``ended``
+
+        :param timeout: the time in seconds after which the requests still enqueued are
+                        aborted, :const:`None` means *unlimited* (default: :const:`None`)
+        :type timeout: float
+        :return: the number of requests sent successfully, of the failed ones and of the ones
+                 dropped because of the shutdown
+        :rtype: :class:`requests_throttler.throttler.ShutdownSummary`
+        :raise:
+            :ThrottlerStatusError: if the throttler has been already shutdowned
+
+        """
+        self.shutdown(wait_enqueued=True, timeout=timeout)
+        self.wait_end()
+        with self.status_lock:
+            return ShutdownSummary(self._successes, self._failures, self._dropped)
+
+    def warm(self, url, connections=None):
+        """Open keep-alive connections towards the host of ``url`` before sending anything
+
+        :param url: the url of the host to connect to
+        :type url: string
+        :param connections: the number of connections to open (default: :attr:`concurrency`)
+        :type connections: int
+        :return: the number of connections opened
+        :rtype: int
+
+        """
+        return self._sessions.warm(url, connections=connections)
+
+    def connection_stats(self):
+        """Return the statistics about the reuse of the connections
+
+        :return: the statistics (see :meth:`requests_throttler.sessions.SessionPool.stats`)
+        :rtype: dict
+
+        """
+        return self._sessions.stats()
+
     @locked('status_lock')
     def pause(self):
         """Pause the throttler
@@ -316,44 +730,78 @@ class BaseThrottler(object):
                                    ``paused``
 
         """
-        if self._status == 'paused':
-            raise ThrottlerStatusError("Cannot pause an already paused throttler", self._status)
-        if self._status not in ['running', 'waiting']:
-            raise ThrottlerStatusError("Cannot pause a not running throttler", self._status)
+        if self._status == PAUSED:
+            raise ThrottlerStatusError("Cannot pause an already paused throttler", self.status)
+        if self._status not in (RUNNING, WAITING):
+            raise ThrottlerStatusError("Cannot pause a not running throttler", self.status)
 
-        self._status = 'paused'
-        self.status_lock.notify()
+        self._status = PAUSED
+        self.status_lock.notify_all()
+        self._limiter.wake()
 
-    @locked('status_lock')
     def unpause(self):
         """Unpause the throttler
 
+        The throttler resumes immediately, also if it was waiting for new requests while paused.
+
         :raise:
             :ThrottlerStatusError: if the throttler is not ``paused``
 
         """
-        if self._status != 'paused':
-            raise ThrottlerStatusError("Cannot unpause not paused throttler", self._status)
-        self._status = 'running'
-        self.status_lock.notify()
-
-    def submit(self, req):
+        with self.status_lock:
+            if self._status != PAUSED:
+                raise ThrottlerStatusError("Cannot unpause not paused throttler", self.status)
+            self._status = RUNNING
+            self.status_lock.notify_all()
+        with self.not_empty:
+            self.not_empty.notify()
+
+    def submit(self, req, **kwargs):
         """Submit a single request and return the corresponding throttled request
 
-        :param req: the request to throttle
-        :type req: requests.Request
+        :param req: the request to throttle, a prepared request (e.g. rendered by a
+                    :class:`requests_throttler.templates.RequestTemplate`) is enqueued as it is
+        :type req: requests.Request or requests.PreparedRequest
+        :param coalesce_key: the key used to coalesce the request with a pending one having the
+                             same key, it replaces the key computed when ``coalesce`` is
+                             enabled (default: :const:`None`)
+        :type coalesce_key: hashable
+        :param send_options: the keyword arguments to use to send the request, e.g.
+                             ``{'stream': True}`` to not buffer the body of the response
+                             that can then be consumed by chunks through the ``iter_content``
+                             and ``save`` methods of the throttled request. A streamed request
+                             is neither cached nor coalesced and frees its slot among the
+                             concurrent senders as soon as the headers of the response are
+                             received (default: :const:`None`)
+        :type send_options: dict
+        :param tenant: the tenant submitting the request, whose share of the rate is given by
+                       its weight (default: :const:`None`)
+        :type tenant: hashable
+        :param cost: the units of the rate budget charged for the request, e.g. the weight an
+                     API assigns to an expensive endpoint: the delay after the request is
+                     multiplied by it, it counts as many requests in the limits and as many
+                     units in the share of its tenant (default: :const:`1`)
+        :type cost: float
+        :param timeout: the timeout of the request in place of the default one, either a number
+                        of seconds or a tuple (`connect timeout`, `read timeout`) (default:
+                        :attr:`timeout`)
+        :type timeout: float or (float, float)
         :return: the corresponding throttled request
         :rtype: :class:`requests_throttler.throttled_request.ThrottledRequest`
         :raise:
             :ThrottlerStatusError: if the throttler is not ``running``, ``paused`` or
                                    ``waiting``
+            :ValueError: if ``cost`` is not a positive number
 
         """
-        return self._submit(req)
+        return self._submit(req, **kwargs)
 
-    def multi_submit(self, reqs):
+    def multi_submit(self, reqs, **kwargs):
         """Submits a list of requests and return the corresponding list of throttled requests
 
+        The keyword arguments are the same of :meth:`submit` and are applied to each request,
+        except ``coalesce_key`` that identifies a single request.
+
         :param reqs: the list of requests to throttle
         :type req: list(requests.Request)
         :return: the corresponding list of throttled requests
@@ -361,34 +809,287 @@ class BaseThrottler(object):
         :raise:
             :ThrottlerStatusError: if the throttler is not ``running``, ``paused`` or
                                    ``waiting``
+            :ValueError: if ``coalesce_key`` is given
+
+        """
+        if 'coalesce_key' in kwargs:
+            raise ValueError("A coalesce key cannot be shared by multiple requests.")
+        return [self._submit(r, **kwargs) for r in reqs]
+
+    def submit_at(self, req, when, **kwargs):
+        """Submit a single request to be enqueued at the given time
+
+        Until ``when`` the request is kept in a heap apart from the pool, that costs
+        O(log n) for n scheduled requests, then it is enqueued as if it was submitted at that
+        time and waits for its turn as any other request. Scheduled requests are neither
+        served from the cache nor coalesced, and don't count towards the maximum size of the
+        pool while they are not enqueued. A shutdown waiting for the enqueued requests waits
+        for the scheduled ones as well, unless its timeout expires first. The keyword arguments
+        are the same of :meth:`submit`.
+
+        :param req: the request to throttle
+        :type req: requests.Request or requests.PreparedRequest
+        :param when: the time, as returned by :func:`time.time`, from which the request can be
+                     sent, a time in the past means *now*
+        :type when: float
+        :return: the corresponding throttled request
+        :rtype: :class:`requests_throttler.throttled_request.ThrottledRequest`
+        :raise:
+            :ThrottlerStatusError: if the throttler is not ``running``, ``paused`` or
+                                   ``waiting``
+            :ValueError: if ``cost`` is not a positive number
+
+        """
+        return self._submit(req, when=when, **kwargs)
+
+    def submit_after(self, req, delay, **kwargs):
+        """Submit a single request to be enqueued after the given number of seconds
+
+        It is the same of :meth:`submit_at` with ``time.time() + delay`` as time.
+
+        :param req: the request to throttle
+        :type req: requests.Request or requests.PreparedRequest
+        :param delay: the seconds after which the request can be sent
+        :type delay: float
+        :return: the corresponding throttled request
+        :rtype: :class:`requests_throttler.throttled_request.ThrottledRequest`
+        :raise:
+            :ThrottlerStatusError: if the throttler is not ``running``, ``paused`` or
+                                   ``waiting``
+            :ValueError: if ``delay`` is negative or ``cost`` is not a positive number
+
+        """
+        if delay < 0:
+            raise ValueError("The delay of a scheduled request must not be negative.")
+        return self._submit(req, when=time.time() + delay, **kwargs)
+
+    @property
+    def scheduled(self):
+        """The number of requests scheduled for later and not enqueued yet
+
+        :getter: Returns :attr:`scheduled`
+        :type: int
+
+        """
+        return len(self._scheduled)
+
+    def template(self, req):
+        """Return a template of the given request prepared with the session of the throttler
+
+        Submitting the requests rendered by the template saves the preparation of each of
+        them.
+
+        :param req: the request with placeholders in its url
+        :type req: requests.Request
+        :return: the template
+        :rtype: :class:`requests_throttler.templates.RequestTemplate`
+        :raise:
+            :ValueError: if a placeholder has no name or is not in the path or in the query
 
         """
-        return [self._submit(r) for r in reqs]
+        return RequestTemplate(req, session=self._session)
+
+    def feed(self, reqs, **kwargs):
+        """Submit the requests of the given iterable without keeping the throttled requests
+
+        It is meant to be used with a sink collecting the results, so that the memory used
+        is proportional to the requests enqueued and not to the ones submitted so far. The
+        keyword arguments are the same of :meth:`multi_submit`.
 
-    def _submit(self, request):
+        :param reqs: the requests to throttle, e.g. a generator
+        :type reqs: iterable(requests.Request)
+        :return: the number of requests submitted
+        :rtype: int
+        :raise:
+            :ThrottlerStatusError: if the throttler is not ``running``, ``paused`` or
+                                   ``waiting``
+            :ValueError: if ``coalesce_key`` is given
+
+        """
+        if 'coalesce_key' in kwargs:
+            raise ValueError("A coalesce key cannot be shared by multiple requests.")
+        n_reqs = 0
+        for r in reqs:
+            self._submit(r, **kwargs)
+            n_reqs += 1
+        return n_reqs
+
+    def cancel(self, throttled_request):
+        """Cancel the given throttled request if it is not being sent nor finished
+
+        The request is not removed from the pool, that would take linear time, but it is
+        finished immediately with a
+        :class:`requests_throttler.throttled_request.ThrottledRequestCancelled` exception, it
+        stops counting toward ``max_pool_size`` and it is skipped once dequeued without
+        consuming any delay nor the share of its tenant. A request coalesced with
+        others is cancelled for all of them.
+
+        :param throttled_request: the throttled request to cancel
+        :type throttled_request: :class:`requests_throttler.throttled_request.ThrottledRequest`
+        :return: :const:`True` if the request has been cancelled, :const:`False` otherwise
+        :rtype: boolean
+
+        """
+        if not throttled_request.cancel():
+            return False
+        self._discard_cancelled(throttled_request)
+        self._limiter.wake()
+        return True
+
+    def _submit(self, request, **kwargs):
         """Submits the given request by preparing it and enqueueing it
 
         :param req: the request to throttle
         :type req: requests.Request
+        :param coalesce_key: the key used to coalesce the request (default: :const:`None`)
+        :type coalesce_key: hashable
+        :param send_options: the keyword arguments to use to send the request (default:
+                             :const:`None`)
+        :type send_options: dict
+        :param tenant: the tenant submitting the request (default: :const:`None`)
+        :type tenant: hashable
+        :param cost: the units of the rate budget charged for the request (default: :const:`1`)
+        :type cost: float
+        :param timeout: the timeout of the request (default: :attr:`timeout`)
+        :type timeout: float or (float, float)
+        :param when: the time from which the request can be sent, :const:`None` means *now*
+                     (default: :const:`None`)
+        :type when: float
         :return: the corresponding throttled request
         :rtype: :class:`requests_throttler.throttled_request.ThrottledRequest`
         :raise:
             :ThrottlerStatusError: if the throttler is not ``running``, ``paused`` or
                                    ``waiting``
+            :ValueError: if ``cost`` is not a positive number
 
         """
         logger.info("Submitting request to base throttler (url: %s)...", request.url)
-        if self._status not in ['running', 'paused', 'waiting']:
-            raise ThrottlerStatusError("Cannot submit request to throttler", self._status)
-        throttled_request, prepared = self._prepare_request(request)
-        if prepared:
+        if not RUNNING <= self._status <= PAUSED:
+            raise ThrottlerStatusError("Cannot submit request to throttler", self.status)
+        cost = kwargs.get('cost', 1)
+        if cost <= 0:
+            raise ValueError("The cost of a request must be positive.")
+        send_options = kwargs.get('send_options')
+        if 'timeout' in kwargs:
+            send_options = dict(send_options or {}, timeout=kwargs['timeout'])
+        throttled_request, prepared = self._prepare_request(request, send_options, cost)
+        if prepared and kwargs.get('when') is not None:
+            self._schedule_request(throttled_request, kwargs['when'], kwargs.get('tenant'))
+        elif prepared and not self._serve_from_cache(throttled_request):
+            pending = self._coalesce_request(throttled_request, kwargs.get('coalesce_key'))
+            if pending is not None:
+                self._abandon_revalidation(throttled_request)
+                return pending
             try:
-                self._enqueue_request(throttled_request)
+                self._enqueue_request(throttled_request, kwargs.get('tenant'))
             except FullRequestsPoolError as e:
-                throttled_request.exception(e)
+                self._release_coalesced(throttled_request)
+                self._abandon_revalidation(throttled_request)
+                throttled_request.exception = e
                 self._inc_failures()
         return throttled_request
 
+    def _serve_from_cache(self, throttled_request):
+        """Finish the given throttled request with a cached response if a fresh one exists
+
+        :param throttled_request: the throttled request to serve
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: :const:`True` if the request has been served from the cache, :const:`False`
+                 otherwise
+        :rtype: boolean
+
+        """
+        if self._cache is None or throttled_request.send_options.get('stream'):
+            return False
+        cached_response = self._cache.lookup(throttled_request.request)
+        if cached_response is None:
+            return False
+        logger.info("Request served from cache (url: %s)", throttled_request.request.url)
+        throttled_request.response = cached_response
+        self._inc_successes()
+        return True
+
+    def _abandon_revalidation(self, throttled_request):
+        """Let the cache forget the revalidation of a request that will not be answered
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        if self._cache is not None:
+            self._cache.abandon(throttled_request.request)
+
+    def _coalescing_key(self, request):
+        """Return the key identifying the given prepared request when coalescing
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :return: the key or :const:`None` if the body cannot be hashed (e.g. a stream)
+        :rtype: tuple
+
+        """
+        body = request.body if request.body is not None else b''
+        if not isinstance(body, bytes):
+            if not isinstance(body, str):
+                return None
+            body = body.encode('utf-8')
+        return request.method, request.url, hashlib.sha1(body).hexdigest()
+
+    @locked('pending_lock')
+    def _coalesce_request(self, throttled_request, key=None):
+        """Return the pending throttled request identical to the given one if any
+
+        If no pending request is found the given one becomes pending under its key.
+
+        :param throttled_request: the throttled request to coalesce
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param key: the key to use in place of the computed one (default: :const:`None`)
+        :type key: hashable
+        :return: the pending throttled request or :const:`None` if it has to be enqueued
+        :rtype: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        if throttled_request.send_options.get('stream'):
+            return None
+        if key is None:
+            if not self._coalesce:
+                return None
+            key = self._coalescing_key(throttled_request.request)
+            if key is None:
+                return None
+        pending = self._pending.get(key)
+        if pending is not None and not pending.cancelled:
+            logger.info("Request coalesced (url: %s)", throttled_request.request.url)
+            return pending
+        if pending is not None:
+            del self._pending_keys[pending]
+        self._pending[key] = throttled_request
+        self._pending_keys[throttled_request] = key
+        return None
+
+    @locked('pending_lock')
+    def _release_coalesced(self, throttled_request):
+        """Stop coalescing new requests into the given throttled request
+
+        :param throttled_request: the throttled request that is going to be finished
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        key = self._pending_keys.pop(throttled_request, None)
+        if key is not None:
+            del self._pending[key]
+
+    def _discard_cancelled(self, throttled_request):
+        """Forget a cancelled throttled request that will never be sent
+
+        :param throttled_request: the cancelled throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        logger.info("Request cancelled (url: %s)", throttled_request.request.url)
+        self._release_coalesced(throttled_request)
+        self._abandon_revalidation(throttled_request)
+
     def _main_loop(self):
         """The main loop of the throttler"""
 
@@ -397,149 +1098,658 @@ class BaseThrottler(object):
             next_request = self._dequeue_request()
             if next_request is None:
                 break
-            self._sleep_or_pause()
-            self._send_request(next_request)
+            if not next_request.prepared and not self._prepare_dequeued(next_request):
+                continue
+            if not self._allowed_by_breaker(next_request):
+                self._reject_request(next_request)
+                continue
+            self._acquire_sender()
+            if self._sleep_or_pause(next_request):
+                if self._rate_limit_headers:
+                    self._quota_marks[next_request] = self._limiter.mark(self)
+                self._dispatch(self._take_batch(next_request))
+            else:
+                self._release_sender()
+                self._drop_request(next_request)
+        self._wait_senders()
+        if self._sink is not None:
+            self._sink.flush()
         logger.info("Exited from main loop.")
         self._end()
 
+    @locked('not_full')
+    def _acquire_sender(self):
+        """Wait until less than ``concurrency`` requests are being sent and take a slot"""
+
+        while self._in_flight >= self._concurrency:
+            self.not_full.wait()
+        self._in_flight += 1
+
+    @locked('not_full')
+    def _release_sender(self):
+        """Release the slot taken by a request that has been sent"""
+
+        self._in_flight -= 1
+        self.not_full.notify_all()
+
+    def _dispatch(self, batch):
+        """Send the given throttled requests from a sender thread or from the current one
+
+        :param batch: the throttled requests to send as a single request
+        :type batch: list(requests_throttler.throttled_request.ThrottledRequest)
+
+        """
+        with self.not_full:
+            if self._senders is not None:
+                self._senders.submit(self._send_and_release, batch)
+                return
+        self._send_and_release(batch)
+
+    @locked('not_full')
+    def _wait_senders(self):
+        """Wait until all the requests being sent have been sent"""
+
+        while self._in_flight > 0:
+            self.not_full.wait()
+        if self._senders is not None:
+            self._senders.shutdown(wait=False)
+
+    def _send_and_release(self, batch):
+        """Send the given throttled requests and release their slot
+
+        :param batch: the throttled requests to send as a single request
+        :type batch: list(requests_throttler.throttled_request.ThrottledRequest)
+
+        """
+        self._start_sending(batch[0])
+        sent_at = time.time()
+        try:
+            if len(batch) == 1:
+                self._send_request(batch[0])
+            else:
+                self._send_batch(batch)
+        finally:
+            self._stop_sending(batch[0])
+            self._record_traffic(batch, sent_at)
+            self._release_sender()
+
+    def _record_traffic(self, batch, sent_at):
+        """Give the given throttled requests that have been sent to the recorder, if any
+
+        :param batch: the throttled requests sent as a single request
+        :type batch: list(requests_throttler.throttled_request.ThrottledRequest)
+        :param sent_at: the time they have been sent
+        :type sent_at: float
+
+        """
+        if self._recorder is None or batch[0].cancelled:
+            return
+        self._recorder.record(batch[0], sent_at, time.time(), len(batch))
+
+    @locked('not_full')
+    def _start_sending(self, throttled_request):
+        """Record that the given throttled request started being sent now
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        self._sending[throttled_request] = time.time()
+
+    @locked('not_full')
+    def _stop_sending(self, throttled_request):
+        """Forget the given throttled request that has been sent, reporting it if it was stuck
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        elapsed = time.time() - self._sending.pop(throttled_request)
+        if self._stuck_threshold is not None and elapsed > self._stuck_threshold:
+            logger.warning("Stuck request finished after %f seconds (url: %s)", elapsed,
+                           throttled_request.request.url)
+
+    @locked('not_full')
+    def stuck_requests(self, threshold=None):
+        """Return the requests being sent for more than the given threshold
+
+        :param threshold: the time in seconds (default: ``stuck_threshold`` or :const:`0` if
+                          not given)
+        :type threshold: float
+        :return: a list of tuples of the form (`throttled request`, `seconds spent`) from the
+                 longest
+        :rtype: list((:class:`requests_throttler.throttled_request.ThrottledRequest`, float))
+
+        """
+        threshold = threshold if threshold is not None else self._stuck_threshold or 0
+        now = time.time()
+        stuck = [(throttled_request, now - start)
+                 for throttled_request, start in self._sending.items()
+                 if now - start > threshold]
+        return sorted(stuck, key=lambda item: -item[1])
+
+    def _watch_stuck_requests(self):
+        """The loop of the watchdog reporting the stuck requests until the throttler is ended
+
+        Each request is reported once while being sent, the time it spent is reported when it
+        finishes.
+
+        """
+        reported = set()
+        while True:
+            with self.status_lock:
+                if self._status != ENDED:
+                    self.status_lock.wait(self._stuck_threshold / 2.0)
+                if self._status == ENDED:
+                    return
+            stuck = self.stuck_requests()
+            for throttled_request, elapsed in stuck:
+                if throttled_request not in reported:
+                    logger.warning("Request stuck for %f seconds (url: %s)", elapsed,
+                                   throttled_request.request.url)
+            reported = set(throttled_request for throttled_request, _ in stuck)
+
     @locked('status_lock')
     def _end(self):
         """Set the ``ended`` status"""
 
-        self._status = 'ended'
-        self.status_lock.notify()
+        self._status = ENDED
+        self.status_lock.notify_all()
 
     @locked('status_lock')
     def wait_end(self):
         """Wait until the throttler is ``ended``"""
 
-        while self._status != 'ended':
+        while self._status != ENDED:
             self.status_lock.wait()
 
-    @locked('status_lock')
-    def _sleep_or_pause(self):
-        """Sleep or pause depending on the status"""
+    def _sleep_or_pause(self, throttled_request):
+        """Sleep or pause depending on the status
 
-        while self._status == 'paused':
-            logger.info("Pausing...")
-            self.status_lock.wait()
-            logger.info("Unpaused!")
-        if not self._status == 'stopped':
-            remaining_time = self._remaining_time()
-            if remaining_time > 0:
-                logger.debug("Start sleeping for %f seconds...", remaining_time)
-                time.sleep(remaining_time)
-                logger.debug("Awakening...")
-            self._timer.checkpoint = time.time()
-
-    def _remaining_time(self):
-        """Return the remaining time before performing the next request
-
-        :return: the remaining time before sending the next request
-        :rtype: float
+        The sleep is a wait on the limiter for the turn of the throttler, that is given up
+        when the throttler is paused and resumed when it is unpaused. The requests still sent
+        after a shutdown wait for their turn as well, so that a shared limiter is never
+        bypassed. If the request to send is cancelled or the shutdown deadline expires the
+        sleep ends without taking the turn.
+
+        :param throttled_request: the throttled request to send
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: :const:`True` if the request can be sent, :const:`False` otherwise
+        :rtype: boolean
 
         """
-        return self._delay - self._timer.elapsed()
+        while True:
+            with self.status_lock:
+                while self._status == PAUSED:
+                    logger.info("Pausing...")
+                    self.status_lock.wait()
+                    logger.info("Unpaused!")
+            deadline = self._deadline
+            if throttled_request.cancelled or self._past_deadline():
+                return False
+            if self._limiter.acquire(self, give_up=lambda: self._give_up_sleeping(
+                    throttled_request, deadline), deadline=deadline, cost=throttled_request.cost):
+                return True
+
+    def _give_up_sleeping(self, throttled_request, deadline):
+        """Check if the throttler has to stop waiting for its turn
+
+        :param throttled_request: the throttled request to send
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param deadline: the shutdown deadline known when the wait started
+        :type deadline: float
+        :return: :const:`True` if the throttler has been paused, the request cancelled or the
+                 shutdown deadline changed
+        :rtype: boolean
+
+        """
+        return (self._status == PAUSED or throttled_request.cancelled or
+                self._deadline != deadline)
+
+    def _past_deadline(self):
+        """Check if the shutdown deadline has expired
+
+        :return: :const:`True` if the deadline has expired
+        :rtype: boolean
 
-    def _prepare_request(self, request):
+        """
+        return self._deadline is not None and time.time() >= self._deadline
+
+    def _drop_request(self, throttled_request):
+        """Finish the given throttled request that will not be sent because of the shutdown
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        if not throttled_request.set_running():
+            self._discard_cancelled(throttled_request)
+            return
+        logger.info("Request dropped (url: %s)", throttled_request.request.url)
+        self._release_coalesced(throttled_request)
+        self._abandon_revalidation(throttled_request)
+        throttled_request.exception = ThrottlerShutdownError("The throttler has been shutdown.")
+        self._inc_dropped()
+
+    def _drop_enqueued(self):
+        """Finish all the throttled requests still enqueued because of the shutdown"""
+
+        while len(self._requests_pool) > 0:
+            throttled_request = self._requests_pool.popleft()
+            if not throttled_request.running:
+                self._drop_request(throttled_request)
+        self._requests_pool.clear()
+        self._batches.clear()
+        scheduled, self._scheduled = self._scheduled, []
+        for _, _, throttled_request, _ in scheduled:
+            self._drop_request(throttled_request)
+
+    def _prepare_request(self, request, send_options=None, cost=1):
         """Prepare the given request and return the corresponding throttled request
 
         If an exception occurs during the preparation it is associated to the throttled request
         created.
 
         :param req: the request to throttle
-        :type req: requests.Request
+        :type req: requests.Request or requests.PreparedRequest
+        :param send_options: the keyword arguments to use to send the request (default:
+                             :const:`None`)
+        :type send_options: dict
+        :param cost: the units of the rate budget charged for the request (default: :const:`1`)
+        :type cost: float
         :return: the throttled request and the flag indicating if it has been correctly prepared
         :rtype: (:class:`requests_throttler.throttled_requests.ThrottledRequest`, boolean)
 
         """
+        if self._lazy_prepare and not isinstance(request, requests.PreparedRequest):
+            return ThrottledRequest(request, send_options, cost, self._finish_callback(),
+                                    prepared=False), True
         try:
             logger.debug("Preparing request (url: %s)...", request.url)
-            prepared_request = self._session.prepare_request(request)
+            if isinstance(request, requests.PreparedRequest):
+                prepared_request = request
+            else:
+                prepared_request = self._session.prepare_request(request)
         except Exception as e:
-            throttled_request = ThrottledRequest(None)
+            throttled_request = ThrottledRequest(None, send_options, cost,
+                                                 self._finish_callback())
             throttled_request.exception = e
             self._inc_failures()
             prepared = False
             logger.warning("Unable to prepare the request (url: %s).", request.url)
         else:
-            throttled_request = ThrottledRequest(prepared_request)
+            throttled_request = ThrottledRequest(prepared_request, send_options, cost,
+                                                 self._finish_callback())
             prepared = True
             logger.debug("Request prepared!")
         return throttled_request, prepared
 
+    def _prepare_dequeued(self, throttled_request):
+        """Prepare the request of the given throttled request enqueued without preparing it
+
+        If an exception occurs during the preparation it is associated to the throttled
+        request.
+
+        :param throttled_request: the dequeued throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: :const:`True` if the request has been prepared, :const:`False` otherwise
+        :rtype: boolean
+
+        """
+        request = throttled_request.request
+        try:
+            logger.debug("Preparing request (url: %s)...", request.url)
+            throttled_request.set_prepared(self._session.prepare_request(request))
+            return True
+        except Exception as e:
+            logger.warning("Unable to prepare the request (url: %s).", request.url)
+            if not throttled_request.set_running():
+                self._discard_cancelled(throttled_request)
+                return False
+            throttled_request.exception = e
+            self._inc_failures()
+            return False
+
+    def _finish_callback(self):
+        """Return the function to call once a throttled request is finished
+
+        :return: the function discarding the cancelled requests from the pool and putting the
+                 finished ones in the sink, if any
+        :rtype: callable
+
+        """
+        return self._request_finished
+
+    def _request_finished(self, throttled_request):
+        """Handle the given throttled request once it is finished
+
+        A cancelled request still enqueued is discarded from the pool, so that it is no longer
+        counted in its size.
+
+        :param throttled_request: the finished throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        if throttled_request.cancelled:
+            with self.not_empty:
+                self._requests_pool.discard(throttled_request)
+        if self._sink is not None:
+            self._sink.put(throttled_request)
+
     def _send_request(self, throttled_request):
         """Send the given throttled request
 
         If an exception occurs during the sending it is associated to the throttled request.
+        Nothing is sent if the request has been cancelled in the meantime.
 
         :param throttled_request: the throttled request to send
         :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
 
         """
+        mark = self._quota_marks.pop(throttled_request, None)
+        if not throttled_request.set_running():
+            self._discard_cancelled(throttled_request)
+            return
         try:
             logger.info("Sending request (url: %s)...", throttled_request.request.url)
-            response = self._session.send(throttled_request.request)
+            response = self._send(throttled_request.request, throttled_request.send_options,
+                                  mark=mark)
+            if self._cache is not None and not throttled_request.send_options.get('stream'):
+                response = self._cache.update(throttled_request.request, response)
         except Exception as e:
+            self._release_coalesced(throttled_request)
+            self._abandon_revalidation(throttled_request)
             throttled_request.exception = e
             self._inc_failures()
             logger.warning("Unable to send the request (url: %s).",
                            throttled_request.request.url)
         else:
+            self._release_coalesced(throttled_request)
             throttled_request.response = response
             self._inc_successes()
             logger.info("Request sent! (url: %s)", throttled_request.request.url)
 
+    def _send(self, request, send_options, origin=None, mark=None):
+        """Send the given prepared request and give its outcome to the limiter and the breaker
+
+        :param request: the prepared request to send
+        :type request: requests.PreparedRequest
+        :param send_options: the keyword arguments to use to send the request
+        :type send_options: dict
+        :param origin: the prepared request whose circuit the outcome belongs to (default:
+                       ``request``)
+        :type origin: requests.PreparedRequest
+        :param mark: the mark given by the limiter when the request was allowed (default:
+                     :const:`None`)
+        :type mark: float
+        :return: the response received
+        :rtype: requests.Response
+
+        """
+        origin = origin if origin is not None else request
+        if self._timeout is not None and 'timeout' not in send_options:
+            send_options = dict(send_options, timeout=self._timeout)
+        try:
+            response = self._transport.send(self._sessions.session(), request, **send_options)
+        except Exception as e:
+            self._record_result(origin, e)
+            raise
+        self._sync_limiter(response, mark)
+        self._record_result(origin, response)
+        return response
+
+    def _allowed_by_breaker(self, throttled_request):
+        """Check if the circuit of the given throttled request allows to send it
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: :const:`True` if there is no breaker or the circuit allows the request
+        :rtype: boolean
+
+        """
+        return self._breaker is None or self._breaker.allow(throttled_request.request)
+
+    def _record_result(self, request, result):
+        """Give the result of the given prepared request to the breaker, if any
+
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :param result: the response received or the exception raised
+        :type result: requests.Response or Exception
+
+        """
+        if self._breaker is not None:
+            self._breaker.record(request, result)
+
+    def _reject_request(self, throttled_request):
+        """Finish the given throttled request that will not be sent because its circuit is open
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+
+        """
+        if not throttled_request.set_running():
+            self._discard_cancelled(throttled_request)
+            return
+        key = self._breaker.key(throttled_request.request)
+        logger.info("Request rejected, circuit open (url: %s)", throttled_request.request.url)
+        self._release_coalesced(throttled_request)
+        self._abandon_revalidation(throttled_request)
+        throttled_request.exception = CircuitOpenError("The circuit is open.", key)
+        self._inc_failures()
+
+    def _sync_limiter(self, response, mark=None):
+        """Give the quota advertised by the given response to the limiter, if enabled
+
+        :param response: the response received
+        :type response: requests.Response
+        :param mark: the mark given by the limiter when the request was allowed (default:
+                     :const:`None`)
+        :type mark: float
+
+        """
+        if not self._rate_limit_headers:
+            return
+        quota = parse_rate_limit_headers(response.headers)
+        if quota is not None:
+            self._limiter.sync(quota[0], quota[1], mark)
+
+    def _batching_key(self, throttled_request):
+        """Return the key used to batch the given throttled request
+
+        :param throttled_request: the throttled request
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: the key or :const:`None` if the request cannot be batched
+        :rtype: hashable
+
+        """
+        if self._batcher is None or throttled_request.send_options.get('stream'):
+            return None
+        return self._batcher.key(throttled_request.request)
+
+    @locked('not_empty')
+    def _take_batch(self, throttled_request):
+        """Return the given throttled request with the enqueued ones that can be batched with it
+
+        The requests taken are marked as running, so that they are skipped when dequeued. Only
+        the main loop marks as running the requests that can be batched, hence a request found
+        not running cannot be taken by anyone else in the meantime.
+
+        :param throttled_request: the throttled request about to be sent
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :return: the throttled requests to send as a single request
+        :rtype: list(requests_throttler.throttled_request.ThrottledRequest)
+
+        """
+        key = self._batching_key(throttled_request)
+        batch = [throttled_request]
+        if key is None or not throttled_request.set_running():
+            return batch
+        compatible = self._batches.get(key)
+        while compatible and len(batch) < self._batcher.max_size:
+            other = compatible.popleft()
+            if other is not throttled_request and not other.running and other.set_running():
+                batch.append(other)
+        if not compatible:
+            self._batches.pop(key, None)
+        return batch
+
+    def _send_batch(self, batch):
+        """Send the given throttled requests as a single request combined by the batcher
+
+        The response received is split among the throttled requests, if anything goes wrong
+        the exception is associated to all of them.
+
+        :param batch: the throttled requests to send
+        :type batch: list(requests_throttler.throttled_request.ThrottledRequest)
+
+        """
+        requests_batch = [throttled_request.request for throttled_request in batch]
+        try:
+            logger.info("Sending batch of %d requests (url: %s)...", len(batch),
+                        batch[0].request.url)
+            combined = self._batcher.combine(requests_batch)
+            if not isinstance(combined, requests.PreparedRequest):
+                combined = self._session.prepare_request(combined)
+            response = self._send(combined, batch[0].send_options, batch[0].request,
+                                  mark=self._quota_marks.pop(batch[0], None))
+            results = self._batcher.split(response, requests_batch)
+        except Exception as e:
+            logger.warning("Unable to send the batch (url: %s).", batch[0].request.url)
+            results = [e] * len(batch)
+        for throttled_request, result in zip(batch, results):
+            self._release_coalesced(throttled_request)
+            if isinstance(result, Exception):
+                self._abandon_revalidation(throttled_request)
+                throttled_request.exception = result
+                self._inc_failures()
+                continue
+            if self._cache is not None:
+                result = self._cache.update(throttled_request.request, result)
+            throttled_request.response = result
+            self._inc_successes()
+
     @locked('not_empty')
-    def _enqueue_request(self, throttled_request):
+    def _enqueue_request(self, throttled_request, tenant=None):
         """Enqueue the given throttled request
 
         :param throttled_request: the throttled request to enqueue
         :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param tenant: the tenant submitting the request (default: :const:`None`)
+        :type tenant: hashable
         :raise:
             :FullRequestsPoolError: if the pool of requests is full
 
         """
         logger.debug("Enqueueing request (url: %s)...", throttled_request.request.url)
-        if len(self._requests_pool) == self._requests_pool.maxlen:
+        if self._requests_pool.full():
             raise FullRequestsPoolError("The requests pool is full.", self._requests_pool)
 
-        self._requests_pool.append(throttled_request)
+        self._append_request(throttled_request, tenant)
         logger.debug("Request enqueued! (url: %s)", throttled_request.request.url)
         self.not_empty.notify()
 
+    def _append_request(self, throttled_request, tenant):
+        """Append the given throttled request to the pool and to its batch, if any
+
+        It must be called holding ``not_empty``.
+
+        :param throttled_request: the throttled request to append
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param tenant: the tenant submitting the request
+        :type tenant: hashable
+
+        """
+        self._requests_pool.append(throttled_request, tenant, throttled_request.cost)
+        key = self._batching_key(throttled_request)
+        if key is not None:
+            self._batches.setdefault(key, deque()).append(throttled_request)
+
+    @locked('not_empty')
+    def _schedule_request(self, throttled_request, when, tenant=None):
+        """Schedule the given throttled request to be enqueued at the given time
+
+        :param throttled_request: the throttled request to schedule
+        :type throttled_request: requests_throttler.throttled_request.ThrottledRequest
+        :param when: the time from which the request can be sent
+        :type when: float
+        :param tenant: the tenant submitting the request (default: :const:`None`)
+        :type tenant: hashable
+
+        """
+        logger.debug("Scheduling request (url: %s)...", throttled_request.request.url)
+        heapq.heappush(self._scheduled,
+                       (when, next(self._schedule_counter), throttled_request, tenant))
+        if self._scheduled[0][2] is throttled_request:
+            self.not_empty.notify()
+
+    def _enqueue_scheduled(self):
+        """Enqueue the scheduled requests whose time has come while the pool is not full
+
+        The cancelled ones are skipped. It must be called holding ``not_empty``.
+
+        """
+        now = time.time()
+        while (self._scheduled and self._scheduled[0][0] <= now and
+               not self._requests_pool.full()):
+            _, _, throttled_request, tenant = heapq.heappop(self._scheduled)
+            if not throttled_request.cancelled:
+                self._append_request(throttled_request, tenant)
+
+    def _scheduled_wait(self):
+        """Return the seconds to wait for the next scheduled request or the shutdown deadline
+
+        It must be called holding ``not_empty``.
+
+        :return: the seconds to wait, :const:`None` means *until notified*
+        :rtype: float
+
+        """
+        waits = []
+        if self._scheduled and self._status != PAUSED:
+            waits.append(self._scheduled[0][0])
+        if self._deadline is not None:
+            waits.append(self._deadline)
+        if not waits:
+            return None
+        return max(min(waits) - time.time(), 0)
+
     @locked('not_empty')
     def _dequeue_request(self):
         """Dequeue the next throttled request to process and return it
 
         If the throttler is ``running`` and no requests are eunqueued the throttler waits until
-        a new request arrives.
+        a new request arrives or a scheduled one is due, that is then enqueued. The cancelled
+        requests and the ones already sent in a batch are skipped. Once the throttler is
+        shutdown and it has to stop sending, the requests still enqueued or scheduled are
+        dropped.
 
         :return: the next throttled request to send
         :rtype: requests_throttler.throttled_request.ThrottledRequest
 
         """
-        logger.debug("Dequeueing request...")
-        waiting = True
-        while waiting:
-            waiting, proceed = self._dequeue_condition()
+        while True:
+            self._enqueue_scheduled()
+            with self.status_lock:
+                waiting, proceed = self._dequeue_condition()
             if waiting:
                 logger.info("Start waiting for new requests...")
-                self.not_empty.wait()
+                self.not_empty.wait(self._scheduled_wait())
                 logger.info("Awakening...")
-            else:
-                waiting = False
-
-        if proceed:
+                continue
+            if not proceed:
+                self._drop_enqueued()
+                return None
             next_request = self._requests_pool.popleft()
-        else:
-            return None
-        logger.debug("Request dequeued! (url: %s)", next_request.request.url)
-        self.status = 'running' if self.status not in ['stopped', 'ending'] else self.status
-        return next_request
+            if next_request.cancelled:
+                self._discard_cancelled(next_request)
+            elif not next_request.running:
+                return next_request
 
     def _dequeue_condition(self):
-        """Check if the throttler has to wait or has to proceed
+        """Check if the throttler has to wait or has to proceed updating the status
+
+        It must be called holding both ``not_empty`` and ``status_lock``.
 
         :return: a tuple of the form (``waiting``, ``proceed``) where ``waiting`` indicates if
                  the throttler has to wait while ``proceed`` indicates if the throttler has to
@@ -547,22 +1757,21 @@ class BaseThrottler(object):
         :rtype: (boolean, boolean)
 
         """
-        if self.status == 'stopped':
-            self.status = 'ending'
-            if not self._wait_enqueued:
+        status = self._status
+        if status == STOPPED:
+            status = self._status = ENDING
+        if status == ENDING:
+            if not self._wait_enqueued or self._past_deadline():
                 return False, False
-
-        if self.status == 'ending':
-            if len(self._requests_pool) == 0:
-                return False, False
-
-        if self.status == 'paused':
+            if len(self._requests_pool) == 0 and self._scheduled:
+                return True, False
+            return False, len(self._requests_pool) > 0
+        if status == PAUSED:
             return True, False
-
         if len(self._requests_pool) == 0:
-            self.status = 'waiting'
+            self._status = WAITING
             return True, False
-
+        self._status = RUNNING
         return False, True
 
     @locked('status_lock')
@@ -576,3 +1785,9 @@ class BaseThrottler(object):
         """Increment the number of failures"""
 
         self._failures += 1
+
+    @locked('status_lock')
+    def _inc_dropped(self):
+        """Increment the number of dropped requests"""
+
+        self._dropped += 1
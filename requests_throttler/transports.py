@@ -0,0 +1,369 @@
+"""
+.. module:: transports
+   :synopsis: The module containing the transports sending the prepared requests
+
+.. moduleauthor:: Lou Marvin Caraig <loumarvincaraig@gmail.com>
+
+This module provides the transports that a throttler uses to send the prepared requests and
+receive their responses. The default one sends them with the session, hence through its
+adapters and hooks, while the lean ones skip most of that machinery for small-payload and
+high-rate traffic or multiplex them over HTTP/2, and the stub one answers in-process for tests
+and benchmarks. Every transport returns a :class:`requests.Response`, so that the rest of the
+throttler, e.g. the cache, the breaker and the sinks, works the same with any of them.
+
+"""
+
+import time
+import threading
+from datetime import timedelta
+
+import requests
+import urllib3
+from urllib3 import exceptions as urllib3_exceptions
+from requests.adapters import DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from requests_throttler.utils import locked
+
+HOP_BY_HOP_HEADERS = frozenset(['connection', 'keep-alive', 'proxy-connection',
+                                'transfer-encoding', 'upgrade'])
+
+
+def build_response(request, status, headers=None, content=b'', reason=None, raw=None,
+                   elapsed=0):
+    """Return the response to the given prepared request with the given parts
+
+    :param request: the prepared request
+    :type request: requests.PreparedRequest
+    :param status: the status code
+    :type status: int
+    :param headers: the headers (default: :const:`None`)
+    :type headers: dict
+    :param content: the body, :const:`None` if it is still to be read from ``raw`` (default:
+                    ``b''``)
+    :type content: bytes
+    :param reason: the reason phrase (default: :const:`None`)
+    :type reason: string
+    :param raw: the raw response (default: :const:`None`)
+    :type raw: urllib3.response.HTTPResponse
+    :param elapsed: the seconds between the sending and the receiving of the headers
+                    (default: :const:`0`)
+    :type elapsed: float
+    :return: the response
+    :rtype: requests.Response
+
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.reason = reason
+    response.raw = raw
+    response.url = request.url
+    response.request = request
+    response.elapsed = timedelta(seconds=elapsed)
+    if content is not None:
+        response._content = content
+    return response
+
+
+class Transport(object):
+    """This class is the base of the transports of a throttler
+
+    A subclass overrides :meth:`send`, and :meth:`close` if it holds any resource.
+
+    """
+
+    def send(self, session, request, **kwargs):
+        """Send the given prepared request and return its response
+
+        :param session: the session of the sender, that can be ignored
+        :type session: requests.Session
+        :param request: the prepared request
+        :type request: requests.PreparedRequest
+        :param kwargs: the options of :meth:`requests.Session.send`, e.g. ``timeout`` and
+                       ``stream``
+        :return: the response
+        :rtype: requests.Response
+        :raise:
+            :requests.RequestException: if the request cannot be sent or no response is
+                                        received
+
+        """
+        raise NotImplementedError("The send method must be overridden.")
+
+    def close(self):
+        """Release the resources of the transport"""
+
+        pass
+
+
+class RequestsTransport(Transport):
+    """This class provides the default transport, sending the requests with the session
+
+    The requests go through the adapters, the hooks and the redirects of the session and the
+    cookies of the responses are stored in it.
+
+    """
+
+    def send(self, session, request, **kwargs):
+        return session.send(request, **kwargs)
+
+
+class Urllib3Transport(Transport):
+    """This class provides a transport sending the requests straight to a urllib3 pool manager
+
+    It skips the adapters, the hooks, the redirects and the cookie handling of the session, that
+    is used only to prepare the requests, and of the send options it honours only ``timeout``
+    and ``stream``. The exceptions of urllib3 are raised as the ones of :mod:`requests`, so that
+    they're handled as with the default transport.
+
+    :param pool_manager: the pool manager holding the connections
+    :type pool_manager: urllib3.PoolManager
+
+    """
+
+    def __init__(self, pool_manager=None, maxsize=DEFAULT_POOLSIZE):
+        """Create a transport sending the requests with the given pool manager
+
+        :param pool_manager: the pool manager to use (default: a new
+                             :class:`urllib3.PoolManager` keeping ``maxsize`` connections per
+                             host)
+        :type pool_manager: urllib3.PoolManager
+        :param maxsize: the number of connections kept alive per host by the default pool
+                        manager (default: :const:`10`)
+        :type maxsize: int
+
+        """
+        self._pool_manager = pool_manager or urllib3.PoolManager(maxsize=maxsize)
+
+    @property
+    def pool_manager(self):
+        """The pool manager holding the connections
+
+        :getter: Returns :attr:`pool_manager`
+        :type: urllib3.PoolManager
+
+        """
+        return self._pool_manager
+
+    def send(self, session, request, **kwargs):
+        stream = kwargs.get('stream', False)
+        start = time.time()
+        try:
+            raw = self._pool_manager.urlopen(
+                request.method, request.url, body=request.body, headers=request.headers,
+                redirect=False, retries=False, preload_content=not stream,
+                decode_content=True, timeout=self._get_timeout(kwargs.get('timeout')))
+        except urllib3_exceptions.NewConnectionError as e:
+            raise requests.ConnectionError(e, request=request)
+        except urllib3_exceptions.ConnectTimeoutError as e:
+            raise requests.ConnectTimeout(e, request=request)
+        except urllib3_exceptions.ReadTimeoutError as e:
+            raise requests.ReadTimeout(e, request=request)
+        except urllib3_exceptions.SSLError as e:
+            raise requests.exceptions.SSLError(e, request=request)
+        except urllib3_exceptions.HTTPError as e:
+            raise requests.ConnectionError(e, request=request)
+        return build_response(request, raw.status, headers=raw.headers,
+                              content=None if stream else raw.data, reason=raw.reason,
+                              raw=raw, elapsed=time.time() - start)
+
+    def _get_timeout(self, timeout):
+        """Return the urllib3 timeout corresponding to the given timeout of :mod:`requests`
+
+        :param timeout: the timeout in seconds or a tuple of the form (``connect``, ``read``)
+        :type timeout: float or (float, float)
+        :return: the timeout
+        :rtype: urllib3.Timeout
+
+        """
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return urllib3.Timeout(connect=connect, read=read)
+        return urllib3.Timeout(connect=timeout, read=timeout)
+
+    def close(self):
+        self._pool_manager.clear()
+
+
+class _HTTPXRaw(object):
+    """The raw response of a streamed :class:`httpx.Response` read by :mod:`requests`"""
+
+    def __init__(self, response):
+        self._response = response
+
+    def stream(self, chunk_size, decode_content=True):
+        for chunk in self._response.iter_bytes(chunk_size):
+            yield chunk
+
+    def read(self, amt=None):
+        return self._response.read()
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Transport(Transport):
+    """This class provides a transport multiplexing the requests over HTTP/2 with httpx
+
+    The concurrent requests to the same upstream are sent as streams of a single connection
+    instead of needing a connection each, hence it suits ``concurrency`` greater than
+    :const:`1`. The upstreams not supporting HTTP/2 are reached over HTTP/1.1. As
+    :class:`requests_throttler.transports.Urllib3Transport` it skips the adapters, the hooks,
+    the redirects and the cookie handling of the session and honours only the ``timeout`` and
+    ``stream`` send options. The connection-specific headers, e.g. ``Connection``, forbidden by
+    HTTP/2 are not sent. It requires ``httpx`` with the ``http2`` extra, i.e.
+    ``pip install RequestsThrottler[http2]``.
+
+    :param client: the client holding the connections
+    :type client: httpx.Client
+
+    """
+
+    def __init__(self, client=None, **kwargs):
+        """Create a transport sending the requests with the given client
+
+        :param client: the client to use (default: a new :class:`httpx.Client` with HTTP/2
+                       enabled)
+        :type client: httpx.Client
+        :param kwargs: the keyword arguments of the default client, e.g. ``http1=False`` to
+                       speak HTTP/2 to plain-text upstreams with prior knowledge
+        :raise:
+            :ImportError: if httpx is not installed
+
+        """
+        if httpx is None:
+            raise ImportError("The HTTP/2 transport requires httpx: "
+                              "pip install RequestsThrottler[http2]")
+        self._client = client or httpx.Client(http2=True, **kwargs)
+
+    @property
+    def client(self):
+        """The client holding the connections
+
+        :getter: Returns :attr:`client`
+        :type: httpx.Client
+
+        """
+        return self._client
+
+    def send(self, session, request, **kwargs):
+        stream = kwargs.get('stream', False)
+        headers = [(name, value) for name, value in request.headers.items()
+                   if name.lower() not in HOP_BY_HOP_HEADERS]
+        start = time.time()
+        try:
+            sent = self._client.build_request(request.method, request.url, headers=headers,
+                                              content=request.body,
+                                              timeout=self._get_timeout(kwargs.get('timeout')))
+            response = self._client.send(sent, stream=stream)
+        except httpx.ConnectTimeout as e:
+            raise requests.ConnectTimeout(e, request=request)
+        except httpx.ReadTimeout as e:
+            raise requests.ReadTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request)
+        return build_response(request, response.status_code, headers=response.headers,
+                              content=None if stream else response.content,
+                              reason=response.reason_phrase, raw=_HTTPXRaw(response),
+                              elapsed=time.time() - start)
+
+    def _get_timeout(self, timeout):
+        """Return the httpx timeout corresponding to the given timeout of :mod:`requests`
+
+        :param timeout: the timeout in seconds or a tuple of the form (``connect``, ``read``)
+        :type timeout: float or (float, float)
+        :return: the timeout
+        :rtype: httpx.Timeout
+
+        """
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    def close(self):
+        self._client.close()
+
+
+class StubTransport(Transport):
+    """This class provides a transport answering the requests in-process without any network
+
+    Each request is answered with the same status, headers and body after ``latency`` seconds,
+    unless a ``responder`` is given.
+
+    :param status: the status code of the responses
+    :type status: int
+    :param headers: the headers of the responses
+    :type headers: dict
+    :param content: the body of the responses
+    :type content: bytes
+    :param latency: the seconds to wait before answering
+    :type latency: float
+    :param responder: the function returning the response to a prepared request
+    :type responder: callable
+    :param sent: the number of requests answered
+    :type sent: int
+    :param lock: the lock used to count the requests
+    :type lock: threading.Lock
+
+    """
+
+    def __init__(self, status=200, headers=None, content=b'', latency=0, responder=None):
+        """Create a transport answering with the given response
+
+        :param status: the status code of the responses (default: :const:`200`)
+        :type status: int
+        :param headers: the headers of the responses (default: :const:`None`)
+        :type headers: dict
+        :param content: the body of the responses (default: ``b''``)
+        :type content: bytes
+        :param latency: the seconds to wait before answering (default: :const:`0`)
+        :type latency: float
+        :param responder: the function taking the prepared request and returning its
+                          :class:`requests.Response`, or raising an exception, in place of the
+                          response above (default: :const:`None`)
+        :type responder: callable
+
+        """
+        self._status = status
+        self._headers = headers
+        self._content = content
+        self._latency = latency
+        self._responder = responder
+        self._sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def sent(self):
+        """The number of requests answered
+
+        :getter: Returns :attr:`sent`
+        :type: int
+
+        """
+        return self._sent
+
+    @locked('lock')
+    def _inc_sent(self):
+        """Increment the number of requests answered"""
+
+        self._sent += 1
+
+    def send(self, session, request, **kwargs):
+        self._inc_sent()
+        if self._latency:
+            time.sleep(self._latency)
+        if self._responder is not None:
+            return self._responder(request)
+        return build_response(request, self._status, headers=self._headers,
+                              content=self._content, elapsed=self._latency)
@@ -10,8 +10,8 @@ This module provides some utilities used by other modules.
 
 import time
 import logging
-import threading
 from functools import wraps
+from collections import deque
 
 from requests_throttler.settings import \
     LOG_FORMAT, \
@@ -21,21 +21,19 @@ from requests_throttler.settings import \
 def locked(lock):
     """Decorator usefull to access to a function with a lock named *lock*
 
+    The lock is looked up by name at every call, so that it can be replaced at runtime, and it
+    can be any context manager (e.g. :class:`threading.Lock` or :class:`threading.Condition`).
+
     :param lock: the name of the lock to use
-    :type lock: :class:`threading.Lock` or :class:`threading.Condition`
+    :type lock: string
     :return: the decorated function
 
     """
     def _locked(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            lock_to_use = getattr(args[0], lock)
-            if not isinstance(lock_to_use, threading.Lock().__class__) and \
-               not isinstance(lock_to_use, threading.Condition().__class__):
-                raise ValueError('`{lock}` is not an instance neither of threading.Lock neither '
-                                 'of threading.Condition'.format(lock=lock_to_use))
-            with lock_to_use:
-                return func(*args, **kwargs)
+        def wrapper(self, *args, **kwargs):
+            with getattr(self, lock):
+                return func(self, *args, **kwargs)
 
         return wrapper
     return _locked
@@ -162,3 +160,113 @@ class Timer(object):
         if change:
             self._checkpoint = now if new_checkpoint is None else new_checkpoint
         return elapsed
+
+
+class SlidingWindow(object):
+    """This class provides a limit of requests over any window of time of a given length
+
+    Each request has a cost, :const:`1` by default, and the total cost of the requests sent in
+    any window must not exceed ``n_reqs``. The requests still inside the window are kept, so
+    that the next request is allowed as soon as enough of them are older than ``window``.
+    Checking and recording a request of cost :const:`1` costs :math:`O(1)` amortized while the
+    memory used is proportional to the number of requests inside the window.
+
+    :param n_reqs: the maximum total cost of the requests in any window
+    :type n_reqs: int
+    :param window: the length in seconds of the window
+    :type window: float
+
+    """
+
+    def __init__(self, n_reqs, window):
+        """Create the limit of ``n_reqs`` requests over any window of ``window`` seconds
+
+        :param n_reqs: the maximum total cost of the requests in any window
+        :type n_reqs: int
+        :param window: the length in seconds of the window
+        :type window: float
+        :raise:
+            :ValueError: if ``n_reqs`` is not a positive integer or ``window`` is negative
+
+        """
+        if int(n_reqs) != n_reqs or n_reqs < 1:
+            raise ValueError("The number of requests must be a positive integer.")
+        if window < 0:
+            raise ValueError("The window length must be positive.")
+        self._n_reqs = int(n_reqs)
+        self._window = float(window)
+        self._requests = deque()
+        self._used = 0
+
+    def __repr__(self):
+        return "SlidingWindow({n_reqs}, {window})".format(n_reqs=self._n_reqs,
+                                                          window=self._window)
+
+    @property
+    def n_reqs(self):
+        """The maximum total cost of the requests in any window
+
+        :getter: Returns :attr:`n_reqs`
+        :type: int
+
+        """
+        return self._n_reqs
+
+    @property
+    def window(self):
+        """The length in seconds of the window
+
+        :getter: Returns :attr:`window`
+        :type: float
+
+        """
+        return self._window
+
+    def remaining(self, now=None, cost=1):
+        """Return the remaining time before a new request of the given cost is allowed
+
+        A request costing more than ``n_reqs`` is allowed once the window is empty.
+
+        :param now: the current time (default: *now*)
+        :type now: float
+        :param cost: the cost of the request (default: :const:`1`)
+        :type cost: float
+        :return: the remaining time, not positive if a request is allowed
+        :rtype: float
+
+        """
+        now = now if now is not None else time.time()
+        self._expire(now)
+        excess = self._used + min(cost, self._n_reqs) - self._n_reqs
+        if excess <= 0:
+            return 0
+        for timestamp, used in self._requests:
+            excess -= used
+            if excess <= 0:
+                return timestamp + self._window - now
+        return 0
+
+    def add(self, timestamp=None, cost=1):
+        """Record a request of the given cost sent at ``timestamp``
+
+        :param timestamp: the time the request has been sent (default: *now*)
+        :type timestamp: float
+        :param cost: the cost of the request (default: :const:`1`)
+        :type cost: float
+
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        self._expire(timestamp)
+        self._requests.append((timestamp, cost))
+        self._used += cost
+
+    def _expire(self, now):
+        """Forget the requests that are not inside the window ending at ``now``
+
+        :param now: the end of the window
+        :type now: float
+
+        """
+        while self._requests and self._requests[0][0] + self._window <= now:
+            _, used = self._requests.popleft()
+            self._used -= used
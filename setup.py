@@ -55,4 +55,6 @@ setup(name=title,
       package_data={'': ['LICENSE']},
       include_package_data=True,
       install_requires=requires,
+      extras_require={'http2': ['httpx[http2]']},
+      entry_points={'console_scripts': ['requests-throttler = requests_throttler.cli:main']},
       classifiers=classifiers)